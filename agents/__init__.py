@@ -1,16 +1,21 @@
 # agents/__init__.py
-from .commander import call_commander
-from .auditor import call_auditor, call_code_review
-from .coder import call_coder, call_coder_fix
+from .commander import call_commander, stream_commander
+from .auditor import call_auditor, call_code_review, call_code_review_diff
+from .coder import call_coder, call_coder_fix, call_coder_patch
 from .searcher import call_searcher
 from .data_processor import call_data_processor
+from .router import get_router
 
 __all__ = [
     'call_commander',
+    'stream_commander',
     'call_auditor',
     'call_code_review',
+    'call_code_review_diff',
     'call_coder',
     'call_coder_fix',
+    'call_coder_patch',
     'call_searcher',
-    'call_data_processor'
+    'call_data_processor',
+    'get_router'
 ]
@@ -1,10 +1,10 @@
 # agents/auditor.py
-# 行数: 32行
+# 行数: 56行
 # 監査役エージェント
 
 from langchain_core.messages import HumanMessage, SystemMessage
 from config import get_auditor
-from utils import extract_content
+from utils import cached_invoke
 
 def call_auditor(plan_text: str) -> str:
     """監査役に依頼"""
@@ -13,13 +13,9 @@ def call_auditor(plan_text: str) -> str:
         SystemMessage(content="あなたは冷徹な監査役です。計画に対し、技術的リスク、コスト超過リスク、実現可能性の懸念点を厳しく指摘してください。日本語で回答。"),
         HumanMessage(content=plan_text)
     ]
-    return extract_content(model.invoke(messages))
+    return cached_invoke(model, messages)
 
-def call_code_review(code: str) -> dict:
-    """監査役にコードレビュー依頼"""
-    model = get_auditor()
-    messages = [
-        SystemMessage(content="""あなたは厳格なコードレビュアーです。
+CODE_REVIEW_PROMPT = """あなたは厳格なコードレビュアーです。
 コードを分析し、以下の形式で回答してください：
 
 【判定】OK または 要修正
@@ -27,11 +23,34 @@ def call_code_review(code: str) -> dict:
 【推奨修正】（要修正の場合のみ）修正方法の提案
 
 バグ、セキュリティ問題、エッジケース未対応、パフォーマンス問題を重点的にチェックしてください。
-日本語で回答。"""),
-        HumanMessage(content=f"以下のコードをレビューしてください：\n\n{code}")
-    ]
-    review = extract_content(model.invoke(messages))
-    
-    # 判定を抽出
+日本語で回答。"""
+
+def _parse_review(review: str) -> dict:
+    """判定を抽出"""
     is_ok = "【判定】OK" in review or "判定】OK" in review
     return {"approved": is_ok, "feedback": review}
+
+def call_code_review(code: str) -> dict:
+    """監査役にコードレビュー依頼"""
+    model = get_auditor()
+    messages = [
+        SystemMessage(content=CODE_REVIEW_PROMPT),
+        HumanMessage(content=f"以下のコードをレビューしてください：\n\n{code}")
+    ]
+    return _parse_review(cached_invoke(model, messages))
+
+def call_code_review_diff(hunks: str, previous_feedback: str) -> dict:
+    """監査役に修正差分のみのレビュー依頼（前回の指摘が解消されたかを確認）"""
+    model = get_auditor()
+    messages = [
+        SystemMessage(content=CODE_REVIEW_PROMPT),
+        HumanMessage(content=f"""前回のレビュー指摘を受けてコードが修正されました。
+変更箇所（unified diff、前後のコンテキスト付き）をレビューし、指摘が解消されたか、新たな問題がないかを判定してください。
+
+【前回のレビュー指摘】
+{previous_feedback}
+
+【変更箇所】
+{hunks}""")
+    ]
+    return _parse_review(cached_invoke(model, messages))
@@ -1,11 +1,10 @@
 # agents/auditor_team/team.py
-# 行数: 105行
+# 行数: 108行
 # 監査・レビューチーム（分析・穴探し）
 
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from agents.base import TeamExecutor
-from config import AI_MODELS
 
 
 class AuditorTeam(TeamExecutor):
@@ -16,32 +15,37 @@ class AuditorTeam(TeamExecutor):
     - チェック役: Gemini 3 Pro（穴探し）
     """
     
-    def __init__(self):
-        super().__init__("auditor")
+    def __init__(self, use_cache: bool = True, speculative: bool = None):
+        super().__init__("auditor", use_cache=use_cache, speculative=speculative)
     
-    def run(self, target: str, context: str = "") -> dict:
+    def run(self, target: str, context: str = "", stream: bool = False) -> dict:
         """
         監査・レビュータスクを実行
+        stream=True の場合、長の出力をチャンク単位のジェネレータで返す
         """
-        # 1. 作成役（Claude）が分析
-        creator_result = self._run_creator(target, context)
-        
-        # 2. チェック役（Gemini）が穴探し
-        checker_result = self._run_checker(target, creator_result)
-        
-        # 3. 長（GPT）が最終判断
-        leader_result = self._run_leader(target, creator_result, checker_result)
-        
-        # 4. 調停
-        return self.resolve(
-            leader_result=leader_result,
-            checker_scores=[{
-                "checker": AI_MODELS[self.config["checker"]]["name"],
-                "evaluation": checker_result,
-            }]
+        return self._execute(**self._pipeline(target, context), stream=stream)
+    
+    async def arun(self, target: str, context: str = "") -> dict:
+        """
+        監査・レビュータスクを非同期実行
+        共有イベントループ上で ainvoke を使い、プロバイダ別の同時実行数を制限
+        """
+        return await self._aexecute(**self._pipeline(target, context))
+    
+    def _pipeline(self, target: str, context: str = "") -> dict:
+        """作成役 → チェック役 → 長 のメッセージ構成"""
+        return dict(
+            # 1. 作成役（Claude）が分析
+            creator_messages=self._creator_messages(target, context),
+            # 2. チェック役（Gemini）が穴探し
+            checker_messages=lambda creator_result: self._checker_messages(target, creator_result),
+            # 3. 長（GPT）が最終判断
+            leader_messages=lambda creator_result, checker_result: self._leader_messages(
+                target, creator_result, checker_result
+            ),
         )
     
-    def _run_creator(self, target: str, context: str) -> str:
+    def _creator_messages(self, target: str, context: str) -> list:
         """作成役: 分析"""
         system_prompt = """あなたは優秀な監査・分析の専門家です。
 対象を詳細に分析し、以下の観点でレポートしてください：
@@ -56,10 +60,9 @@ class AuditorTeam(TeamExecutor):
             HumanMessage(content=f"対象:\n{target}\n\nコンテキスト:\n{context}" if context else f"対象:\n{target}")
         ]
         
-        response = self.creator_ai.invoke(messages)
-        return response.content
+        return messages
     
-    def _run_checker(self, target: str, creator_result: str) -> str:
+    def _checker_messages(self, target: str, creator_result: str) -> list:
         """チェック役: 穴探し"""
         system_prompt = """あなたは批判的分析の専門家です。
 作成役の分析を検証し、見落としている問題点や穴を探してください。
@@ -75,10 +78,9 @@ class AuditorTeam(TeamExecutor):
             HumanMessage(content=f"対象:\n{target}\n\n作成役の分析:\n{creator_result}")
         ]
         
-        response = self.checker_ai.invoke(messages)
-        return response.content
+        return messages
     
-    def _run_leader(self, target: str, creator_result: str, checker_result: str) -> str:
+    def _leader_messages(self, target: str, creator_result: str, checker_result: str) -> list:
         """長: 最終判断"""
         system_prompt = """あなたは監査チームの長です。
 作成役の分析とチェック役の穴探し結果を総合し、最終的な監査レポートを作成してください。
@@ -103,5 +105,4 @@ class AuditorTeam(TeamExecutor):
 上記を踏まえ、最終的な監査レポートを作成してください。""")
         ]
         
-        response = self.leader_ai.invoke(messages)
-        return response.content
+        return messages
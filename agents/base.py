@@ -1,35 +1,52 @@
 # agents/base.py
-# 行数: 148行
+# 行数: 378行
 # チーム共通ロジック（AI取得・並列実行・調停）
 
 import asyncio
-from typing import Any, Callable, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Iterator, Optional
 
 import streamlit as st
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_groq import ChatGroq
+from langchain_core.messages import HumanMessage
 
 from config import (
-    AI_MODELS,
+    AI_MODELS, EARLY_EXIT_THRESHOLD,
     GEMINI_KEY, OPENAI_KEY, ANTHROPIC_KEY, GROQ_KEY, XAI_KEY,
     get_team_config,
 )
+from core.client_pool import get_client_pool
+from core.async_engine import provider_semaphore
+from core.parallel_executor import run_race, submit
+from core.scoring import VERDICT_INSTRUCTION, parse_verdict, verdict_passes
+from utils import cached_invoke, cached_ainvoke, cached_stream, span, trace_stream
 
 # ==========================================
 # AI インスタンス取得
 # ==========================================
-def get_ai_instance(ai_key: str, temperature: float = 0):
-    """AI キーからLangChainインスタンスを取得"""
-    if ai_key not in AI_MODELS:
-        raise ValueError(f"Unknown AI: {ai_key}")
-    
-    model_info = AI_MODELS[ai_key]
-    provider = model_info["provider"]
-    model = model_info["model"]
-    
+PROVIDER_BASE_URLS = {
+    "xai": "https://api.x.ai/v1",
+    "perplexity": "https://api.perplexity.ai",
+}
+
+
+def _get_perplexity_key():
+    """Perplexity APIキー取得（secrets → 環境変数）"""
+    perplexity_key = st.secrets.get("PERPLEXITY_API_KEY", None)
+    if not perplexity_key:
+        import os
+        perplexity_key = os.getenv("PERPLEXITY_API_KEY")
+    return perplexity_key
+
+
+def _build_ai_instance(provider: str, model: str, temperature: float,
+                       base_url: Optional[str], http_kwargs: dict):
+    """
+    LangChainインスタンスを生成（http_kwargs は接続プール共有用）
+    - OpenAI互換は http_client を渡すと stream_usage が既定で無効になるため明示的に有効化
+    """
     if provider == "anthropic":
         return ChatAnthropic(
             model=model,
@@ -40,7 +57,9 @@ def get_ai_instance(ai_key: str, temperature: float = 0):
         return ChatOpenAI(
             model=model,
             temperature=temperature,
-            api_key=OPENAI_KEY
+            api_key=OPENAI_KEY,
+            stream_usage=True,
+            **http_kwargs
         )
     elif provider == "google":
         return ChatGoogleGenerativeAI(
@@ -51,40 +70,79 @@ def get_ai_instance(ai_key: str, temperature: float = 0):
         return ChatGroq(
             model=model,
             temperature=temperature,
-            api_key=GROQ_KEY
+            api_key=GROQ_KEY,
+            **http_kwargs
         )
     elif provider == "xai":
         return ChatOpenAI(
             model=model,
             temperature=temperature,
             api_key=XAI_KEY,
-            base_url="https://api.x.ai/v1"
+            base_url=base_url,
+            stream_usage=True,
+            **http_kwargs
         )
     elif provider == "perplexity":
         # Perplexity API（OpenAI互換）
-        perplexity_key = st.secrets.get("PERPLEXITY_API_KEY", None)
-        if not perplexity_key:
-            import os
-            perplexity_key = os.getenv("PERPLEXITY_API_KEY")
         return ChatOpenAI(
             model=model,
             temperature=temperature,
-            api_key=perplexity_key,
-            base_url="https://api.perplexity.ai"
+            api_key=_get_perplexity_key(),
+            base_url=base_url,
+            stream_usage=True,
+            **http_kwargs
         )
     else:
         raise ValueError(f"Unknown provider: {provider}")
 
 
+def get_ai_instance(ai_key: str, temperature: float = 0):
+    """
+    AI キーからLangChainインスタンスを取得
+    - プロセス共有のクライアントプールから返す（同一設定なら同一インスタンス）
+    """
+    if ai_key not in AI_MODELS:
+        raise ValueError(f"Unknown AI: {ai_key}")
+    
+    model_info = AI_MODELS[ai_key]
+    provider = model_info["provider"]
+    model = model_info["model"]
+    base_url = PROVIDER_BASE_URLS.get(provider)
+    
+    return get_client_pool().get(
+        provider, model, temperature, base_url,
+        lambda http_kwargs: _build_ai_instance(provider, model, temperature, base_url, http_kwargs),
+    )
+
+
 # ==========================================
 # チーム実行基底クラス
 # ==========================================
+# 投機実行: 作成役と並行してチェック役が入力だけを事前分析する際の指示
+SPECULATIVE_PREVIEW_PROMPT = """作成役の出力はまだありません。
+以下の入力だけを独立に分析し、評価の観点・想定される正解・注意すべき点を簡潔に挙げてください。"""
+
+# 投機実行: 作成役の出力が揃った後の差分評価の指示
+SPECULATIVE_DELTA_PROMPT = """あなたが入力だけから行った事前分析:
+{preview}
+
+上記の事前分析と照合し、作成役の出力に対する評価のみを簡潔に出力してください（分析の繰り返しは不要）。"""
+
+
 class TeamExecutor:
     """チーム実行の基底クラス"""
     
-    def __init__(self, team_name: str):
+    # 作成役と並行してチェック役の事前分析を走らせるか（オプトイン）
+    speculative_checker: bool = False
+    # チェック役が承認しこの採点以上なら長の段をスキップ（None で無効）
+    early_exit_threshold: Optional[int] = EARLY_EXIT_THRESHOLD
+    
+    def __init__(self, team_name: str, use_cache: bool = True, speculative: Optional[bool] = None):
         self.team_name = team_name
         self.config = get_team_config(team_name)
+        self.use_cache = use_cache
+        if speculative is not None:
+            self.speculative_checker = speculative
         
         # AI インスタンス取得
         self.leader_ai = get_ai_instance(self.config["leader"])
@@ -100,51 +158,221 @@ class TeamExecutor:
             "checker": AI_MODELS[self.config["checker"]]["name"],
         }
     
-    def run_parallel(self, tasks: list[tuple[Any, Callable]]) -> list[dict]:
+    # キャッシュを使わない役割（最新情報の検索など）
+    live_roles: tuple = ()
+    # 役割 → 遅延時にヘッジ送信する予備AIキー
+    hedge_roles: dict = {}
+    hedge_percentile: float = 0.95
+    hedge_timeout: float = 120
+    
+    def _invoke(self, role: str, messages: list) -> str:
+        """
+        役割（creator / checker / leader）のAIを呼び出して本文を返す
+        - 温度0の呼び出しはレスポンスキャッシュを透過的に利用
+        - live_roles に含まれる役割、またはチームの use_cache=False では毎回LLMを呼ぶ
+        - hedge_roles に含まれる役割は予備AIとの先着勝ち
+        """
+        with span(f"team.{role}", **self._span_attributes(role)):
+            if self._is_hedged(role):
+                return self._invoke_hedged(role, messages)
+            
+            ai_instance = getattr(self, f"{role}_ai")
+            return cached_invoke(ai_instance, messages, bypass=self._bypass_cache(role))
+    
+    def _stream(self, role: str, messages: list) -> Iterator[str]:
+        """役割のAIの出力をチャンク単位で返すジェネレータ"""
+        ai_instance = getattr(self, f"{role}_ai")
+        return trace_stream(
+            f"team.{role}", cached_stream(ai_instance, messages, bypass=self._bypass_cache(role)),
+            stream=True, **self._span_attributes(role),
+        )
+    
+    async def _ainvoke(self, role: str, messages: list) -> str:
+        """
+        _invoke の非同期版（プロバイダ別セマフォで同時実行数を制限）
+        - hedge_roles に含まれる役割は _invoke_hedged を別スレッドで実行（ループは塞がない）
+        """
+        ai_instance = getattr(self, f"{role}_ai")
+        provider = AI_MODELS[self.config[role]]["provider"]
+        with span(f"team.{role}", **self._span_attributes(role)):
+            async with provider_semaphore(provider):
+                if self._is_hedged(role):
+                    return await asyncio.to_thread(self._invoke_hedged, role, messages)
+                return await cached_ainvoke(ai_instance, messages, bypass=self._bypass_cache(role))
+    
+    def _is_hedged(self, role: str) -> bool:
+        backup_key = self.hedge_roles.get(role)
+        return bool(backup_key) and backup_key != self.config[role]
+    
+    def _span_attributes(self, role: str) -> dict:
+        """役割の呼び出しスパンの属性（チーム・役割・モデル）"""
+        return {"team": self.team_name, "role": role, "ai": self.config[role]}
+    
+    def _bypass_cache(self, role: str) -> bool:
+        return not self.use_cache or role in self.live_roles
+    
+    def _execute(self, creator_messages: list,
+                 checker_messages: Callable[[str], list],
+                 leader_messages: Callable[[str, str], list],
+                 stream: bool = False) -> dict:
+        """
+        作成役 → チェック役 → 長 のパイプラインを実行して調停結果を返す
+        
+        Args:
+            creator_messages: 作成役へのメッセージ
+            checker_messages: 作成役の出力からチェック役へのメッセージを作る関数
+            leader_messages: 作成役・チェック役の出力から長へのメッセージを作る関数
+            stream: True の場合 final_result は長の出力チャンクのジェネレータ
+        """
+        if self.speculative_checker:
+            # チェック役の事前分析をバックグラウンドで走らせ、作成役と並行実行
+            preview_messages = self._preview_messages(creator_messages, checker_messages)
+            preview_future = submit(self._invoke, "checker", preview_messages)
+            creator_result = self._invoke("creator", creator_messages)
+            try:
+                preview = preview_future.result()
+            except Exception:
+                preview = None
+        else:
+            creator_result = self._invoke("creator", creator_messages)
+            preview = None
+        
+        checker_result = self._invoke("checker", self._checker_pass(checker_messages, creator_result, preview))
+        verdict = parse_verdict(checker_result)
+        checker_scores = [self._checker_score(checker_result, preview, verdict)]
+        
+        # チェック役が承認した場合は作成役の出力をそのまま採用
+        if verdict_passes(verdict, self.early_exit_threshold):
+            return self.resolve(creator_result, checker_scores, verdict=verdict, leader_skipped=True)
+        
+        messages = leader_messages(creator_result, checker_result)
+        if stream:
+            leader_result = self._stream("leader", messages)
+        else:
+            leader_result = self._invoke("leader", messages)
+        
+        return self.resolve(leader_result, checker_scores, verdict=verdict)
+    
+    async def _aexecute(self, creator_messages: list,
+                        checker_messages: Callable[[str], list],
+                        leader_messages: Callable[[str, str], list]) -> dict:
+        """_execute の非同期版（各段の待機中もイベントループを他の会話に明け渡す）"""
+        if self.speculative_checker:
+            preview_messages = self._preview_messages(creator_messages, checker_messages)
+            creator_result, preview = await asyncio.gather(
+                self._ainvoke("creator", creator_messages),
+                self._ainvoke("checker", preview_messages),
+                return_exceptions=True,
+            )
+            if isinstance(creator_result, BaseException):
+                raise creator_result
+            if isinstance(preview, BaseException):
+                preview = None
+        else:
+            creator_result = await self._ainvoke("creator", creator_messages)
+            preview = None
+        
+        checker_result = await self._ainvoke("checker", self._checker_pass(checker_messages, creator_result, preview))
+        verdict = parse_verdict(checker_result)
+        checker_scores = [self._checker_score(checker_result, preview, verdict)]
+        
+        if verdict_passes(verdict, self.early_exit_threshold):
+            return self.resolve(creator_result, checker_scores, verdict=verdict, leader_skipped=True)
+        
+        leader_result = await self._ainvoke("leader", leader_messages(creator_result, checker_result))
+        
+        return self.resolve(leader_result, checker_scores, verdict=verdict)
+    
+    def _preview_messages(self, creator_messages: list, checker_messages: Callable[[str], list]) -> list:
+        """
+        投機実行: チェック役が作成役の出力を待たずに入力だけを分析するメッセージ
+        - システムプロンプトはチェック役のもの、入力は作成役への最後のメッセージを流用
+        """
+        system_messages = [m for m in checker_messages("") if m.type == "system"]
+        task = creator_messages[-1].content
+        return system_messages + [HumanMessage(content=f"{SPECULATIVE_PREVIEW_PROMPT}\n\n{task}")]
+    
+    def _checker_pass(self, checker_messages: Callable[[str], list], creator_result: str,
+                      preview: Optional[str]) -> list:
+        """
+        チェック役へのメッセージ
+        - 末尾に採点・判定の出力形式を指示
+        - 事前分析があれば差分評価の指示を追加
+        """
+        messages = checker_messages(creator_result)
+        instructions = [VERDICT_INSTRUCTION]
+        if preview:
+            instructions.insert(0, SPECULATIVE_DELTA_PROMPT.format(preview=preview))
+        return messages + [HumanMessage(content="\n\n".join(instructions))]
+    
+    def _checker_score(self, checker_result: str, preview: Optional[str] = None,
+                       verdict: Optional[dict] = None) -> dict:
+        score = {
+            "checker": AI_MODELS[self.config["checker"]]["name"],
+            "evaluation": checker_result,
+        }
+        if verdict:
+            score.update(verdict)
+        if preview:
+            score["preview"] = preview
+        return score
+    
+    def run_parallel(self, tasks: list[tuple[Any, Callable]], mode: str = "all", n: int = 1,
+                     timeout: float = 60, agree_key: Optional[Callable] = None,
+                     hedge_tasks: Optional[list[tuple[Any, Callable]]] = None,
+                     hedge_after: Optional[float] = None,
+                     hedge_percentile: float = 0.95) -> list[dict]:
         """
         並列実行（最速優先）
         tasks: [(ai_instance, callable), ...]
-        returns: [{"ai": ai_key, "result": result, "time": elapsed}, ...]
+        mode: "all"=全件待ち / "first"=先着n件で打ち切り / "quorum"=agree_key一致n件で打ち切り
+        hedge_tasks: 決着が遅い場合に追加送信する予備タスク（別プロバイダ）
+        returns: [{"ai": model, "result": result, "time": elapsed, "success": bool, ...}, ...]
+        """
+        return run_race(
+            tasks, mode=mode, n=n, timeout=timeout, agree_key=agree_key,
+            hedge_tasks=hedge_tasks, hedge_after=hedge_after, hedge_percentile=hedge_percentile,
+        )
+    
+    def _invoke_hedged(self, role: str, messages: list) -> str:
+        """
+        役割のAIを呼び出し、遅延時は hedge_roles の予備AIにも送信して先着を採用
+        - 予備AIへの送信は主AIの過去レイテンシのパーセンタイル経過後
         """
-        import time
-        results = []
+        backup_key = self.hedge_roles[role]
+        bypass = self._bypass_cache(role)
         
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            future_to_ai = {}
-            for ai_instance, task_func in tasks:
-                future = executor.submit(task_func, ai_instance)
-                future_to_ai[future] = ai_instance
-            
-            for future in as_completed(future_to_ai):
-                ai = future_to_ai[future]
-                start = time.time()
-                try:
-                    result = future.result(timeout=60)
-                    elapsed = time.time() - start
-                    results.append({
-                        "ai": str(ai),
-                        "result": result,
-                        "time": elapsed,
-                        "success": True,
-                    })
-                except Exception as e:
-                    results.append({
-                        "ai": str(ai),
-                        "result": None,
-                        "error": str(e),
-                        "success": False,
-                    })
+        def call(ai_instance):
+            with span("llm.hedge_call"):
+                return cached_invoke(ai_instance, messages, bypass=bypass)
         
-        return results
+        results = self.run_parallel(
+            [(getattr(self, f"{role}_ai"), call)],
+            mode="first",
+            timeout=self.hedge_timeout,
+            hedge_tasks=[(get_ai_instance(backup_key), call)],
+            hedge_percentile=self.hedge_percentile,
+        )
+        for r in results:
+            if r["success"]:
+                return r["result"]
+        errors = "; ".join(f"{r['ai']}: {r.get('error')}" for r in results)
+        raise RuntimeError(f"{role} の呼び出しに失敗しました（{errors}）")
     
-    def resolve(self, leader_result: str, checker_scores: list[dict]) -> dict:
+    def resolve(self, leader_result, checker_scores: list[dict],
+                verdict: Optional[dict] = None, leader_skipped: bool = False) -> dict:
         """
         調停ロジック
         - リーダーの判断を最終結果として採用
         - チェッカーのスコアは独立記録（口出し不可）
+        - leader_result がジェネレータの場合はストリーミング結果として返す
+        - leader_skipped=True の場合 leader_result は作成役の出力（早期終了）
         """
         return {
             "final_result": leader_result,
             "scores": checker_scores,
             "team": self.get_team_info(),
+            "streaming": not isinstance(leader_result, str),
+            "verdict": verdict,
+            "leader_skipped": leader_skipped,
         }
@@ -1,10 +1,10 @@
 # agents/coder.py
-# 行数: 28行
+# 行数: 52行
 # コード役エージェント
 
 from langchain_core.messages import HumanMessage
 from config import get_coder
-from utils import extract_content
+from utils import cached_invoke
 
 def call_coder(requirement_text: str) -> str:
     """コード役に依頼"""
@@ -12,7 +12,7 @@ def call_coder(requirement_text: str) -> str:
     messages = [
         HumanMessage(content=f"あなたは世界最高峰のソフトウェアエンジニアです。要件に基づき高品質なコードを書いてください。\n\n要件:\n{requirement_text}")
     ]
-    return extract_content(model.invoke(messages))
+    return cached_invoke(model, messages)
 
 def call_coder_fix(original_code: str, feedback: str) -> str:
     """コード役に修正依頼"""
@@ -29,4 +29,24 @@ def call_coder_fix(original_code: str, feedback: str) -> str:
 
 修正版のコードを出力してください。""")
     ]
-    return extract_content(model.invoke(messages))
+    return cached_invoke(model, messages)
+
+def call_coder_patch(original_code: str, feedback: str) -> str:
+    """コード役に差分（unified diff）での修正依頼"""
+    model = get_coder()
+    messages = [
+        HumanMessage(content=f"""あなたは世界最高峰のソフトウェアエンジニアです。
+以下のコードに対するレビュー指摘を受けて、修正箇所だけを unified diff 形式で出力してください。
+
+【元のコード】
+{original_code}
+
+【レビュー指摘】
+{feedback}
+
+ルール:
+- ```diff コードブロック1つに、@@ -開始行,行数 +開始行,行数 @@ 形式のハンクを並べる
+- 各ハンクには変更前後3行のコンテキストを元のコードと一字一句同じに含める
+- コード全体は出力しない""")
+    ]
+    return cached_invoke(model, messages)
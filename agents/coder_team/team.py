@@ -1,11 +1,10 @@
 # agents/coder_team/team.py
-# 行数: 112行
+# 行数: 110行
 # コーディングチーム（実装・レビュー・破壊テスト）
 
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from agents.base import TeamExecutor
-from config import AI_MODELS
 
 
 class CoderTeam(TeamExecutor):
@@ -16,32 +15,37 @@ class CoderTeam(TeamExecutor):
     - チェック役: GPT-5.2（レビュー/破壊テスト）
     """
     
-    def __init__(self):
-        super().__init__("coder")
+    def __init__(self, use_cache: bool = True, speculative: bool = None):
+        super().__init__("coder", use_cache=use_cache, speculative=speculative)
     
-    def run(self, task: str, context: str = "") -> dict:
+    def run(self, task: str, context: str = "", stream: bool = False) -> dict:
         """
         コーディングタスクを実行
+        stream=True の場合、長の出力をチャンク単位のジェネレータで返す
         """
-        # 1. 作成役（Claude）がコード作成
-        creator_result = self._run_creator(task, context)
-        
-        # 2. チェック役（GPT）がレビュー・破壊テスト
-        checker_result = self._run_checker(task, creator_result)
-        
-        # 3. 長（Claude）が最終判断・修正
-        leader_result = self._run_leader(task, creator_result, checker_result)
-        
-        # 4. 調停
-        return self.resolve(
-            leader_result=leader_result,
-            checker_scores=[{
-                "checker": AI_MODELS[self.config["checker"]]["name"],
-                "evaluation": checker_result,
-            }]
+        return self._execute(**self._pipeline(task, context), stream=stream)
+    
+    async def arun(self, task: str, context: str = "") -> dict:
+        """
+        コーディングタスクを非同期実行
+        共有イベントループ上で ainvoke を使い、プロバイダ別の同時実行数を制限
+        """
+        return await self._aexecute(**self._pipeline(task, context))
+    
+    def _pipeline(self, task: str, context: str = "") -> dict:
+        """作成役 → チェック役 → 長 のメッセージ構成"""
+        return dict(
+            # 1. 作成役（Claude）がコード作成
+            creator_messages=self._creator_messages(task, context),
+            # 2. チェック役（GPT）がレビュー・破壊テスト
+            checker_messages=lambda creator_result: self._checker_messages(task, creator_result),
+            # 3. 長（Claude）が最終判断・修正
+            leader_messages=lambda creator_result, checker_result: self._leader_messages(
+                task, creator_result, checker_result
+            ),
         )
     
-    def _run_creator(self, task: str, context: str) -> str:
+    def _creator_messages(self, task: str, context: str) -> list:
         """作成役: コード実装"""
         system_prompt = """あなたは優秀なソフトウェアエンジニアです。
 要求されたコードを実装してください。
@@ -57,10 +61,9 @@ class CoderTeam(TeamExecutor):
             HumanMessage(content=f"タスク: {task}\n\nコンテキスト:\n{context}" if context else f"タスク: {task}")
         ]
         
-        response = self.creator_ai.invoke(messages)
-        return response.content
+        return messages
     
-    def _run_checker(self, task: str, creator_result: str) -> str:
+    def _checker_messages(self, task: str, creator_result: str) -> list:
         """チェック役: レビュー・破壊テスト"""
         system_prompt = """あなたはコードレビューと破壊テストの専門家です。
 
@@ -79,10 +82,9 @@ class CoderTeam(TeamExecutor):
             HumanMessage(content=f"タスク: {task}\n\n作成されたコード:\n{creator_result}")
         ]
         
-        response = self.checker_ai.invoke(messages)
-        return response.content
+        return messages
     
-    def _run_leader(self, task: str, creator_result: str, checker_result: str) -> str:
+    def _leader_messages(self, task: str, creator_result: str, checker_result: str) -> list:
         """長: 最終判断・修正"""
         system_prompt = """あなたはコーディングチームの長です。
 作成役のコードとチェック役のレビュー結果を踏まえ、最終的なコードを出力してください。
@@ -105,5 +107,4 @@ class CoderTeam(TeamExecutor):
 上記を踏まえ、最終的なコードを出力してください。""")
         ]
         
-        response = self.leader_ai.invoke(messages)
-        return response.content
+        return messages
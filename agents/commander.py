@@ -1,15 +1,17 @@
 # agents/commander.py
-# 行数: 29行
+# 行数: 103行
 # 司令塔エージェント
 
 from langchain_core.messages import HumanMessage, SystemMessage
 from config import get_commander
-from utils import extract_content
+from utils import cached_invoke, cached_stream, set_attributes, span, trace_stream
+from .routing_cache import get_routing_cache
 
-def call_commander(user_input: str, chat_history: list) -> str:
-    """コンシェルジュに依頼（タスク振り分け・即答）"""
-    model = get_commander()
-    
+# エージェントへの振り分けタグ
+AGENT_TAGS = ("[AUDITOR]", "[CODER]", "[DATA]", "[SEARCH]")
+
+def _build_commander_messages(user_input: str, chat_history: list) -> list:
+    """司令塔へのメッセージを作成"""
     system_prompt = """あなたは優秀なコンシェルジュです。
 ユーザーの依頼を分析し、最適な対応を選んでください。
 
@@ -38,5 +40,64 @@ def call_commander(user_input: str, chat_history: list) -> str:
         else:
             messages.append(SystemMessage(content=msg["content"]))
     messages.append(HumanMessage(content=user_input))
+    return messages
+
+def call_commander(user_input: str, chat_history: list) -> str:
+    """
+    コンシェルジュに依頼（タスク振り分け・即答）
+    - 同じ依頼（表記ゆれ込み）と直近の履歴なら振り分けキャッシュから返す
+    """
+    routing_cache = get_routing_cache()
+    cached = routing_cache.get("commander", user_input, chat_history)
+    set_attributes(**{"routing_cache.hit": cached is not None})
+    if cached is not None:
+        return cached
+    
+    model = get_commander()
+    with span("commander", team="commander", role="commander"):
+        response = cached_invoke(model, _build_commander_messages(user_input, chat_history))
+    routing_cache.set("commander", user_input, chat_history, response)
+    return response
+
+def stream_commander(user_input: str, chat_history: list) -> tuple:
+    """
+    コンシェルジュにストリーミングで依頼
     
-    return extract_content(model.invoke(messages))
+    タグが現れるまで先読みして判定する:
+    - エージェントタグ → 全文を受信して (応答全文, None) を返す（process_command へ渡す）
+    - [SELF] → (None, 本文チャンクのジェネレータ) を返す（即答を逐次表示）
+    - タグのないまま終了 → 先読みした全文を即答として返す
+      （前置きの後にエージェントタグが来ることがあるため、タグなしの間は表示を始めない）
+    - 振り分けキャッシュにあれば司令塔を呼ばずに (応答全文, None)
+    """
+    routing_cache = get_routing_cache()
+    cached = routing_cache.get("commander", user_input, chat_history)
+    set_attributes(**{"routing_cache.hit": cached is not None})
+    if cached is not None:
+        return cached, None
+    
+    model = get_commander()
+    # 即答の場合、スパンは呼び出し元が残りのチャンクを流し終えた時点で閉じる
+    chunks = trace_stream("commander", cached_stream(model, _build_commander_messages(user_input, chat_history)),
+                          stream=True, team="commander", role="commander")
+    
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        if any(tag in buffer for tag in AGENT_TAGS):
+            response = buffer + "".join(chunks)
+            routing_cache.set("commander", user_input, chat_history, response)
+            return response, None
+        if "[SELF]" in buffer:
+            return None, _continue_self_stream(buffer, chunks)
+    
+    # エージェントタグが現れないまま終了した場合は即答
+    return None, _continue_self_stream(buffer, iter(()))
+
+def _continue_self_stream(head: str, rest):
+    """先読み済みの冒頭から [SELF] タグを除いて残りのチャンクを続けて返す"""
+    head = head.replace("[SELF]", "").lstrip()
+    if head:
+        yield head
+    for chunk in rest:
+        yield chunk.replace("[SELF]", "")
@@ -1,11 +1,12 @@
 # agents/concierge/team.py
-# 行数: 89行
+# 行数: 138行
 # コンシェルジュチーム（聞き取り・情報収集）
 
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from agents.base import TeamExecutor, get_ai_instance
-from config import AI_MODELS, get_team_config
+from agents.routing_cache import get_routing_cache
+from config import get_team_config
 
 
 class ConciergeTeam(TeamExecutor):
@@ -16,34 +17,71 @@ class ConciergeTeam(TeamExecutor):
     - チェック役: Perplexity（情報補完）
     """
     
-    def __init__(self):
-        super().__init__("concierge")
+    # 最新情報を扱うためキャッシュしない役割
+    live_roles = ("checker",)
+    # 情報補完が遅い場合は Grok にもヘッジ送信して先着を採用
+    hedge_roles = {"checker": "grok"}
+    # 長の出力（振り分けタグ）が必須のため早期終了しない
+    early_exit_threshold = None
     
-    def run(self, user_input: str, history: list = None) -> dict:
+    def __init__(self, use_cache: bool = True, speculative: bool = None):
+        super().__init__("concierge", use_cache=use_cache, speculative=speculative)
+    
+    def run(self, user_input: str, history: list = None, stream: bool = False) -> dict:
         """
         ユーザー入力を処理し、適切なチームに振り分ける
+        stream=True の場合、長の出力をチャンク単位のジェネレータで返す
+        同じ依頼と直近の履歴の振り分けはキャッシュから返す（3モデルを呼ばない）
         """
-        history = history or []
-        
-        # 1. 作成役（Gemini）が聞き取り・分析
-        creator_result = self._run_creator(user_input, history)
+        cached = self._cached_route(user_input, history)
+        if cached is not None:
+            return cached
         
-        # 2. チェック役（Perplexity）が情報補完
-        checker_result = self._run_checker(user_input, creator_result)
+        result = self._execute(**self._pipeline(user_input, history), stream=stream)
+        if isinstance(result["final_result"], str):
+            get_routing_cache().set("concierge", user_input, history, result["final_result"])
+        return result
+    
+    async def arun(self, user_input: str, history: list = None) -> dict:
+        """
+        ユーザー入力を非同期で処理し、適切なチームに振り分ける
+        共有イベントループ上で ainvoke を使い、プロバイダ別の同時実行数を制限
+        """
+        cached = self._cached_route(user_input, history)
+        if cached is not None:
+            return cached
         
-        # 3. 長（Grok）が最終判断
-        leader_result = self._run_leader(user_input, creator_result, checker_result)
+        result = await self._aexecute(**self._pipeline(user_input, history))
+        get_routing_cache().set("concierge", user_input, history, result["final_result"])
+        return result
+    
+    def _cached_route(self, user_input: str, history: list = None) -> dict:
+        """振り分けキャッシュにあれば resolve と同じ形式で返す"""
+        if not self.use_cache:
+            return None
+        cached = get_routing_cache().get("concierge", user_input, history or [])
+        if cached is None:
+            return None
+        result = self.resolve(cached, [])
+        result["routing_cache_hit"] = True
+        return result
+    
+    def _pipeline(self, user_input: str, history: list = None) -> dict:
+        """作成役 → チェック役 → 長 のメッセージ構成"""
+        history = history or []
         
-        # 4. 調停
-        return self.resolve(
-            leader_result=leader_result,
-            checker_scores=[{
-                "checker": AI_MODELS[self.config["checker"]]["name"],
-                "evaluation": checker_result,
-            }]
+        return dict(
+            # 1. 作成役（Gemini）が聞き取り・分析
+            creator_messages=self._creator_messages(user_input, history),
+            # 2. チェック役（Perplexity）が情報補完
+            checker_messages=lambda creator_result: self._checker_messages(user_input, creator_result),
+            # 3. 長（Grok）が最終判断
+            leader_messages=lambda creator_result, checker_result: self._leader_messages(
+                user_input, creator_result, checker_result
+            ),
         )
     
-    def _run_creator(self, user_input: str, history: list) -> str:
+    def _creator_messages(self, user_input: str, history: list) -> list:
         """作成役: ユーザーの意図を分析"""
         system_prompt = """あなたは優秀なコンシェルジュです。
 ユーザーの要求を正確に理解し、以下の形式で分析してください：
@@ -59,10 +97,9 @@ class ConciergeTeam(TeamExecutor):
             messages.append(HumanMessage(content=str(h)))
         messages.append(HumanMessage(content=user_input))
         
-        response = self.creator_ai.invoke(messages)
-        return response.content
+        return messages
     
-    def _run_checker(self, user_input: str, creator_result: str) -> str:
+    def _checker_messages(self, user_input: str, creator_result: str) -> list:
         """チェック役: 情報を補完"""
         system_prompt = """あなたは情報補完の専門家です。
 作成役の分析結果を確認し、不足している情報や最新の関連情報を追加してください。
@@ -73,10 +110,9 @@ class ConciergeTeam(TeamExecutor):
             HumanMessage(content=f"ユーザー入力: {user_input}\n\n作成役の分析:\n{creator_result}")
         ]
         
-        response = self.checker_ai.invoke(messages)
-        return response.content
+        return messages
     
-    def _run_leader(self, user_input: str, creator_result: str, checker_result: str) -> str:
+    def _leader_messages(self, user_input: str, creator_result: str, checker_result: str) -> list:
         """長: 最終判断"""
         system_prompt = """あなたはコンシェルジュチームの長です。
 作成役とチェック役の結果を総合し、最終的な判断を下してください。
@@ -99,5 +135,4 @@ class ConciergeTeam(TeamExecutor):
 上記を踏まえ、最終判断を下してください。""")
         ]
         
-        response = self.leader_ai.invoke(messages)
-        return response.content
+        return messages
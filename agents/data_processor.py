@@ -1,10 +1,10 @@
 # agents/data_processor.py
-# 行数: 13行
+# 行数: 16行
 # データ役エージェント
 
 from langchain_core.messages import HumanMessage, SystemMessage
 from config import get_data_processor
-from utils import extract_content
+from utils import cached_invoke
 
 def call_data_processor(text_data: str) -> str:
     """データ役に依頼"""
@@ -13,4 +13,4 @@ def call_data_processor(text_data: str) -> str:
         SystemMessage(content="あなたは優秀なデータ処理係です。テキストを分析し、重要なポイントを要約して整理してください。日本語で回答。"),
         HumanMessage(content=text_data)
     ]
-    return extract_content(model.invoke(messages))
+    return cached_invoke(model, messages)
@@ -1,11 +1,10 @@
 # agents/data_team/team.py
-# 行数: 105行
+# 行数: 112行
 # データ確認・保存チーム（データ処理・整合性チェック）
 
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from agents.base import TeamExecutor
-from config import AI_MODELS
 
 
 class DataTeam(TeamExecutor):
@@ -16,33 +15,38 @@ class DataTeam(TeamExecutor):
     - チェック役: Grok 4.1 Thinking（整合性チェック）
     """
     
-    def __init__(self):
-        super().__init__("data")
+    def __init__(self, use_cache: bool = True, speculative: bool = None):
+        super().__init__("data", use_cache=use_cache, speculative=speculative)
     
-    def run(self, data: str, operation: str = "process") -> dict:
+    def run(self, data: str, operation: str = "process", stream: bool = False) -> dict:
         """
         データ処理タスクを実行
         operation: process / save / validate / transform
+        stream=True の場合、長の出力をチャンク単位のジェネレータで返す
         """
-        # 1. 作成役（Llama）がデータ処理
-        creator_result = self._run_creator(data, operation)
-        
-        # 2. チェック役（Grok）が整合性チェック
-        checker_result = self._run_checker(data, creator_result, operation)
-        
-        # 3. 長（Llama）が最終判断
-        leader_result = self._run_leader(data, creator_result, checker_result, operation)
-        
-        # 4. 調停
-        return self.resolve(
-            leader_result=leader_result,
-            checker_scores=[{
-                "checker": AI_MODELS[self.config["checker"]]["name"],
-                "evaluation": checker_result,
-            }]
+        return self._execute(**self._pipeline(data, operation), stream=stream)
+    
+    async def arun(self, data: str, operation: str = "process") -> dict:
+        """
+        データ処理タスクを非同期実行
+        共有イベントループ上で ainvoke を使い、プロバイダ別の同時実行数を制限
+        """
+        return await self._aexecute(**self._pipeline(data, operation))
+    
+    def _pipeline(self, data: str, operation: str = "process") -> dict:
+        """作成役 → チェック役 → 長 のメッセージ構成"""
+        return dict(
+            # 1. 作成役（Llama）がデータ処理
+            creator_messages=self._creator_messages(data, operation),
+            # 2. チェック役（Grok）が整合性チェック
+            checker_messages=lambda creator_result: self._checker_messages(data, creator_result, operation),
+            # 3. 長（Llama）が最終判断
+            leader_messages=lambda creator_result, checker_result: self._leader_messages(
+                data, creator_result, checker_result, operation
+            ),
         )
     
-    def _run_creator(self, data: str, operation: str) -> str:
+    def _creator_messages(self, data: str, operation: str) -> list:
         """作成役: データ処理"""
         system_prompt = f"""あなたはデータ処理の専門家です。
 指定された操作（{operation}）を実行してください。
@@ -60,10 +64,9 @@ class DataTeam(TeamExecutor):
             HumanMessage(content=f"操作: {operation}\n\nデータ:\n{data}")
         ]
         
-        response = self.creator_ai.invoke(messages)
-        return response.content
+        return messages
     
-    def _run_checker(self, data: str, creator_result: str, operation: str) -> str:
+    def _checker_messages(self, data: str, creator_result: str, operation: str) -> list:
         """チェック役: 整合性チェック"""
         system_prompt = """あなたはデータ整合性チェックの専門家です。
 作成役の処理結果を検証してください。
@@ -81,10 +84,9 @@ class DataTeam(TeamExecutor):
             HumanMessage(content=f"操作: {operation}\n\n元データ:\n{data}\n\n処理結果:\n{creator_result}")
         ]
         
-        response = self.checker_ai.invoke(messages)
-        return response.content
+        return messages
     
-    def _run_leader(self, data: str, creator_result: str, checker_result: str, operation: str) -> str:
+    def _leader_messages(self, data: str, creator_result: str, checker_result: str, operation: str) -> list:
         """長: 最終判断"""
         system_prompt = """あなたはデータチームの長です。
 作成役の処理結果とチェック役の検証結果を踏まえ、最終的なデータ処理結果を出力してください。
@@ -107,5 +109,4 @@ class DataTeam(TeamExecutor):
 上記を踏まえ、最終的な処理結果を出力してください。""")
         ]
         
-        response = self.leader_ai.invoke(messages)
-        return response.content
+        return messages
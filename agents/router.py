@@ -0,0 +1,310 @@
+# agents/router.py
+# 行数: 310行
+# ローカル高速ルーター（キーワード・正規表現ルール + 過去の振り分けから学習する分類器）
+
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+# データベースパス
+DB_PATH = Path(__file__).parent.parent / 'data' / 'routing.db'
+
+# この確信度以上ならチームへ直接振り分け（未満は司令塔へ）
+FAST_PATH_CONFIDENCE = 0.8
+# 分類器を使い始める学習データ件数
+MIN_TRAINING_SAMPLES = 30
+# 司令塔の振り分けがこの件数増えるごとにバックグラウンドで再学習
+RETRAIN_EVERY = 20
+# 再学習に使う直近の司令塔の振り分け件数
+TRAINING_WINDOW = 5000
+# routing_log に残す件数（再学習時に古い記録から削除）
+LOG_MAX_ROWS = 50000
+
+# 司令塔が返すタグ（[SELF] は回答生成が必要なので高速経路では選ばない）
+ROUTABLE_TAGS = ("[CODER]", "[SEARCH]", "[DATA]", "[AUDITOR]")
+ALL_TAGS = ROUTABLE_TAGS + ("[SELF]",)
+
+# (タグ, パターン, 確信度)
+RULES = [
+    ("[CODER]", re.compile(r'```'), 0.9),
+    ("[CODER]", re.compile(r'(コード|プログラム|関数|クラス|スクリプト|API).{0,6}(書いて|作って|実装|作成)'), 0.9),
+    ("[CODER]", re.compile(r'(実装して|リファクタ|バグを?直して|デバッグ)'), 0.75),
+    ("[CODER]", re.compile(r'(?<![a-z])(python|javascript|typescript|sql|rust|golang|java)(?![a-z])'), 0.5),
+    ("[SEARCH]", re.compile(r'(検索して|調べて|ググって)'), 0.75),
+    ("[SEARCH]", re.compile(r'(最新|ニュース|速報|今日の|現在の|株価|天気)'), 0.6),
+    ("[DATA]", re.compile(r'(要約して|まとめて|集計して|整理して)'), 0.75),
+    ("[DATA]", re.compile(r'(csv|json|表形式|データを?(分析|整形|変換))'), 0.6),
+    ("[AUDITOR]", re.compile(r'(監査して|レビューして|脆弱性|リスクを?(洗い出|評価))'), 0.75),
+]
+
+
+@dataclass
+class RouteDecision:
+    """ローカル振り分けの結果"""
+    tag: str
+    confidence: float
+    source: str  # "rule" / "classifier" / "rule+classifier"
+    scores: Dict[str, float]
+
+    def commander_response(self, task: str) -> str:
+        """process_command が解釈できる司令塔応答の形式"""
+        return f"{self.tag}\n{task}"
+
+
+def normalize(text: str) -> str:
+    """全角半角・大文字小文字・空白を正規化"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text or '')).strip().lower()
+
+
+def _features(text: str) -> Counter:
+    """文字バイグラム（分かち書き不要で日本語にも使える）"""
+    text = normalize(text)[:2000]
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def extract_tag(commander_response: str) -> str:
+    """司令塔応答から振り分けタグを取り出す（なければ [SELF]）"""
+    for tag in ROUTABLE_TAGS:
+        if tag in (commander_response or ""):
+            return tag
+    return "[SELF]"
+
+
+class NaiveBayesRouter:
+    """文字バイグラムの多項ナイーブベイズ"""
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.label_counts = Counter()
+        self.feature_counts = defaultdict(Counter)
+        self.feature_totals = Counter()
+        self.vocabulary = set()
+
+    @property
+    def samples(self) -> int:
+        return sum(self.label_counts.values())
+
+    def fit(self, rows):
+        """rows: [(message, tag), ...]"""
+        self._reset()
+        for message, tag in rows:
+            features = _features(message)
+            self.label_counts[tag] += 1
+            self.feature_counts[tag].update(features)
+            self.feature_totals[tag] += sum(features.values())
+            self.vocabulary.update(features)
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        if len(self.label_counts) < 2:
+            return {}
+        features = _features(text)
+        vocab_size = len(self.vocabulary) + 1
+        total = self.samples
+        log_probs = {}
+        for tag, count in self.label_counts.items():
+            log_p = math.log(count / total)
+            denominator = self.feature_totals[tag] + vocab_size
+            counts = self.feature_counts[tag]
+            for feature, n in features.items():
+                log_p += n * math.log((counts[feature] + 1) / denominator)
+            log_probs[tag] = log_p
+        peak = max(log_probs.values())
+        exp = {tag: math.exp(lp - peak) for tag, lp in log_probs.items()}
+        norm = sum(exp.values())
+        return {tag: v / norm for tag, v in exp.items()}
+
+
+class LocalRouter:
+    """
+    司令塔の前段で動くローカル振り分け
+    - キーワード・正規表現ルールと、過去の司令塔の振り分けで学習した分類器を併用
+    - 確信度が閾値以上ならチームへ直接振り分け、未満は None（司令塔へフォールバック）
+    - すべての判断を routing_log に記録（再学習用。直近 LOG_MAX_ROWS 件を保持）
+    """
+
+    def __init__(self, db_path=None, threshold: float = FAST_PATH_CONFIDENCE,
+                 min_samples: int = MIN_TRAINING_SAMPLES):
+        self.db_path = Path(db_path) if db_path else DB_PATH
+        if str(self.db_path) != ":memory:":
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.classifier = NaiveBayesRouter()
+        self._lock = threading.Lock()
+        self._new_labels = 0
+        self._training = False
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._init_db()
+        self.train()
+
+    def _init_db(self):
+        with self._lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS routing_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    confidence REAL,
+                    local_tag TEXT,
+                    local_confidence REAL,
+                    source TEXT NOT NULL,
+                    fast_path BOOLEAN DEFAULT 0,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_routing_source ON routing_log(source)')
+            self.conn.commit()
+
+    # ------------------------------------------
+    # 学習
+    # ------------------------------------------
+    def training_rows(self) -> list:
+        """司令塔が実際に振り分けた直近 TRAINING_WINDOW 件（ローカル判断は教師データにしない）"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT message, tag FROM routing_log WHERE source = 'commander' ORDER BY id DESC LIMIT ?",
+                (TRAINING_WINDOW,)
+            ).fetchall()
+
+    def prune_log(self) -> int:
+        """routing_log を直近 LOG_MAX_ROWS 件に切り詰め、削除件数を返す"""
+        with self._lock:
+            cursor = self.conn.execute(
+                "DELETE FROM routing_log WHERE id <= (SELECT MAX(id) FROM routing_log) - ?",
+                (LOG_MAX_ROWS,)
+            )
+            self.conn.commit()
+            return cursor.rowcount
+
+    def train(self) -> int:
+        """routing_log から分類器を再学習し、学習件数を返す"""
+        self.prune_log()
+        classifier = NaiveBayesRouter().fit(self.training_rows())
+        self.classifier = classifier
+        return classifier.samples
+
+    def _retrain_in_background(self):
+        try:
+            self.train()
+        except Exception as e:
+            print(f"⚠️ ルーターの再学習エラー: {e}")
+        finally:
+            with self._lock:
+                self._training = False
+
+    # ------------------------------------------
+    # 判定
+    # ------------------------------------------
+    def rule_scores(self, text: str) -> Dict[str, float]:
+        """ルールに一致したタグごとの確信度（複数一致は 1-Π(1-c) で合成）"""
+        text = normalize(text)
+        misses = defaultdict(lambda: 1.0)
+        for tag, pattern, confidence in RULES:
+            if pattern.search(text):
+                misses[tag] *= 1 - confidence
+        return {tag: 1 - miss for tag, miss in misses.items()}
+
+    def classify(self, text: str) -> Optional[RouteDecision]:
+        """最も確からしいタグと確信度（判断材料がなければ None）"""
+        rules = self.rule_scores(text)
+        # 複数のタグに一致した場合は競合分だけ確信度を下げる
+        if len(rules) > 1:
+            ranked = sorted(rules.values(), reverse=True)
+            rules = {tag: score * (1 - ranked[1]) if score == ranked[0] else score
+                     for tag, score in rules.items()}
+
+        probabilities = {}
+        if self.classifier.samples >= self.min_samples:
+            probabilities = self.classifier.predict_proba(text)
+
+        if rules and probabilities:
+            scores = {tag: (rules.get(tag, 0) + probabilities.get(tag, 0)) / 2 for tag in ALL_TAGS}
+            source = "rule+classifier"
+        elif rules:
+            scores, source = rules, "rule"
+        elif probabilities:
+            scores, source = probabilities, "classifier"
+        else:
+            return None
+
+        tag = max(scores, key=scores.get)
+        return RouteDecision(tag=tag, confidence=scores[tag], source=source, scores=scores)
+
+    def route(self, text: str) -> Optional[RouteDecision]:
+        """
+        高速経路で振り分けられればその判断を返す（記録あり）
+        - 確信度不足または [SELF] の場合は None（呼び出し側で司令塔を使う）
+        """
+        decision = self.classify(text)
+        if decision is None or decision.tag not in ROUTABLE_TAGS or decision.confidence < self.threshold:
+            return None
+        self._log(text, decision.tag, decision.confidence, decision.source, decision, fast_path=True)
+        return decision
+
+    def record_commander(self, text: str, commander_response: str):
+        """司令塔の振り分け結果を教師データとして記録（採用されなかったローカル判断も併記）"""
+        self._log(text, extract_tag(commander_response), None, "commander", self.classify(text), fast_path=False)
+        with self._lock:
+            self._new_labels += 1
+            if self._new_labels < RETRAIN_EVERY or self._training:
+                return
+            self._new_labels = 0
+            self._training = True
+        # 再学習はリクエストを待たせないようにバックグラウンドで（学習中は重ねて起動しない）
+        # core は agents を読み込むため、循環 import を避けて関数内で読み込む
+        from core.parallel_executor import submit
+        submit(self._retrain_in_background)
+
+    def _log(self, text: str, tag: str, confidence: Optional[float], source: str,
+             local: Optional[RouteDecision], fast_path: bool):
+        with self._lock:
+            self.conn.execute(
+                '''INSERT INTO routing_log
+                   (message, tag, confidence, local_tag, local_confidence, source, fast_path)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                (text[:2000], tag, confidence,
+                 local.tag if local else None, local.confidence if local else None,
+                 source, int(fast_path))
+            )
+            self.conn.commit()
+
+    def stats(self) -> dict:
+        """振り分け件数（高速経路 / 司令塔）"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT fast_path, COUNT(*) FROM routing_log GROUP BY fast_path"
+            ).fetchall()
+        counts = {bool(fast): n for fast, n in rows}
+        total = sum(counts.values())
+        return {
+            "fast_path": counts.get(True, 0),
+            "commander": counts.get(False, 0),
+            "fast_path_rate": counts.get(True, 0) / total if total else 0.0,
+            "training_samples": self.classifier.samples,
+        }
+
+
+# ==========================================
+# 共有インスタンス
+# ==========================================
+_router: Optional[LocalRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> LocalRouter:
+    """プロセス共有のルーターを取得"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = LocalRouter()
+    return _router
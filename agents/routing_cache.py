@@ -0,0 +1,169 @@
+# agents/routing_cache.py
+# 行数: 169行
+# 振り分け結果キャッシュ（正規化したプロンプト + 直近の履歴 → タグ・依頼内容）
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from .router import DB_PATH, ROUTABLE_TAGS, extract_tag, normalize
+
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+# キーに含める直近の履歴件数
+HISTORY_TURNS = 2
+
+_TRAILING_PUNCTUATION = re.compile(r'[。．.！!？?…〜~\s]+$')
+# 添付ファイル部の見出し（ui/chat_uploader.get_uploaded_files_for_prompt が付ける）
+ATTACHMENT_MARKER = "【添付ファイル】"
+_CODE_BLOCK = re.compile(r'```.*?```', re.S)
+
+
+def _team_config_snapshot() -> dict:
+    from config import DEFAULT_TEAM_CONFIG, get_team_config
+    return {team: get_team_config(team) for team in DEFAULT_TEAM_CONFIG}
+
+
+def fingerprint_prompt(prompt: str) -> str:
+    """
+    表記ゆれ（全角半角・大小文字・連続した空白・末尾の句読点）を吸収した指紋
+    - 正規化するのは依頼の文章だけ。コードブロックと添付ファイルは原文のまま含める
+      （インデントや空白だけが違うコードを同じ依頼とみなさない）
+    """
+    instruction, _, attachments = prompt.partition(ATTACHMENT_MARKER)
+    code_blocks = _CODE_BLOCK.findall(instruction)
+    text = _TRAILING_PUNCTUATION.sub('', normalize(_CODE_BLOCK.sub(' ', instruction)))
+    digest = hashlib.sha256(text.encode())
+    for verbatim in code_blocks + [attachments]:
+        digest.update(b'\0' + verbatim.encode())
+    return digest.hexdigest()
+
+
+def _history_text(history: list, turns: int) -> list:
+    texts = []
+    for h in (history or [])[-turns:]:
+        content = h.get("content", "") if isinstance(h, dict) else h
+        texts.append(normalize(str(content))[:500])
+    return texts
+
+
+class RoutingCache:
+    """
+    司令塔・コンシェルジュの振り分け結果キャッシュ
+    - キー: 正規化したプロンプトの指紋 + 直近 HISTORY_TURNS 件の履歴
+    - 値: タグと司令塔が書き換えた依頼内容（応答全文）
+    - TTL 経過、またはチーム構成（get_team_config）が変わったら無効
+    """
+
+    def __init__(self, db_path=None, ttl: float = DEFAULT_TTL_SECONDS,
+                 history_turns: int = HISTORY_TURNS,
+                 config_provider: Optional[Callable[[], dict]] = None):
+        self.db_path = Path(db_path) if db_path else DB_PATH
+        if str(self.db_path) != ":memory:":
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.history_turns = history_turns
+        self.config_provider = config_provider or _team_config_snapshot
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self._lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS routing_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    config_version TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            self.conn.commit()
+
+    def config_version(self) -> str:
+        """
+        現在のチーム構成の指紋
+        - エントリごとに保存し、読み出し時に一致しなければ破棄
+        - セッションごとにチーム構成が違っても互いのエントリを消さない
+        """
+        snapshot = json.dumps(self.config_provider(), sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(snapshot.encode()).hexdigest()[:16]
+
+    def make_key(self, scope: str, prompt: str, history: list) -> str:
+        payload = json.dumps({
+            "scope": scope,
+            "prompt": fingerprint_prompt(prompt),
+            "history": _history_text(history, self.history_turns),
+        }, ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, scope: str, prompt: str, history: list) -> Optional[str]:
+        """キャッシュ済みの応答全文（なければ None）"""
+        key = self.make_key(scope, prompt, history)
+        version = self.config_version()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response, config_version, created_at FROM routing_cache WHERE cache_key = ?",
+                (key,)
+            ).fetchone()
+            if row and (row[1] != version or time.time() - row[2] > self.ttl):
+                self.conn.execute("DELETE FROM routing_cache WHERE cache_key = ?", (key,))
+                self.conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def set(self, scope: str, prompt: str, history: list, response: str):
+        """エージェントへの振り分けだけを保存（[SELF] の即答は保存しない）"""
+        tag = extract_tag(response)
+        if tag not in ROUTABLE_TAGS:
+            return
+        key = self.make_key(scope, prompt, history)
+        version = self.config_version()
+        now = time.time()
+        with self._lock:
+            # 期限切れのエントリはついでに掃除
+            self.conn.execute("DELETE FROM routing_cache WHERE created_at < ?", (now - self.ttl,))
+            self.conn.execute(
+                '''INSERT OR REPLACE INTO routing_cache
+                   (cache_key, scope, tag, response, config_version, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                (key, scope, tag, response, version, now)
+            )
+            self.conn.commit()
+
+    def invalidate(self):
+        """全エントリを破棄"""
+        with self._lock:
+            self.conn.execute("DELETE FROM routing_cache")
+            self.conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+
+# ==========================================
+# 共有インスタンス
+# ==========================================
+_routing_cache: Optional[RoutingCache] = None
+_routing_cache_lock = threading.Lock()
+
+
+def get_routing_cache() -> RoutingCache:
+    """プロセス共有の振り分けキャッシュを取得"""
+    global _routing_cache
+    if _routing_cache is None:
+        with _routing_cache_lock:
+            if _routing_cache is None:
+                _routing_cache = RoutingCache()
+    return _routing_cache
@@ -1,10 +1,11 @@
 # agents/searcher.py
-# 行数: 13行
+# 行数: 20行
 # 検索役エージェント（Grok）
 
 from langchain_core.messages import HumanMessage, SystemMessage
 from config import get_searcher
-from utils import extract_content
+from utils import extract_content, record_usage, span
+from utils.llm_cache import get_model_name
 
 def call_searcher(query: str) -> str:
     """検索役（Grok）に依頼"""
@@ -13,4 +14,7 @@ def call_searcher(query: str) -> str:
         SystemMessage(content="あなたは世界最高峰のリアルタイム情報検索エージェントです。深い推論を用いて最新情報を正確に検索し、X（Twitter）の最新データも活用して回答してください。日本語で回答。"),
         HumanMessage(content=query)
     ]
-    return extract_content(model.invoke(messages))
+    with span("searcher", team="searcher", role="searcher"):
+        response = model.invoke(messages)
+        record_usage(response, get_model_name(model))
+    return extract_content(response)
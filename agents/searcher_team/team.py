@@ -1,11 +1,10 @@
 # agents/searcher_team/team.py
-# 行数: 108行
+# 行数: 116行
 # 検索チーム（検索実行・結果検証）
 
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from agents.base import TeamExecutor
-from config import AI_MODELS
 
 
 class SearcherTeam(TeamExecutor):
@@ -16,32 +15,42 @@ class SearcherTeam(TeamExecutor):
     - チェック役: Llama 3.3 70B（結果検証）
     """
     
-    def __init__(self):
-        super().__init__("searcher")
+    # 最新情報を扱うためキャッシュしない役割
+    live_roles = ("creator",)
+    # 検索が遅い場合は Grok にもヘッジ送信して先着を採用
+    hedge_roles = {"creator": "grok"}
     
-    def run(self, query: str, context: str = "") -> dict:
+    def __init__(self, use_cache: bool = True, speculative: bool = None):
+        super().__init__("searcher", use_cache=use_cache, speculative=speculative)
+    
+    def run(self, query: str, context: str = "", stream: bool = False) -> dict:
         """
         検索タスクを実行
+        stream=True の場合、長の出力をチャンク単位のジェネレータで返す
         """
-        # 1. 作成役（Perplexity）が検索実行
-        creator_result = self._run_creator(query, context)
-        
-        # 2. チェック役（Llama）が結果検証
-        checker_result = self._run_checker(query, creator_result)
-        
-        # 3. 長（Grok）が最終判断・統合
-        leader_result = self._run_leader(query, creator_result, checker_result)
-        
-        # 4. 調停
-        return self.resolve(
-            leader_result=leader_result,
-            checker_scores=[{
-                "checker": AI_MODELS[self.config["checker"]]["name"],
-                "evaluation": checker_result,
-            }]
+        return self._execute(**self._pipeline(query, context), stream=stream)
+    
+    async def arun(self, query: str, context: str = "") -> dict:
+        """
+        検索タスクを非同期実行
+        共有イベントループ上で ainvoke を使い、プロバイダ別の同時実行数を制限
+        """
+        return await self._aexecute(**self._pipeline(query, context))
+    
+    def _pipeline(self, query: str, context: str = "") -> dict:
+        """作成役 → チェック役 → 長 のメッセージ構成"""
+        return dict(
+            # 1. 作成役（Perplexity）が検索実行
+            creator_messages=self._creator_messages(query, context),
+            # 2. チェック役（Llama）が結果検証
+            checker_messages=lambda creator_result: self._checker_messages(query, creator_result),
+            # 3. 長（Grok）が最終判断・統合
+            leader_messages=lambda creator_result, checker_result: self._leader_messages(
+                query, creator_result, checker_result
+            ),
         )
     
-    def _run_creator(self, query: str, context: str) -> str:
+    def _creator_messages(self, query: str, context: str) -> list:
         """作成役: 検索実行"""
         system_prompt = """あなたは検索の専門家です。
 クエリに基づいて最新かつ正確な情報を検索・収集してください。
@@ -57,10 +66,9 @@ class SearcherTeam(TeamExecutor):
             HumanMessage(content=f"検索クエリ: {query}\n\nコンテキスト:\n{context}" if context else f"検索クエリ: {query}")
         ]
         
-        response = self.creator_ai.invoke(messages)
-        return response.content
+        return messages
     
-    def _run_checker(self, query: str, creator_result: str) -> str:
+    def _checker_messages(self, query: str, creator_result: str) -> list:
         """チェック役: 結果検証"""
         system_prompt = """あなたは情報検証の専門家です。
 検索結果の信頼性と正確性を検証してください。
@@ -79,10 +87,9 @@ class SearcherTeam(TeamExecutor):
             HumanMessage(content=f"検索クエリ: {query}\n\n検索結果:\n{creator_result}")
         ]
         
-        response = self.checker_ai.invoke(messages)
-        return response.content
+        return messages
     
-    def _run_leader(self, query: str, creator_result: str, checker_result: str) -> str:
+    def _leader_messages(self, query: str, creator_result: str, checker_result: str) -> list:
         """長: 最終判断・統合"""
         system_prompt = """あなたは検索チームの長です。
 検索結果と検証結果を統合し、最終的な回答を作成してください。
@@ -106,5 +113,4 @@ class SearcherTeam(TeamExecutor):
 上記を踏まえ、最終的な回答を作成してください。""")
         ]
         
-        response = self.leader_ai.invoke(messages)
-        return response.content
+        return messages
@@ -16,10 +16,13 @@ from agents.coder_team import CoderTeam
 from agents.auditor_team import AuditorTeam
 from agents.data_team import DataTeam
 from agents.searcher_team import SearcherTeam
-from core import generate_crosscheck_summary
-from failure_tracker import FailureTracker
+from core import generate_crosscheck_summary, request_llm_summary
+from core.async_engine import run_sync
+from core.scoring import aggregate_scores
+from failure_tracker import get_failure_tracker as get_shared_failure_tracker
 from failure_analyzer import FailureAnalyzer
 from learning_integrator import LearningSkillsIntegrator
+from utils import current_span, set_attributes, span, track_stream, traced, usage_totals
 from core.artifact_store import ArtifactStore
 
 # UI モジュール
@@ -43,7 +46,7 @@ except ImportError:
 # ==========================================
 @st.cache_resource
 def get_failure_tracker():
-    return FailureTracker()
+    return get_shared_failure_tracker()
 
 @st.cache_resource
 def get_failure_analyzer():
@@ -131,14 +134,27 @@ section[data-testid="stSidebar"] > div::-webkit-scrollbar-thumb:hover {
 # ==========================================
 # 処理の振り分け
 # ==========================================
-def process_command(commander_response: str, original_input: str, use_loop: bool, use_crosscheck: bool = True) -> tuple:
-    """司令塔の指示を処理"""
+def _run_team(team, task, stream):
+    """ストリーミング時は同期の run、それ以外は共有イベントループ上の arun でチームを実行"""
+    if stream:
+        return team.run(task, stream=True)
+    return run_sync(team.arun(task))
+
+@traced("process_command")
+def process_command(commander_response: str, original_input: str, use_loop: bool, use_crosscheck: bool = True, stream: bool = False, speculative: bool = False) -> tuple:
+    """
+    司令塔の指示を処理
+    stream=True の場合、チームの結果は長の出力チャンクのジェネレータで返す
+    speculative=True の場合、チェック役の事前分析を作成役と並行実行
+    """
     agent_type = None
     result = None
     loop_data = None
     task = original_input
     execution_id = str(uuid.uuid4())
     tracker = get_failure_tracker()
+    # チームの全呼び出し（ストリームの長を含む）の使用量がこのスパンに積み上がる
+    command_span = current_span()
     
     agent_role_map = {
         "auditor": "監査チーム",
@@ -147,74 +163,101 @@ def process_command(commander_response: str, original_input: str, use_loop: bool
         "searcher": "検索チーム"
     }
     
+    def record_start():
+        set_attributes(agent=agent_type, speculative=speculative, stream=stream)
+        tracker.start_execution(
+            execution_id=execution_id,
+            agent_name=agent_role_map.get(agent_type, agent_type),
+            role=agent_type,
+            task_description=task[:200] if task else original_input[:200]
+        )
+    
+    def record_success():
+        token_used, cost_usd = usage_totals(command_span)
+        tracker.finish_execution(execution_id, status='success', token_used=token_used, cost_usd=cost_usd)
+    
+    def record_failure(e):
+        token_used, cost_usd = usage_totals(command_span)
+        tracker.finish_execution(
+            execution_id,
+            status='failed',
+            error_message=str(e),
+            error_type=type(e).__name__,
+            token_used=token_used,
+            cost_usd=cost_usd
+        )
+    
+    def record_cancel():
+        token_used, cost_usd = usage_totals(command_span)
+        tracker.finish_execution(execution_id, status='cancelled', token_used=token_used, cost_usd=cost_usd)
+    
     try:
         if "[AUDITOR]" in commander_response:
             task = commander_response.split("[AUDITOR]")[-1].strip() or original_input
             agent_type = "auditor"
-            team = AuditorTeam()
-            team_result = team.run(task)
+            record_start()
+            team = AuditorTeam(speculative=speculative)
+            team_result = _run_team(team, task, stream)
             result = team_result["final_result"]
-            loop_data = {"team_info": team_result.get("team"), "scores": team_result.get("scores")}
+            loop_data = {"team_info": team_result.get("team"), "scores": team_result.get("scores"), "leader_skipped": team_result.get("leader_skipped", False)}
         
         elif "[CODER]" in commander_response:
             task = commander_response.split("[CODER]")[-1].strip() or original_input
             agent_type = "coder"
-            team = CoderTeam()
-            team_result = team.run(task)
+            record_start()
+            team = CoderTeam(speculative=speculative)
+            team_result = _run_team(team, task, stream)
             result = team_result["final_result"]
-            loop_data = {"team_info": team_result.get("team"), "scores": team_result.get("scores")}
+            loop_data = {"team_info": team_result.get("team"), "scores": team_result.get("scores"), "leader_skipped": team_result.get("leader_skipped", False)}
         
         elif "[DATA]" in commander_response:
             task = commander_response.split("[DATA]")[-1].strip() or original_input
             agent_type = "data"
-            team = DataTeam()
-            team_result = team.run(task)
+            record_start()
+            team = DataTeam(speculative=speculative)
+            team_result = _run_team(team, task, stream)
             result = team_result["final_result"]
-            loop_data = {"team_info": team_result.get("team"), "scores": team_result.get("scores")}
+            loop_data = {"team_info": team_result.get("team"), "scores": team_result.get("scores"), "leader_skipped": team_result.get("leader_skipped", False)}
         
         elif "[SEARCH]" in commander_response:
             task = commander_response.split("[SEARCH]")[-1].strip() or original_input
             agent_type = "searcher"
-            team = SearcherTeam()
-            team_result = team.run(task)
+            record_start()
+            team = SearcherTeam(speculative=speculative)
+            team_result = _run_team(team, task, stream)
             result = team_result["final_result"]
-            loop_data = {"team_info": team_result.get("team"), "scores": team_result.get("scores")}
+            loop_data = {"team_info": team_result.get("team"), "scores": team_result.get("scores"), "leader_skipped": team_result.get("leader_skipped", False)}
         
         else:
             clean_response = commander_response.replace("[SELF]", "").strip()
             return "self", clean_response, None
         
-        tracker.record_execution(
-            execution_id=execution_id,
-            agent_name=agent_role_map.get(agent_type, agent_type),
-            role=agent_type,
-            task_description=task[:200],
-            status='success'
-        )
+        if isinstance(result, str):
+            record_success()
+        else:
+            # ストリーミング時はストリームが終わった時点で記録
+            result = track_stream(result, record_success, record_failure, record_cancel)
         
         crosscheck_data = None
         if use_crosscheck and agent_type and loop_data:
-            crosscheck_data = {
-                "checks": loop_data.get("scores", []),
-                "team": loop_data.get("team_info", {})
-            }
-            if crosscheck_data["checks"]:
-                summary = generate_crosscheck_summary(crosscheck_data["checks"])
-                crosscheck_data["summary"] = summary
+            with span("crosscheck", checks=len(loop_data.get("scores") or [])):
+                crosscheck_data = {
+                    "checks": loop_data.get("scores", []),
+                    "team": loop_data.get("team_info", {})
+                }
+                if crosscheck_data["checks"]:
+                    # 採点はローカルで集計し、LLMによるまとめは任意でバックグラウンド生成
+                    crosscheck_data["aggregate"] = aggregate_scores(crosscheck_data["checks"])
+                    crosscheck_data["summary"] = generate_crosscheck_summary(crosscheck_data["checks"])
+                    if st.session_state.get("use_llm_summary", False):
+                        crosscheck_data["llm_summary_future"] = request_llm_summary(crosscheck_data["checks"])
         
         return agent_type, result, {"loop_data": loop_data, "crosscheck": crosscheck_data}
         
     except Exception as e:
+        # 成功を記録した後の例外（クロスチェックなど）は finish_execution 側で無視される
         if agent_type:
-            tracker.record_execution(
-                execution_id=execution_id,
-                agent_name=agent_role_map.get(agent_type, agent_type),
-                role=agent_type,
-                task_description=task[:200] if task else original_input[:200],
-                status='failed',
-                error_message=str(e),
-                error_type=type(e).__name__
-            )
+            record_failure(e)
         raise
 
 # ==========================================
@@ -224,6 +267,14 @@ if "use_loop" not in st.session_state:
     st.session_state.use_loop = True
 if "use_crosscheck" not in st.session_state:
     st.session_state.use_crosscheck = False
+if "use_streaming" not in st.session_state:
+    st.session_state.use_streaming = True
+if "use_llm_summary" not in st.session_state:
+    st.session_state.use_llm_summary = False
+if "use_fast_router" not in st.session_state:
+    st.session_state.use_fast_router = True
+if "use_speculative" not in st.session_state:
+    st.session_state.use_speculative = False
 if "max_loop" not in st.session_state:
     st.session_state.max_loop = 3
 if "response_style" not in st.session_state:
@@ -1,5 +1,5 @@
 # config.py
-# 行数: 62行
+# 行数: 191行
 # APIキー設定とモデル初期化
 
 import os
@@ -11,6 +11,8 @@ from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_groq import ChatGroq
 
+from utils.usage import set_model_prices
+
 load_dotenv()
 
 # ==========================================
@@ -67,6 +69,8 @@ def check_api_keys():
 
 # ==========================================
 # AIモデル定義（スイッチ用）
+# context_budget: 記憶・文脈としてプロンプトに差し込むトークン数の上限
+# price: 料金単価（USD / 100万トークン、入力・出力別。プロバイダの改定時は更新）
 # ==========================================
 AI_MODELS = {
     "claude": {
@@ -74,39 +78,54 @@ AI_MODELS = {
         "provider": "anthropic",
         "model": "claude-sonnet-4-5-20250929",
         "strengths": ["コーディング", "安定性", "デザイン"],
+        "context_budget": 8000,
+        "price": {"input": 3.00, "output": 15.00},
     },
     "gpt": {
         "name": "GPT-5.2",
         "provider": "openai",
         "model": "gpt-5.2",
         "strengths": ["オールマイティ", "監査", "設計"],
+        "context_budget": 8000,
+        "price": {"input": 1.75, "output": 14.00},
     },
     "gemini": {
         "name": "Gemini 3 Pro",
         "provider": "google",
         "model": "gemini-3-pro-preview",
         "strengths": ["問題解決", "聞き取り"],
+        "context_budget": 12000,
+        "price": {"input": 2.00, "output": 12.00},
     },
     "grok": {
         "name": "Grok 4.1 Thinking",
         "provider": "xai",
         "model": "grok-4-1-thinking",
         "strengths": ["検索", "X内検索", "聞き役"],
+        "context_budget": 6000,
+        "price": {"input": 3.00, "output": 15.00},
     },
     "llama": {
         "name": "Llama 3.3 70B",
         "provider": "groq",
         "model": "llama-3.3-70b-versatile",
         "strengths": ["データ保存", "データ検索"],
+        "context_budget": 4000,
+        "price": {"input": 0.59, "output": 0.79},
     },
     "perplexity": {
         "name": "Perplexity",
         "provider": "perplexity",
         "model": "sonar-pro",
         "strengths": ["最新検索", "ディープサーチ"],
+        "context_budget": 4000,
+        "price": {"input": 3.00, "output": 15.00},
     },
 }
 
+# 使用量の料金換算にモデルID別の単価を登録（司令塔など AI_MODELS 外の生成でも同じモデルIDなら適用）
+set_model_prices({info["model"]: info["price"] for info in AI_MODELS.values() if "price" in info})
+
 # ==========================================
 # チーム構成（デフォルト）
 # ==========================================
@@ -143,6 +162,9 @@ DEFAULT_TEAM_CONFIG = {
     },
 }
 
+# チェック役の採点がこの値以上かつ【判定】OKなら長の段をスキップ（None で無効）
+EARLY_EXIT_THRESHOLD = 90
+
 # ==========================================
 # チーム構成取得（セッション対応）
 # ==========================================
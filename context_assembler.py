@@ -0,0 +1,159 @@
+"""
+トークン予算付きコンテキスト組み立て
+- モデルごとのトークン予算内に、優先度の高いセクションから貪欲に詰める
+- トークン数はローカルの概算（CJK 1文字≒1トークン、英数字 4文字≒1トークン）
+- セクションごとの使用トークン数を記録
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# 予算未設定のモデル用
+DEFAULT_CONTEXT_BUDGET = 4000
+# これ未満しか残っていなければ項目を切り詰めてまで入れない
+MIN_ITEM_TOKENS = 40
+
+# ai_type（tools.py / 履歴の ai_type）→ AI_MODELS のキー
+AI_TYPE_MODELS = {
+    'Gemini': 'gemini',
+    'auditor': 'gpt',
+    'coder': 'claude',
+    'data_processor': 'llama',
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """高速なトークン数概算（ASCII は4文字で1トークン、それ以外は1文字1トークン）"""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "...") -> str:
+    """概算トークン数が max_tokens に収まるよう末尾を切り詰める"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max(0, max_tokens - estimate_tokens(suffix))
+    used = 0.0
+    for i, c in enumerate(text):
+        used += 0.25 if ord(c) < 128 else 1
+        if used > budget:
+            return text[:i] + suffix
+    return text
+
+
+def get_context_budget(ai_key: str) -> int:
+    """AI_MODELS の context_budget（ai_type 名も受け付ける）"""
+    from config import AI_MODELS
+    ai_key = AI_TYPE_MODELS.get(ai_key, ai_key)
+    return AI_MODELS.get(ai_key, {}).get('context_budget', DEFAULT_CONTEXT_BUDGET)
+
+
+@dataclass
+class Section:
+    name: str
+    header: Optional[str]
+    items: List[str]
+    priority: int
+    item_tokens: Optional[int] = None
+    chronological: bool = False
+    max_share: float = 1.0
+
+
+@dataclass
+class AssembledContext:
+    text: str
+    budget: int
+    total_tokens: int
+    sections: Dict[str, Dict] = field(default_factory=dict)
+
+
+class ContextAssembler:
+    """
+    トークン予算付きのコンテキスト組み立て
+
+    使い方:
+        assembler = ContextAssembler(budget=6000)
+        assembler.add_section('recent', recent_lines, priority=1, header='=== 直近 ===')
+        result = assembler.assemble()
+        result.text / result.sections['recent']['tokens']
+    """
+
+    def __init__(self, budget: int = DEFAULT_CONTEXT_BUDGET):
+        self.budget = budget
+        self._sections: List[Section] = []
+
+    def add_section(self, name: str, items: List[str], priority: int,
+                    header: Optional[str] = None, item_tokens: Optional[int] = None,
+                    chronological: bool = False, max_share: float = 1.0):
+        """
+        セクション追加（priority が小さいほど先に予算を使う）
+
+        Args:
+            items: 重要な順（新しい順）の項目。chronological=True なら出力時は逆順（古い順）
+            item_tokens: 1項目あたりの上限トークン数
+            max_share: 予算全体のうちこのセクションが使える割合（後続セクションの枠を残す）
+        """
+        self._sections.append(Section(name, header, [i for i in items if i], priority,
+                                      item_tokens, chronological, max_share))
+        return self
+
+    def assemble(self) -> AssembledContext:
+        """優先度順に予算を割り当て、追加順にセクションを並べたテキストを返す"""
+        remaining = self.budget
+        chosen: Dict[str, List[str]] = {}
+        metrics: Dict[str, Dict] = {}
+
+        for section in sorted(self._sections, key=lambda s: s.priority):
+            included = []
+            used = 0
+            # セクション上限を超える分は後続セクションのために残す
+            reserved = max(0, remaining - int(self.budget * section.max_share))
+            remaining -= reserved
+            header_tokens = estimate_tokens(section.header) + 1 if section.header else 0
+            for item in section.items:
+                if section.item_tokens:
+                    item = truncate_to_tokens(item, section.item_tokens)
+                cost = estimate_tokens(item) + 1
+                # セクション見出しは最初の項目を入れるときに計上
+                overhead = header_tokens if not included else 0
+                if cost + overhead > remaining:
+                    room = remaining - overhead - 1
+                    if room >= MIN_ITEM_TOKENS:
+                        item = truncate_to_tokens(item, room)
+                        cost = estimate_tokens(item) + 1
+                        included.append(item)
+                        used += cost + overhead
+                        remaining -= cost + overhead
+                    break
+                included.append(item)
+                used += cost + overhead
+                remaining -= cost + overhead
+
+            remaining += reserved
+            chosen[section.name] = included
+            metrics[section.name] = {
+                'tokens': used,
+                'items': len(included),
+                'dropped': len(section.items) - len(included),
+            }
+
+        parts = []
+        for section in self._sections:
+            included = chosen[section.name]
+            if not included:
+                continue
+            if section.header:
+                parts.append(section.header)
+            parts.extend(reversed(included) if section.chronological else included)
+            parts.append("")
+
+        text = "\n".join(parts).rstrip("\n")
+        return AssembledContext(
+            text=text,
+            budget=self.budget,
+            total_tokens=sum(m['tokens'] for m in metrics.values()),
+            sections=metrics,
+        )
@@ -1,33 +1,81 @@
 """
 会話記憶管理システム
 - 直近10件のスレッド記憶
-- アンカー検索機能
-- SQLite永続化
+- アンカー検索機能（FTS5 trigram 全文検索 + BM25 順位付け）
+- SQLite永続化（共有接続 + WAL、会話履歴は任意でまとめ書き）
 """
 
+import atexit
 import os
 import sqlite3
 import json
 import re
-from datetime import datetime
+import threading
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import List, Dict, Optional
 
+from context_assembler import ContextAssembler, get_context_budget
+from utils.sqlite_conn import SQLiteConnection, fts_match_query
+from utils.tracing import span
+
 # データベースパス
 DB_PATH = Path(__file__).parent / 'data' / 'conversation_memory.db'
 
+SNIPPET_TOKENS = 16
+
+# 会話履歴のまとめ書き（MEMORY_WRITE_BEHIND=1 で有効）
+WRITE_BEHIND = os.getenv("MEMORY_WRITE_BEHIND") == "1"
+FLUSH_INTERVAL_SECONDS = 1.0
+FLUSH_BATCH_SIZE = 50
+
+# AI間の相互参照: (種類, ai_type, 抽出条件, 要約) — 会話履歴への INSERT 時にトリガーで蓄積
+CROSS_REFERENCE_RULES = [
+    ('auditor_warnings', 'auditor',
+     "new.content LIKE '%リスク%' OR new.content LIKE '%懸念%' OR new.content LIKE '%問題%'",
+     "substr(new.content, 1, 100) || '...'"),
+    ('coder_implementations', 'coder', "new.content LIKE '%```%'", "'コード実装実施'"),
+    ('data_summaries', 'data_processor', "1", "substr(new.content, 1, 100) || '...'"),
+    ('gemini_decisions', 'Gemini', "new.content LIKE '%call\\_%' ESCAPE '\\'", "'部下に指示を出した'"),
+]
+
+# (FTS表, 元テーブル, 索引する列)
+FTS_TABLES = [
+    ('anchors_fts', 'anchors', ('keywords', 'content')),
+    ('threads_fts', 'threads', ('title', 'content')),
+    ('session_history_fts', 'session_history', ('content',)),
+]
+
+
 class ConversationMemory:
-    def __init__(self):
-        self.db_path = DB_PATH
+    def __init__(self, db_path=None, write_behind: bool = WRITE_BEHIND,
+                 flush_interval: float = FLUSH_INTERVAL_SECONDS, batch_size: int = FLUSH_BATCH_SIZE):
+        self.db_path = Path(db_path) if db_path else DB_PATH
+        self.last_context_metrics = None
+        self.fts_enabled = False
+        self._anchor_count = None
+        self.db = SQLiteConnection(self.db_path)
         self._init_database()
+        
+        # まとめ書き: add_session_message は待ち行列に積むだけにし、別スレッドが一括INSERT
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._closed = False
+        if write_behind:
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+            atexit.register(self.close)
     
     def _init_database(self):
         """データベース初期化"""
-        DB_PATH.parent.mkdir(exist_ok=True)
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        with self.db.transaction() as cursor:
+            self._create_tables(cursor)
+    
+    def _create_tables(self, cursor):
         # スレッド記憶テーブル
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS threads (
@@ -63,22 +111,102 @@ class ConversationMemory:
                 timestamp TEXT DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        # AIごとの直近N件を索引だけで引く
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_session_agent ON session_history(ai_type, id)')
         
-        conn.commit()
-        conn.close()
+        self._init_cross_references(cursor)
+        self.fts_enabled = self._init_fts(cursor)
+    
+    def _init_cross_references(self, cursor):
+        """相互参照テーブル（会話履歴の追加・削除にトリガーで追従）"""
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cross_references'"
+        ).fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cross_references (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                timestamp TEXT,
+                summary TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cross_ref_kind ON cross_references(kind, id)')
+        for kind, ai_type, condition, summary in CROSS_REFERENCE_RULES:
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS session_history_xref_{kind} AFTER INSERT ON session_history
+                WHEN new.ai_type = '{ai_type}' AND ({condition}) BEGIN
+                    INSERT INTO cross_references (kind, message_id, timestamp, summary)
+                    VALUES ('{kind}', new.id, new.timestamp, {summary});
+                END
+            ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS session_history_xref_ad AFTER DELETE ON session_history BEGIN
+                DELETE FROM cross_references WHERE message_id = old.id;
+            END
+        ''')
+        # テーブル追加前からある履歴を取り込む
+        if not exists:
+            for kind, ai_type, condition, summary in CROSS_REFERENCE_RULES:
+                cursor.execute(f'''
+                    INSERT INTO cross_references (kind, message_id, timestamp, summary)
+                    SELECT '{kind}', new.id, new.timestamp, {summary}
+                    FROM session_history AS new
+                    WHERE new.ai_type = '{ai_type}' AND ({condition})
+                    ORDER BY new.id
+                ''')
+    
+    def _init_fts(self, cursor) -> bool:
+        """
+        FTS5 全文検索索引（外部コンテンツ表 + トリガーで元テーブルと同期）
+        FTS5/trigram が使えない SQLite では False（LIKE 検索のまま）
+        """
+        for fts, table, columns in FTS_TABLES:
+            exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+            ).fetchone()
+            cols = ', '.join(columns)
+            new_cols = ', '.join(f'new.{c}' for c in columns)
+            old_cols = ', '.join(f'old.{c}' for c in columns)
+            try:
+                cursor.execute(f'''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                        {cols}, content='{table}', content_rowid='id', tokenize='trigram'
+                    )
+                ''')
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ FTS5が使えないためLIKE検索で動作します: {e}")
+                return False
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE ON {table} BEGIN
+                    INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                    INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+                END
+            ''')
+            # 索引追加前からある行を取り込む
+            if not exists:
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        return True
     
     def save_thread(self, thread_id: str, title: str, content: str, updated_at: str):
         """スレッド保存"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO threads (thread_id, title, content, updated_at)
+        # INSERT OR REPLACE の暗黙の削除では FTS 同期トリガーが動かないため UPSERT
+        self.db.execute('''
+            INSERT INTO threads (thread_id, title, content, updated_at)
             VALUES (?, ?, ?, ?)
+            ON CONFLICT(thread_id) DO UPDATE SET
+                title = excluded.title, content = excluded.content, updated_at = excluded.updated_at
         ''', (thread_id, title, content, updated_at))
-        
-        conn.commit()
-        conn.close()
     
     def extract_and_save_anchors(self, thread_id: str, content: str):
         """アンカー抽出・保存"""
@@ -89,22 +217,21 @@ class ConversationMemory:
         if not matches:
             return 0
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         saved_count = 0
-        for anchor_id, keywords, anchor_content in matches:
-            try:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO anchors (anchor_id, keywords, content, thread_id)
-                    VALUES (?, ?, ?, ?)
-                ''', (anchor_id, keywords, anchor_content.strip(), thread_id))
-                saved_count += 1
-            except Exception as e:
-                print(f"アンカー保存エラー: {e}")
-        
-        conn.commit()
-        conn.close()
+        with self.db.transaction() as cursor:
+            for anchor_id, keywords, anchor_content in matches:
+                try:
+                    cursor.execute('''
+                        INSERT INTO anchors (anchor_id, keywords, content, thread_id)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(anchor_id) DO UPDATE SET
+                            keywords = excluded.keywords, content = excluded.content,
+                            thread_id = excluded.thread_id
+                    ''', (anchor_id, keywords, anchor_content.strip(), thread_id))
+                    saved_count += 1
+                except Exception as e:
+                    print(f"アンカー保存エラー: {e}")
+        self._anchor_count = None
         
         return saved_count
     
@@ -112,16 +239,27 @@ class ConversationMemory:
         """アンカー検索
         
         Args:
-            query: 検索キーワード（空文字列で全件取得）
+            query: 検索キーワード（空文字列で新しい順に取得）
             limit: 最大取得件数
-        """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         
-        if query:
-            # キーワード部分一致検索
-            cursor.execute('''
-                SELECT anchor_id, keywords, content, thread_id
+        Returns:
+            BM25 の関連度順（keywords 一致を content より重視）。'snippet' に一致箇所の抜粋
+        """
+        match = fts_match_query(query) if query and self.fts_enabled else None
+        if match:
+            rows = self.db.fetchall(f'''
+                SELECT a.anchor_id, a.keywords, a.content, a.thread_id,
+                       snippet(anchors_fts, 1, '【', '】', '…', {SNIPPET_TOKENS})
+                FROM anchors_fts
+                JOIN anchors a ON a.id = anchors_fts.rowid
+                WHERE anchors_fts MATCH ?
+                ORDER BY bm25(anchors_fts, 10.0, 1.0)
+                LIMIT ?
+            ''', (match, limit))
+        elif query:
+            # 短い語（trigram 未満）はキーワード部分一致検索
+            rows = self.db.fetchall('''
+                SELECT anchor_id, keywords, content, thread_id, NULL
                 FROM anchors
                 WHERE keywords LIKE ? OR content LIKE ?
                 ORDER BY id DESC
@@ -129,31 +267,107 @@ class ConversationMemory:
             ''', (f'%{query}%', f'%{query}%', limit))
         else:
             # 全件取得
-            cursor.execute('''
-                SELECT anchor_id, keywords, content, thread_id
+            rows = self.db.fetchall('''
+                SELECT anchor_id, keywords, content, thread_id, NULL
                 FROM anchors
                 ORDER BY id DESC
                 LIMIT ?
             ''', (limit,))
         
         results = []
-        for row in cursor.fetchall():
+        for row in rows:
             results.append({
                 'anchor_id': row[0],
                 'keywords': row[1],
                 'content': row[2],
-                'thread_id': row[3]
+                'thread_id': row[3],
+                'snippet': row[4] or row[2][:100]
             })
         
-        conn.close()
         return results
     
+    def count_anchors(self) -> int:
+        """保存済みアンカー数（保存時に数え直す。検索のたびに COUNT しない）"""
+        if self._anchor_count is None:
+            self._anchor_count = self.db.fetchone('SELECT COUNT(*) FROM anchors')[0]
+        return self._anchor_count
+    
+    def search_threads(self, query: str, limit: int = 5) -> List[Dict]:
+        """スレッド全文検索（BM25 順、title 一致を重視）"""
+        if not query:
+            return []
+        match = fts_match_query(query) if self.fts_enabled else None
+        if match:
+            rows = self.db.fetchall(f'''
+                SELECT t.thread_id, t.title, t.content, t.updated_at,
+                       snippet(threads_fts, 1, '【', '】', '…', {SNIPPET_TOKENS})
+                FROM threads_fts
+                JOIN threads t ON t.id = threads_fts.rowid
+                WHERE threads_fts MATCH ?
+                ORDER BY bm25(threads_fts, 5.0, 1.0)
+                LIMIT ?
+            ''', (match, limit))
+        else:
+            rows = self.db.fetchall('''
+                SELECT thread_id, title, content, updated_at, NULL
+                FROM threads
+                WHERE title LIKE ? OR content LIKE ?
+                ORDER BY updated_at DESC
+                LIMIT ?
+            ''', (f'%{query}%', f'%{query}%', limit))
+        
+        threads = []
+        for row in rows:
+            threads.append({
+                'thread_id': row[0],
+                'title': row[1],
+                'content': row[2],
+                'updated_at': row[3],
+                'snippet': row[4] or (row[2] or '')[:100]
+            })
+        
+        return threads
+    
+    def search_session_history(self, query: str, limit: int = 10) -> List[Dict]:
+        """会話履歴の全文検索（BM25 順）"""
+        if not query:
+            return []
+        self.flush()
+        match = fts_match_query(query) if self.fts_enabled else None
+        if match:
+            rows = self.db.fetchall(f'''
+                SELECT h.role, h.content, h.ai_type, h.timestamp,
+                       snippet(session_history_fts, 0, '【', '】', '…', {SNIPPET_TOKENS})
+                FROM session_history_fts
+                JOIN session_history h ON h.id = session_history_fts.rowid
+                WHERE session_history_fts MATCH ?
+                ORDER BY bm25(session_history_fts)
+                LIMIT ?
+            ''', (match, limit))
+        else:
+            rows = self.db.fetchall('''
+                SELECT role, content, ai_type, timestamp, NULL
+                FROM session_history
+                WHERE content LIKE ?
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (f'%{query}%', limit))
+        
+        history = []
+        for row in rows:
+            history.append({
+                'role': row[0],
+                'content': row[1],
+                'ai_type': row[2],
+                'timestamp': row[3],
+                'snippet': row[4] or (row[1] or '')[:100]
+            })
+        
+        return history
+    
     def get_recent_threads(self, limit: int = 10) -> List[Dict]:
         """直近N件のスレッド取得"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        rows = self.db.fetchall('''
             SELECT thread_id, title, content, updated_at
             FROM threads
             ORDER BY updated_at DESC
@@ -161,7 +375,7 @@ class ConversationMemory:
         ''', (limit,))
         
         threads = []
-        for row in cursor.fetchall():
+        for row in rows:
             threads.append({
                 'thread_id': row[0],
                 'title': row[1],
@@ -169,43 +383,75 @@ class ConversationMemory:
                 'updated_at': row[3]
             })
         
-        conn.close()
         return threads
     
     def add_session_message(self, role: str, content: str, ai_type: str = None):
-        """現在セッションのメッセージ追加"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO session_history (role, content, ai_type)
-            VALUES (?, ?, ?)
-        ''', (role, content, ai_type))
-        
-        conn.commit()
-        conn.close()
+        """現在セッションのメッセージ追加（まとめ書き時は待ち行列に積むだけ）"""
+        if not self.write_behind:
+            self.db.execute('''
+                INSERT INTO session_history (role, content, ai_type)
+                VALUES (?, ?, ?)
+            ''', (role, content, ai_type))
+            return
+        
+        # 書き込み時刻は積んだ時点（CURRENT_TIMESTAMP と同じ UTC 形式）
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._pending_lock:
+            self._pending.append((role, content, ai_type, timestamp))
+            pending = len(self._pending)
+        if pending >= self.batch_size:
+            self._flush_requested.set()
+    
+    def flush(self) -> int:
+        """待ち行列の会話履歴を1トランザクションで書き込み、件数を返す"""
+        # 取り出しから書き込みまで直列化（並行した flush で順序が入れ替わらないように）
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            with span("persist.memory.flush", messages=len(batch)):
+                return self.db.executemany('''
+                    INSERT INTO session_history (role, content, ai_type, timestamp)
+                    VALUES (?, ?, ?, ?)
+                ''', batch)
+    
+    def _flush_loop(self):
+        while not self._closed:
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ 会話履歴の書き込みエラー: {e}")
+    
+    def close(self):
+        """待ち行列を書き出して書き込みスレッドを止める"""
+        if self._closed:
+            return
+        self._closed = True
+        self._flush_requested.set()
+        self.flush()
     
     def get_session_history(self, limit: int = None) -> List[Dict]:
         """現在セッションの履歴取得"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        self.flush()
         if limit:
-            cursor.execute('''
+            rows = self.db.fetchall('''
                 SELECT role, content, ai_type, timestamp
                 FROM session_history
                 ORDER BY id DESC
                 LIMIT ?
             ''', (limit,))
         else:
-            cursor.execute('''
+            rows = self.db.fetchall('''
                 SELECT role, content, ai_type, timestamp
                 FROM session_history
                 ORDER BY id ASC
             ''')
         
         history = []
-        for row in cursor.fetchall():
+        for row in rows:
             history.append({
                 'role': row[0],
                 'content': row[1],
@@ -213,16 +459,65 @@ class ConversationMemory:
                 'timestamp': row[3]
             })
         
-        conn.close()
         return history
     
+    def get_recent_by_agent(self, ai_types: List[str], n: int = 10) -> Dict[str, List[Dict]]:
+        """AIごとの直近N件（古い順）を1回のクエリで取得
+        
+        (ai_type, id) 索引を後ろから N 件ずつ読むだけなので、履歴の総件数に依存しない
+        """
+        result = {ai_type: [] for ai_type in ai_types}
+        if not ai_types:
+            return result
+        self.flush()
+        union = ' UNION ALL '.join('''
+            SELECT * FROM (
+                SELECT id, role, content, ai_type, timestamp FROM session_history
+                WHERE ai_type = ? ORDER BY id DESC LIMIT ?
+            )''' for _ in ai_types)
+        params = []
+        for ai_type in ai_types:
+            params.extend((ai_type, n))
+        rows = self.db.fetchall(f'SELECT * FROM ({union}) ORDER BY id ASC', params)
+        
+        for row in rows:
+            result[row[3]].append({
+                'role': row[1],
+                'content': row[2],
+                'ai_type': row[3],
+                'timestamp': row[4]
+            })
+        
+        return result
+    
+    def get_cross_references(self, n: int = 10) -> Dict[str, List[Dict]]:
+        """種類ごとの直近N件の相互参照（古い順）"""
+        self.flush()
+        kinds = [rule[0] for rule in CROSS_REFERENCE_RULES]
+        union = ' UNION ALL '.join('''
+            SELECT * FROM (
+                SELECT id, kind, timestamp, summary FROM cross_references
+                WHERE kind = ? ORDER BY id DESC LIMIT ?
+            )''' for _ in kinds)
+        params = []
+        for kind in kinds:
+            params.extend((kind, n))
+        rows = self.db.fetchall(f'SELECT * FROM ({union}) ORDER BY id ASC', params)
+        
+        refs = {kind: [] for kind in kinds}
+        for row in rows:
+            refs[row[1]].append({
+                'timestamp': row[2],
+                'summary': row[3]
+            })
+        
+        return refs
+    
     def clear_session(self):
         """セッション履歴クリア"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM session_history')
-        conn.commit()
-        conn.close()
+        with self._pending_lock:
+            self._pending = []
+        self.db.execute('DELETE FROM session_history')
     
     def get_history_until(self, target_timestamp: str) -> List[Dict]:
         """指定タイムスタンプまでの履歴を取得（復元用）
@@ -233,10 +528,8 @@ class ConversationMemory:
         Returns:
             該当タイムスタンプまでの全メッセージリスト
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self.flush()
+        rows = self.db.fetchall('''
             SELECT role, content, ai_type, timestamp
             FROM session_history
             WHERE timestamp <= ?
@@ -244,7 +537,7 @@ class ConversationMemory:
         ''', (target_timestamp,))
         
         history = []
-        for row in cursor.fetchall():
+        for row in rows:
             history.append({
                 'role': row[0],
                 'content': row[1],
@@ -252,39 +545,50 @@ class ConversationMemory:
                 'timestamp': row[3]
             })
         
-        conn.close()
         return history
     
-    def build_memory_context(self, user_query: str) -> str:
-        """記憶コンテキスト生成"""
-        context_parts = []
+    def build_memory_context(self, user_query: str, budget: int = None) -> str:
+        """記憶コンテキスト生成
         
-        # 1. 直近10件のスレッド（必須）
+        Args:
+            user_query: アンカー検索に使うクエリ
+            budget: トークン予算（省略時は司令塔モデルの context_budget）
+        
+        優先度: 現在セッションの履歴 → 関連アンカー → 直近スレッド
+        セクションごとの使用トークン数は self.last_context_metrics に残る
+        """
+        if budget is None:
+            budget = get_context_budget('gemini')
+        assembler = ContextAssembler(budget)
+        
+        # 1. 直近10件のスレッド
         recent_threads = self.get_recent_threads(10)
-        if recent_threads:
-            context_parts.append("=== 直近10件のスレッド記憶 ===")
-            for thread in recent_threads:
-                context_parts.append(f"[{thread['title']}]")
-                context_parts.append(thread['content'][:500] + "..." if len(thread['content']) > 500 else thread['content'])
-                context_parts.append("")
+        assembler.add_section(
+            'threads',
+            [f"[{thread['title']}]\n{thread['content']}" for thread in recent_threads],
+            priority=3, header="=== 直近10件のスレッド記憶 ===", item_tokens=400,
+        )
         
         # 2. アンカー検索
         anchors = self.search_anchors(user_query)
-        if anchors:
-            context_parts.append("=== 関連アンカー ===")
-            for anchor in anchors:
-                context_parts.append(f"[{anchor['anchor_id']}] Keywords: {anchor['keywords']}")
-                context_parts.append(anchor['content'])
-                context_parts.append("")
-        
-        # 3. セッション履歴
-        session_history = self.get_session_history(limit=20)
-        if session_history:
-            context_parts.append("=== 現在セッションの履歴 ===")
-            for msg in session_history[-10:]:  # 直近10件
-                context_parts.append(f"{msg['role']}: {msg['content'][:200]}...")
+        assembler.add_section(
+            'anchors',
+            [f"[{anchor['anchor_id']}] Keywords: {anchor['keywords']}\n{anchor['content']}" for anchor in anchors],
+            priority=2, header="=== 関連アンカー ===", item_tokens=600,
+        )
         
-        return "\n".join(context_parts)
+        # 3. セッション履歴（新しい順に詰め、古い順に表示）
+        session_history = self.get_session_history(limit=20)
+        assembler.add_section(
+            'session',
+            [f"{msg['role']}: {msg['content']}" for msg in session_history],
+            priority=1, header="=== 現在セッションの履歴 ===",
+            item_tokens=300, chronological=True, max_share=0.5,
+        )
+        
+        result = assembler.assemble()
+        self.last_context_metrics = result
+        return result.text
 
 # グローバルインスタンス
 memory = ConversationMemory()
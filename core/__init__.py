@@ -1,9 +1,10 @@
 # core/__init__.py
 from .code_loop import code_with_review_loop
-from .crosscheck import cross_check, generate_crosscheck_summary
+from .crosscheck import cross_check, generate_crosscheck_summary, request_llm_summary
 
 __all__ = [
     'code_with_review_loop',
     'cross_check',
-    'generate_crosscheck_summary'
+    'generate_crosscheck_summary',
+    'request_llm_summary'
 ]
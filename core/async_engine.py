@@ -0,0 +1,86 @@
+# core/async_engine.py
+# 行数: 86行
+# 非同期実行エンジン（共有イベントループ・プロバイダ別同時実行数制限）
+
+import asyncio
+import threading
+import weakref
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Coroutine, Dict, Optional
+
+# プロバイダ別の同時実行数上限（レート制限・接続プールに合わせる）
+DEFAULT_PROVIDER_CONCURRENCY = {
+    "openai": 10,
+    "anthropic": 10,
+    "google": 10,
+    "groq": 10,
+    "xai": 5,
+    "perplexity": 5,
+}
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_loop_lock = threading.Lock()
+
+# イベントループ → {プロバイダ: セマフォ}（ループ破棄時に自動削除）
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+_semaphore_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    プロセス共有のイベントループを取得
+    - 初回呼び出し時にデーモンスレッドで run_forever を開始
+    """
+    global _loop, _loop_thread
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="agent-event-loop", daemon=True
+                )
+                thread.start()
+                _loop, _loop_thread = loop, thread
+    return _loop
+
+
+def run_sync(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """
+    同期コード（Streamlit等）から共有ループ上でコルーチンを実行し結果を待つ
+
+    Args:
+        coro: 実行するコルーチン（TeamExecutor.arun など）
+        timeout: 待機秒数（超過時は TimeoutError、コルーチンはキャンセル）
+    """
+    loop = get_event_loop()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("共有イベントループ上から run_sync は呼べません（await を使用してください）")
+
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise
+
+
+def submit(coro: Coroutine):
+    """共有ループにコルーチンを投入し concurrent.futures.Future を返す（待たない）"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def provider_semaphore(provider: str) -> asyncio.Semaphore:
+    """
+    実行中イベントループにおけるプロバイダ別セマフォを取得
+    - ループごとに別インスタンス（asyncio.Semaphore はループをまたげないため）
+    """
+    loop = asyncio.get_running_loop()
+    with _semaphore_lock:
+        per_loop = _semaphores.setdefault(loop, {})
+        semaphore = per_loop.get(provider)
+        if semaphore is None:
+            limit = DEFAULT_PROVIDER_CONCURRENCY.get(provider, 5)
+            semaphore = asyncio.Semaphore(limit)
+            per_loop[provider] = semaphore
+    return semaphore
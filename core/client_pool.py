@@ -0,0 +1,272 @@
+# core/client_pool.py
+# 行数: 272行
+# LLMクライアントの共有レジストリ（keep-alive接続プール・アイドル破棄）
+
+import threading
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+# httpxクライアントを注入できるプロバイダ（OpenAI互換SDK・Groq SDK）
+HTTPX_PROVIDERS = {"openai", "xai", "perplexity", "groq"}
+
+# プロバイダ別の接続プールサイズ（同時接続数）
+DEFAULT_POOL_LIMITS = {
+    "openai": 10,
+    "anthropic": 10,
+    "google": 10,
+    "groq": 10,
+    "xai": 5,
+    "perplexity": 5,
+}
+
+# アイドル破棄までの秒数
+DEFAULT_IDLE_TIMEOUT = 600.0
+
+PoolKey = Tuple[str, str, float, Optional[str]]
+HttpKey = Tuple[str, Optional[str]]
+
+
+@dataclass
+class _PoolEntry:
+    client: Any
+    http_key: Optional[HttpKey] = None
+    created_at: float = 0.0
+    last_used: float = 0.0
+    hits: int = 0
+
+
+@dataclass
+class _HttpClients:
+    """(provider, base_url) ごとに共有する httpx クライアントと参照しているエントリ数"""
+    kwargs: dict
+    refs: int = 0
+
+
+class ClientPool:
+    """
+    (provider, model, temperature, base_url) をキーにLLMクライアントを共有するレジストリ
+    - 同一キーには同一インスタンスを返す（LangChainのチャットモデルはスレッドセーフ）
+    - httpx対応プロバイダには (provider, base_url) 単位のkeep-alive接続プールを注入
+    - クライアントの生成はキーごとのロックで行い、他のキーの取得を待たせない
+    - 一定時間使われていないクライアントは次回アクセス時に登録解除
+    - 接続プールは参照しているクライアントがすべて回収されてから閉じる
+      （登録解除後もチームやストリームが保持しているクライアントの接続は閉じない）
+    """
+
+    def __init__(self, pool_limits: Optional[Dict[str, int]] = None,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.pool_limits = {**DEFAULT_POOL_LIMITS, **(pool_limits or {})}
+        self.idle_timeout = idle_timeout
+        self._entries: Dict[PoolKey, _PoolEntry] = {}
+        self._http: Dict[HttpKey, _HttpClients] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[PoolKey, threading.Lock] = {}
+        # 回収されたクライアントが使っていた (HttpKey, 接続プール引数)。次回アクセス時に参照を返す
+        self._released = deque()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, provider: str, model: str, temperature: float,
+            base_url: Optional[str], factory: Callable[[dict], Any]) -> Any:
+        """
+        クライアントを取得（なければ factory で生成して登録）
+
+        Args:
+            factory: httpxクライアント引数（http_client等、非対応なら空dict）を受け取り
+                     LangChainインスタンスを返す関数
+        """
+        key = (provider, model, float(temperature), base_url)
+        client = self._lookup(key)
+        if client is not None:
+            return client
+
+        with self._key_lock(key):
+            # 待っている間に同じキーを別スレッドが生成していれば共有
+            client = self._lookup(key)
+            if client is not None:
+                return client
+
+            http_key, http_kwargs = self._acquire_http_clients(provider, base_url)
+            try:
+                client = factory(http_kwargs)
+            except Exception:
+                self._close_http_clients(self._release_http_clients(http_key))
+                raise
+
+            # 回収時に参照を返せるなら、登録解除では接続プールの参照を減らさない
+            if self._release_on_collect(client, http_key, http_kwargs):
+                http_key = None
+
+            now = time.monotonic()
+            with self._lock:
+                self._entries[key] = _PoolEntry(
+                    client=client,
+                    http_key=http_key,
+                    created_at=now,
+                    last_used=now,
+                )
+                self._stats["misses"] += 1
+            return client
+
+    def _lookup(self, key: PoolKey) -> Any:
+        """登録済みのクライアント（なければ None）。ついでにアイドルエントリを破棄"""
+        now = time.monotonic()
+        with self._lock:
+            closing = self._evict_idle_locked(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.last_used = now
+                entry.hits += 1
+                self._stats["hits"] += 1
+        self._close_http_clients(closing)
+        return entry.client if entry is not None else None
+
+    def _key_lock(self, key: PoolKey) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _acquire_http_clients(self, provider: str, base_url: Optional[str]) -> tuple:
+        """(provider, base_url) 共有の httpx クライアントの参照を1つ増やし (キー, 引数) を返す"""
+        if not HTTPX_AVAILABLE or provider not in HTTPX_PROVIDERS:
+            return None, {}
+
+        http_key = (provider, base_url)
+        with self._lock:
+            shared = self._http.get(http_key)
+            if shared is not None:
+                shared.refs += 1
+                return http_key, shared.kwargs
+
+        # 生成はロックの外で。同時に生成された場合は先に登録された方を使い、後の方は閉じる
+        created = self._make_http_clients(provider)
+        with self._lock:
+            shared = self._http.setdefault(http_key, _HttpClients(created))
+            shared.refs += 1
+        if shared.kwargs is not created:
+            self._close_http_clients(list(created.values()))
+        return http_key, shared.kwargs
+
+    def _release_on_collect(self, client: Any, http_key: Optional[HttpKey], http_kwargs: dict) -> bool:
+        """
+        クライアントが回収されたら接続プールの参照を返すよう登録（弱参照を取れない型なら False）
+        回収はどのスレッドのどの時点でも起こり得るので、ここでは積むだけにして次回アクセス時に処理する
+        """
+        if http_key is None:
+            return False
+        try:
+            weakref.finalize(client, self._released.append, (http_key, http_kwargs))
+        except TypeError:
+            return False
+        return True
+
+    def _drain_released_locked(self) -> list:
+        """回収済みクライアントの分の参照を返し、閉じるべき httpx クライアントを返す（ロック取得済みで呼ぶ）"""
+        closing = []
+        while self._released:
+            http_key, http_kwargs = self._released.popleft()
+            shared = self._http.get(http_key)
+            # clear() 後に作り直された接続プールの参照は減らさない
+            if shared is not None and shared.kwargs is http_kwargs:
+                closing.extend(self._release_http_clients_locked(http_key))
+        return closing
+
+    def _release_http_clients(self, http_key: Optional[HttpKey]) -> list:
+        """参照を1つ減らし、閉じるべき httpx クライアントを返す（生成に失敗したとき用）"""
+        with self._lock:
+            return self._release_http_clients_locked(http_key)
+
+    def _release_http_clients_locked(self, http_key: Optional[HttpKey]) -> list:
+        """参照を1つ減らし、どのエントリも使わなくなったら登録解除して返す（ロック取得済みで呼ぶ）"""
+        shared = self._http.get(http_key) if http_key is not None else None
+        if shared is None:
+            return []
+        shared.refs -= 1
+        if shared.refs > 0:
+            return []
+        del self._http[http_key]
+        return list(shared.kwargs.values())
+
+    def _make_http_clients(self, provider: str) -> dict:
+        """プロバイダ用のkeep-alive httpxクライアントを生成"""
+        size = self.pool_limits.get(provider, 5)
+        limits = httpx.Limits(
+            max_connections=size,
+            max_keepalive_connections=size,
+            keepalive_expiry=self.idle_timeout,
+        )
+        return {
+            "http_client": httpx.Client(limits=limits, timeout=None),
+            "http_async_client": httpx.AsyncClient(limits=limits, timeout=None),
+        }
+
+    @staticmethod
+    def _close_http_clients(http_clients: list):
+        """httpx クライアントを閉じる（非同期クライアントは共有イベントループ上で閉じる）"""
+        for http_client in http_clients:
+            try:
+                if isinstance(http_client, httpx.AsyncClient):
+                    from core.async_engine import submit
+                    submit(http_client.aclose())
+                else:
+                    http_client.close()
+            except Exception:
+                pass
+
+    def _evict_idle_locked(self, now: float) -> list:
+        """
+        アイドル時間を超えたエントリを登録解除し、閉じるべき httpx クライアントを返す（ロック取得済みで呼ぶ）
+        閉じるのはロックの外で行う。他で保持されていないクライアントはここで回収され、その接続プールの参照も返る
+        """
+        closing = []
+        if self.idle_timeout > 0:
+            expired = [k for k, e in self._entries.items() if now - e.last_used > self.idle_timeout]
+            for key in expired:
+                closing.extend(self._release_http_clients_locked(self._entries.pop(key).http_key))
+            self._stats["evictions"] += len(expired)
+        closing.extend(self._drain_released_locked())
+        return closing
+
+    def evict_idle(self) -> int:
+        """アイドルクライアントを破棄し、破棄件数を返す"""
+        with self._lock:
+            before = self._stats["evictions"]
+            closing = self._evict_idle_locked(time.monotonic())
+            evicted = self._stats["evictions"] - before
+        self._close_http_clients(closing)
+        return evicted
+
+    def clear(self):
+        """全クライアントを破棄し、httpx接続を閉じる（終了時用）"""
+        with self._lock:
+            closing = [c for shared in self._http.values() for c in shared.kwargs.values()]
+            self._entries.clear()
+            self._http.clear()
+        self._close_http_clients(closing)
+
+    def stats(self) -> dict:
+        """ヒット数・生成数・破棄数・保持中クライアント数・共有中の接続プール数"""
+        with self._lock:
+            return {**self._stats, "size": len(self._entries), "http_pools": len(self._http)}
+
+
+# グローバルインスタンス（遅延初期化）
+_client_pool = None
+_client_pool_lock = threading.Lock()
+
+
+def get_client_pool() -> ClientPool:
+    """ClientPoolのシングルトン取得"""
+    global _client_pool
+    if _client_pool is None:
+        with _client_pool_lock:
+            if _client_pool is None:
+                _client_pool = ClientPool()
+    return _client_pool
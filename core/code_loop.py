@@ -1,12 +1,28 @@
 # core/code_loop.py
-# 行数: 41行
+# 行数: 77行
 # コードレビューループ機能
 
 import streamlit as st
-from agents import call_coder, call_code_review, call_coder_fix
+from agents import call_coder, call_code_review, call_code_review_diff, call_coder_fix, call_coder_patch
+from utils import PatchError, apply_unified_diff, changed_hunks, extract_diff, validate_patch
 
-def code_with_review_loop(requirement: str, max_iterations: int = 3) -> dict:
-    """コード生成→レビュー→修正のループ"""
+def _apply_fix_patch(code: str, feedback: str) -> tuple:
+    """
+    差分で修正を依頼し、ローカルで適用・検証
+    returns: (修正後のコード, 差分テキスト)  失敗時は PatchError
+    """
+    diff_text = extract_diff(call_coder_patch(code, feedback))
+    patched = apply_unified_diff(code, diff_text)
+    validate_patch(code, patched)
+    return patched, diff_text
+
+def code_with_review_loop(requirement: str, max_iterations: int = 3, patch_mode: bool = True) -> dict:
+    """
+    コード生成→レビュー→修正のループ
+    patch_mode=True の場合、修正は unified diff で受け取りローカルで適用し、
+    次のレビューは変更箇所（前後のコンテキスト付き）のみを対象にする。
+    差分が適用できない場合は全文再生成にフォールバック。
+    """
     iterations = []
     
     # 初回コード生成
@@ -14,10 +30,16 @@ def code_with_review_loop(requirement: str, max_iterations: int = 3) -> dict:
     code = call_coder(requirement)
     iterations.append({"type": "code", "content": code, "iteration": 1})
     
+    hunks = None  # 直前の修正が差分適用なら変更箇所
+    review = None
+    
     for i in range(max_iterations):
         # レビュー
         st.write(f"**🔄 ループ{i+1}: コードレビュー中...**")
-        review = call_code_review(code)
+        if hunks is not None:
+            review = call_code_review_diff(hunks, review["feedback"])
+        else:
+            review = call_code_review(code)
         iterations.append({"type": "review", "content": review["feedback"], "iteration": i+1})
         
         if review["approved"]:
@@ -32,8 +54,18 @@ def code_with_review_loop(requirement: str, max_iterations: int = 3) -> dict:
         # 修正が必要
         if i < max_iterations - 1:
             st.warning(f"⚠️ 要修正（{i+1}回目）→ 修正中...")
-            code = call_coder_fix(code, review["feedback"])
-            iterations.append({"type": "fix", "content": code, "iteration": i+2})
+            hunks = None
+            if patch_mode:
+                try:
+                    patched, diff_text = _apply_fix_patch(code, review["feedback"])
+                    hunks = changed_hunks(code, patched)
+                    code = patched
+                    iterations.append({"type": "patch", "content": diff_text, "iteration": i+2})
+                except PatchError as e:
+                    st.info(f"↩️ 差分を適用できないため全文を再生成します（{e}）")
+            if hunks is None:
+                code = call_coder_fix(code, review["feedback"])
+                iterations.append({"type": "fix", "content": code, "iteration": i+2})
     
     # 最大回数到達
     st.warning(f"⚠️ 最大{max_iterations}回のループ完了。最終版を返します。")
@@ -1,22 +1,41 @@
 # core/crosscheck.py
-# 行数: 95行
+# 行数: 175行
 # クロスチェック機能
 
+from concurrent.futures import Future
+
 from langchain_core.messages import HumanMessage
 from config import get_commander, get_auditor, get_coder, get_searcher, get_data_processor
-from utils import extract_content
+from core.parallel_executor import run_race, submit
+from core.scoring import aggregate_scores, format_aggregate_summary, parse_score
+from utils import cached_invoke, set_attributes, span, traced
+
+# 採点の打ち切り理由ごとの表示
+STRAGGLER_LABELS = {
+    "timeout": "⏱️ 時間内に採点が完了しませんでした",
+    "cancelled": "⏭️ クォーラム成立のため採点を打ち切りました",
+}
 
-def cross_check(agent_type: str, result: str, original_task: str) -> dict:
+@traced("crosscheck")
+def cross_check(agent_type: str, result: str, original_task: str,
+                mode: str = "all", quorum: int = 3, tolerance: float = 10,
+                timeout: float = 60) -> dict:
     """
     クロスチェック機能: 全5つのAIが結果を100点満点で採点（実行者も含む）
+    - 全AIを並列実行（timeout 秒を過ぎた採点は未完了として扱う）
     
     Args:
         agent_type: 実行したエージェント ("auditor", "coder", "data", "searcher", "commander", "coder_loop")
         result: エージェントの出力結果
         original_task: 元のタスク内容
+        mode: "all"=全AIの採点を待つ / "quorum"=quorum件の合計点が tolerance 以内で揃えば終了
+        quorum: quorum モードで必要な件数
+        tolerance: quorum モードで一致とみなす合計点の差
+        timeout: 採点の待ち時間上限（秒）
     
     Returns:
         dict: 採点結果と改善提案
+        未完了の採点は status="timeout"/"cancelled" として checks に含まれる
     """
     # 全AIリスト（5つ全て）
     all_checkers = [
@@ -30,10 +49,7 @@ def cross_check(agent_type: str, result: str, original_task: str) -> dict:
     # 全AIが採点（実行者も自己評価として参加）
     checkers = all_checkers
     
-    check_results = []
-    
-    for checker_type, checker_model, checker_name in checkers:
-        prompt = f"""以下の出力結果を100点満点で採点してください。
+    prompt = f"""以下の出力結果を100点満点で採点してください。
 
 【元のタスク】
 {original_task}
@@ -57,39 +73,78 @@ def cross_check(agent_type: str, result: str, original_task: str) -> dict:
 改善提案:
 - 具体的な改善点を箇条書きで記載
 """
-        
-        try:
-            messages = [HumanMessage(content=prompt)]
-            response = checker_model.invoke(messages)
-            check_results.append({
-                "checker": checker_name,
-                "evaluation": response.content
-            })
-        except Exception as e:
-            check_results.append({
-                "checker": checker_name,
-                "evaluation": f"❌ 評価エラー: {str(e)}"
-            })
+    messages = [HumanMessage(content=prompt)]
+    set_attributes(agent=agent_type, mode=mode, checkers=len(checkers))
+    
+    def scorer(checker_type):
+        def score(model):
+            with span("crosscheck.score", team="crosscheck", role=checker_type):
+                return cached_invoke(model, messages)
+        return score
+    
+    outcomes = run_race(
+        [(checker_model, scorer(checker_type)) for checker_type, checker_model, _ in checkers],
+        mode=mode, n=quorum, timeout=timeout,
+        agree_key=parse_score if mode == "quorum" else None,
+        tolerance=tolerance,
+    )
+    outcome_by_index = {o["index"]: o for o in outcomes}
+    
+    check_results = []
+    stragglers = []
+    for index, (checker_type, _, checker_name) in enumerate(checkers):
+        outcome = outcome_by_index[index]
+        if outcome["success"]:
+            status, evaluation = "ok", outcome["result"]
+        elif outcome["cancelled"]:
+            status, evaluation = outcome["error"], STRAGGLER_LABELS[outcome["error"]]
+            stragglers.append(checker_name)
+        else:
+            status, evaluation = "error", f"❌ 評価エラー: {outcome['error']}"
+        check_results.append({
+            "checker": checker_name,
+            "evaluation": evaluation,
+            "status": status,
+            "time": outcome["time"],
+        })
     
     return {
         "checks": check_results,
-        "total_checkers": len(check_results)
+        "total_checkers": len(check_results) - len(stragglers),
+        "stragglers": stragglers,
+        "mode": mode,
     }
 
-def generate_crosscheck_summary(check_results: list) -> str:
+def generate_crosscheck_summary(check_results: list, use_llm: bool = False) -> str:
     """
     クロスチェック結果をまとめる
+    - 既定では採点をローカルで集計（平均・分散・評価の割れ）してLLMは呼ばない
     
     Args:
         check_results: 各AIの採点結果リスト
+        use_llm: True の場合は司令塔に共通点・改善点のまとめも依頼（同期）
     
     Returns:
         str: まとめテキスト
     """
+    if use_llm:
+        return _llm_crosscheck_summary(check_results)
+    return format_aggregate_summary(aggregate_scores(check_results))
+
+def request_llm_summary(check_results: list) -> Future:
+    """司令塔によるまとめをバックグラウンドで生成（Future.result() で取得）"""
+    return submit(_llm_crosscheck_summary, check_results)
+
+@traced("crosscheck.llm_summary")
+def _llm_crosscheck_summary(check_results: list) -> str:
+    """司令塔に共通する評価・改善点のまとめを依頼（総合得点はローカル集計値を渡す）"""
+    aggregate = aggregate_scores(check_results)
+    
     # 全評価を連結
     all_evaluations = "\n\n".join([
         f"{check['checker']}の評価:\n{check['evaluation']}"
         for check in check_results
+        if check.get("status", "ok") == "ok"
     ])
     
     prompt = f"""以下は、複数のAIエージェントが同じ出力結果を採点した結果です。
@@ -98,9 +153,10 @@ def generate_crosscheck_summary(check_results: list) -> str:
 【各AIの評価】
 {all_evaluations}
 
-【出力形式】
-総合得点: X/100点 (各AIの合計得点の平均)
+【集計済みの得点】
+{format_aggregate_summary(aggregate)}
 
+【出力形式】
 共通する評価:
 - ポジティブな点を箇条書き
 
@@ -114,7 +170,6 @@ def generate_crosscheck_summary(check_results: list) -> str:
     try:
         commander = get_commander()
         messages = [HumanMessage(content=prompt)]
-        response = commander.invoke(messages)
-        return extract_content(response)
+        return cached_invoke(commander, messages)
     except Exception as e:
         return f"❌ まとめ生成エラー: {str(e)}"
@@ -0,0 +1,220 @@
+# core/parallel_executor.py
+# 行数: 220行
+# 並列実行エンジン（全件待ち / 先着N件 / クォーラム / ヘッジ送信）
+
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Hashable, Optional
+
+from utils.tracing import wrap_context
+
+# 共有スレッドプール（呼び出しごとに生成しない）
+# ワーカー内から呼ばれた入れ子の処理（投機実行中のヘッジ等）は1段深いプールに送る
+# （同じプールに投入してワーカーが自分の子タスクを待つと、同時リクエスト時に枯渇して止まる）
+MAX_WORKERS = 16
+_executors = {}
+_executors_lock = threading.Lock()
+_worker_state = threading.local()
+
+# 履歴が少ないときのヘッジ送信までの秒数
+DEFAULT_HEDGE_AFTER = 15.0
+# パーセンタイル計算に必要な最小サンプル数
+MIN_LATENCY_SAMPLES = 5
+
+MODES = ("all", "first", "quorum")
+
+
+class LatencyTracker:
+    """ラベル（モデル名）ごとの直近レイテンシ履歴"""
+
+    def __init__(self, window: int = 200):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, label: str, seconds: float):
+        with self._lock:
+            self._samples[label].append(seconds)
+
+    def percentile(self, label: str, p: float) -> Optional[float]:
+        """p（0〜1）パーセンタイル。サンプル不足なら None"""
+        with self._lock:
+            samples = sorted(self._samples.get(label, ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(p * (len(samples) - 1)))))
+        return samples[index]
+
+
+# グローバルインスタンス
+latency_tracker = LatencyTracker()
+
+
+def _executor_for_caller() -> tuple:
+    """呼び出し元の入れ子の深さに応じたプールと深さを返す"""
+    depth = getattr(_worker_state, "depth", 0)
+    with _executors_lock:
+        executor = _executors.get(depth)
+        if executor is None:
+            prefix = "team-parallel" if depth == 0 else f"team-parallel-{depth}"
+            executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix=prefix)
+            _executors[depth] = executor
+    return executor, depth
+
+
+def _submit(func: Callable, *args, **kwargs) -> Future:
+    """現在のスパンを引き継ぎ、入れ子の深さを記録してプールに投入"""
+    executor, depth = _executor_for_caller()
+    func = wrap_context(func)
+
+    def run(*call_args, **call_kwargs):
+        _worker_state.depth = depth + 1
+        return func(*call_args, **call_kwargs)
+
+    return executor.submit(run, *args, **kwargs)
+
+
+def _timed_call(task_func: Callable, ai_instance: Any) -> tuple:
+    """ワーカースレッド内で実際の開始〜終了時間を計測"""
+    start = time.perf_counter()
+    try:
+        return task_func(ai_instance), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+
+def _label_of(ai_instance: Any) -> str:
+    return (
+        getattr(ai_instance, "model_name", None)
+        or getattr(ai_instance, "model", None)
+        or str(ai_instance)
+    )
+
+
+def _has_quorum(values: list, n: int, tolerance: Optional[float]) -> bool:
+    """n 件が一致（tolerance 指定時は最大値と最小値の差が tolerance 以内）しているか"""
+    if len(values) < n:
+        return False
+    if tolerance is None:
+        return max(values.count(v) for v in values) >= n
+    ordered = sorted(values)
+    return any(ordered[i + n - 1] - ordered[i] <= tolerance for i in range(len(ordered) - n + 1))
+
+
+def run_race(tasks: list, mode: str = "all", n: int = 1, timeout: float = 60,
+             agree_key: Optional[Callable[[Any], Hashable]] = None,
+             tolerance: Optional[float] = None,
+             hedge_tasks: Optional[list] = None,
+             hedge_after: Optional[float] = None,
+             hedge_percentile: float = 0.95,
+             tracker: Optional[LatencyTracker] = None) -> list:
+    """
+    タスクを並列実行して結果を返す
+
+    Args:
+        tasks: [(ai_instance, callable), ...]  callable は ai_instance を受け取る
+        mode: "all"=全件待ち / "first"=成功N件で終了 / "quorum"=agree_key が一致するN件で終了
+        n: first / quorum で必要な件数
+        timeout: 全体の待ち時間上限（秒）
+        agree_key: quorum 用。結果から一致判定用のキーを作る関数（None を返した結果は数えない）
+        tolerance: quorum 用。指定時は agree_key の数値の差が tolerance 以内のN件で一致とみなす
+        hedge_tasks: 予備タスク。hedge_after 秒までに決着しなければ追加送信
+        hedge_after: ヘッジ送信までの秒数（省略時は主タスクの hedge_percentile から算出）
+        tracker: レイテンシ履歴（省略時はグローバル）
+
+    Returns:
+        [{"ai", "index", "result", "time", "success", "hedge", "cancelled", "error"?}, ...]
+        完了順。打ち切られたタスクは cancelled=True で末尾に並ぶ
+        index は tasks（ヘッジは hedge_tasks）内の位置
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode: {mode}")
+    if mode == "quorum" and agree_key is None:
+        raise ValueError("quorum モードには agree_key が必要です")
+
+    tracker = tracker or latency_tracker
+    started_at = time.perf_counter()
+    futures = {}
+
+    def submit(task_list, is_hedge):
+        for index, (ai_instance, task_func) in enumerate(task_list):
+            future = _submit(_timed_call, task_func, ai_instance)
+            futures[future] = (_label_of(ai_instance), is_hedge, index)
+
+    submit(tasks, False)
+
+    hedge_deadline = None
+    if hedge_tasks:
+        if hedge_after is None:
+            estimates = [tracker.percentile(_label_of(ai), hedge_percentile) for ai, _ in tasks]
+            estimates = [e for e in estimates if e is not None]
+            hedge_after = max(estimates) if estimates else DEFAULT_HEDGE_AFTER
+        hedge_deadline = started_at + hedge_after
+
+    results = []
+    successes = []
+    agree_values = []
+    pending = set(futures)
+    done_flag = False
+
+    while pending and not done_flag:
+        now = time.perf_counter()
+        remaining = started_at + timeout - now
+        if remaining <= 0:
+            break
+
+        wait_for = remaining
+        if hedge_deadline is not None:
+            wait_for = min(wait_for, max(0.0, hedge_deadline - now))
+
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            label, is_hedge, index = futures[future]
+            result, error, elapsed = future.result()
+            entry = {"ai": label, "index": index, "result": result, "time": elapsed,
+                     "success": error is None, "hedge": is_hedge, "cancelled": False}
+            if error is not None:
+                entry["error"] = str(error)
+            else:
+                tracker.record(label, elapsed)
+                successes.append(entry)
+                if mode == "quorum":
+                    try:
+                        value = agree_key(result)
+                    except Exception:
+                        value = None
+                    if value is not None:
+                        agree_values.append(value)
+            results.append(entry)
+
+        if mode == "all":
+            done_flag = not pending
+        elif mode == "first":
+            done_flag = len(successes) >= n
+        else:
+            done_flag = _has_quorum(agree_values, n, tolerance)
+
+        # 期限までに決着しない（または主タスクが全て失敗した）場合は予備タスクを送信
+        if not done_flag and hedge_deadline is not None and (
+                time.perf_counter() >= hedge_deadline or not pending):
+            hedge_deadline = None
+            before = set(futures)
+            submit(hedge_tasks, True)
+            pending |= set(futures) - before
+
+    # 残りのタスクは打ち切り（未開始はキャンセル、実行中は結果を破棄）
+    for future in pending:
+        label, is_hedge, index = futures[future]
+        future.cancel()
+        results.append({"ai": label, "index": index, "result": None, "time": time.perf_counter() - started_at,
+                        "success": False, "hedge": is_hedge, "cancelled": True,
+                        "error": "cancelled" if done_flag else "timeout"})
+
+    return results
+
+
+def submit(func: Callable, *args, **kwargs) -> Future:
+    """共有スレッドプールで関数を実行（投機実行など単発のバックグラウンド処理用。現在のスパンを引き継ぐ）"""
+    return _submit(func, *args, **kwargs)
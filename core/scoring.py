@@ -0,0 +1,179 @@
+# core/scoring.py
+# 行数: 179行
+# チェック役の評価テキストから採点・判定を抽出
+
+import re
+from typing import Optional
+
+# チェック役への出力形式の指示（評価本文の末尾に付けさせる）
+VERDICT_INSTRUCTION = """評価の最後に、必ず次の2行を出力してください:
+【採点】0〜100の整数/100
+【判定】OK（修正不要）または NG（修正が必要）"""
+
+_SCORE_TAG = re.compile(r'【採点】\s*(\d{1,3})')
+_TOTAL_TAG = re.compile(r'合計\s*[:：]\s*(\d{1,3})')
+_SCORE_OF_100 = re.compile(r'(\d{1,3})\s*/\s*100')
+# 「N点」は合計・総合の行に限る（「正確性: 25点」のような観点別の点数を合計と取り違えない）
+_SCORE_FALLBACK = re.compile(r'(?:合計|総合)[^\n\d]*(\d{1,3})\s*点')
+_VERDICT_TAG = re.compile(r'【判定】\s*(OK|NG)', re.IGNORECASE)
+
+
+def parse_score(text: str) -> Optional[int]:
+    """
+    評価テキストから100点満点の採点を抽出
+    - 【採点】タグ → 「合計: N」→「N/100」→ 合計・総合の行の「N点」の順に探す
+    """
+    if not text:
+        return None
+    match = (_SCORE_TAG.search(text) or _TOTAL_TAG.search(text)
+             or _SCORE_OF_100.search(text) or _SCORE_FALLBACK.search(text))
+    if not match:
+        return None
+    score = int(match.group(1))
+    return score if 0 <= score <= 100 else None
+
+
+def parse_verdict(text: str) -> dict:
+    """
+    評価テキストから構造化された判定を抽出
+    
+    Returns:
+        {"score": int | None, "approve": bool | None}
+        approve は【判定】タグがない場合 None
+    """
+    verdict_match = _VERDICT_TAG.search(text or "")
+    approve = None
+    if verdict_match:
+        approve = verdict_match.group(1).upper() == "OK"
+    return {"score": parse_score(text), "approve": approve}
+
+
+def verdict_passes(verdict: dict, threshold: Optional[int]) -> bool:
+    """判定が承認かつ採点が閾値以上なら True（閾値 None は常に False）"""
+    if threshold is None:
+        return False
+    score = verdict.get("score")
+    return bool(verdict.get("approve")) and score is not None and score >= threshold
+
+
+# ==========================================
+# クロスチェック採点の集計
+# ==========================================
+CRITERIA = ("正確性", "妥当性", "セキュリティ", "パフォーマンス")
+CRITERION_MAX = 25
+
+_CRITERION_LINE = {
+    name: re.compile(rf'{name}\s*[:：]\s*(\d{{1,3}})(?:\s*/\s*(\d{{1,3}}))?')
+    for name in CRITERIA
+}
+
+
+def parse_crosscheck_scores(text: str) -> dict:
+    """
+    クロスチェックの評価テキストから観点別の点数と合計を抽出
+    
+    Returns:
+        {"criteria": {"正確性": 20, ...}, "total": 85 | None}
+        観点は見つかったものだけ。合計行がなければ観点4つが揃った場合の和
+    """
+    criteria = {}
+    for name, pattern in _CRITERION_LINE.items():
+        match = pattern.search(text or "")
+        if not match:
+            continue
+        value = int(match.group(1))
+        maximum = int(match.group(2)) if match.group(2) else CRITERION_MAX
+        if 0 <= value <= maximum:
+            # 満点が25以外で書かれていても25点満点に換算
+            criteria[name] = value * CRITERION_MAX / maximum if maximum else 0
+    
+    if criteria:
+        # 観点別の「X/25点」を合計と取り違えないよう、明示的な合計だけを読む
+        match = (_SCORE_TAG.search(text) or _TOTAL_TAG.search(text)
+                 or _SCORE_OF_100.search(text))
+        total = int(match.group(1)) if match and int(match.group(1)) <= 100 else None
+    else:
+        total = parse_score(text)
+    if total is None and len(criteria) == len(CRITERIA):
+        total = round(sum(criteria.values()))
+    return {"criteria": criteria, "total": total}
+
+
+def _stats(values: list) -> Optional[dict]:
+    if not values:
+        return None
+    mean = sum(values) / len(values)
+    variance = sum((v - mean) ** 2 for v in values) / len(values)
+    return {
+        "mean": round(mean, 1),
+        "variance": round(variance, 1),
+        "stdev": round(variance ** 0.5, 1),
+        "min": min(values),
+        "max": max(values),
+        "count": len(values),
+    }
+
+
+def aggregate_scores(check_results: list, disagreement_threshold: float = 15) -> dict:
+    """
+    各AIの採点を集計（LLMを使わずローカルで計算）
+    
+    Args:
+        check_results: [{"checker", "evaluation", ...}, ...]
+        disagreement_threshold: 合計点の標準偏差がこれ以上なら評価が割れているとみなす
+    
+    Returns:
+        {"per_checker": [{"checker", "total", "criteria"}, ...],
+         "total": 統計 | None, "criteria": {観点: 統計}, "disagreement": bool,
+         "outliers": [平均から2σ以上離れたAI名]}
+    """
+    per_checker = []
+    for check in check_results:
+        if check.get("status", "ok") != "ok":
+            continue
+        parsed = parse_crosscheck_scores(check.get("evaluation", ""))
+        per_checker.append({"checker": check.get("checker", "不明"), **parsed})
+    
+    totals = [c["total"] for c in per_checker if c["total"] is not None]
+    total_stats = _stats(totals)
+    criteria_stats = {}
+    for name in CRITERIA:
+        stats = _stats([c["criteria"][name] for c in per_checker if name in c["criteria"]])
+        if stats:
+            criteria_stats[name] = stats
+    
+    outliers = []
+    if total_stats and total_stats["stdev"] > 0:
+        outliers = [
+            c["checker"] for c in per_checker
+            if c["total"] is not None
+            and abs(c["total"] - total_stats["mean"]) >= 2 * total_stats["stdev"]
+        ]
+    
+    return {
+        "per_checker": per_checker,
+        "total": total_stats,
+        "criteria": criteria_stats,
+        "disagreement": bool(total_stats) and total_stats["stdev"] >= disagreement_threshold,
+        "outliers": outliers,
+    }
+
+
+def format_aggregate_summary(aggregate: dict) -> str:
+    """集計結果を要約テキストに整形"""
+    total = aggregate.get("total")
+    if not total:
+        return "採点を読み取れませんでした"
+    
+    lines = [f"総合得点: {total['mean']:.1f}/100点（{total['count']}件の平均、"
+             f"最小{total['min']}〜最大{total['max']}、標準偏差{total['stdev']:.1f}）"]
+    if aggregate.get("criteria"):
+        parts = [f"{name} {stats['mean']:.1f}/{CRITERION_MAX}" for name, stats in aggregate["criteria"].items()]
+        weakest = min(aggregate["criteria"].items(), key=lambda item: item[1]["mean"])[0]
+        lines.append("観点別: " + " / ".join(parts))
+        lines.append(f"最も評価が低い観点: {weakest}")
+    if aggregate.get("disagreement"):
+        lines.append("⚠️ AI間で評価が大きく割れています")
+    if aggregate.get("outliers"):
+        lines.append("外れ値: " + "、".join(aggregate["outliers"]))
+    return "\n".join(lines)
@@ -4,12 +4,14 @@
 """
 
 from typing import Dict, List
+from context_assembler import ContextAssembler, get_context_budget
 from conversation_memory import memory
 from firebase_history_manager import get_firebase_manager
 
 class CrossContextManager:
     def __init__(self):
         self.firebase = get_firebase_manager()
+        self.last_metrics = None
     
     def build_cross_context(self, search_result: Dict) -> Dict:
         """
@@ -29,21 +31,18 @@ class CrossContextManager:
                 'search_context': str
             }
         """
-        # 各AIの履歴取得（過去10回）
-        session_history = memory.get_session_history(100)  # 十分な量を取得
+        # 各AIの履歴取得（過去10回、(ai_type, id) 索引で1クエリ）
+        recent = memory.get_recent_by_agent(['Gemini', 'auditor', 'coder', 'data_processor'], 10)
+        gemini_history = recent['Gemini']
+        auditor_history = recent['auditor']
+        coder_history = recent['coder']
+        data_history = recent['data_processor']
         
-        gemini_history = [msg for msg in session_history if msg.get('ai_type') == 'Gemini'][-10:]
-        auditor_history = [msg for msg in session_history if msg.get('ai_type') == 'auditor'][-10:]
-        coder_history = [msg for msg in session_history if msg.get('ai_type') == 'coder'][-10:]
-        data_history = [msg for msg in session_history if msg.get('ai_type') == 'data_processor'][-10:]
+        # クロスリファレンス（会話履歴の追加時に蓄積済み）
+        cross_references = memory.get_cross_references(10)
         
-        # クロスリファレンス生成
-        cross_references = self._build_cross_references(
-            gemini_history, auditor_history, coder_history, data_history
-        )
-        
-        # セッション概要
-        session_overview = self._generate_session_overview(session_history[-20:])
+        # セッション概要（直近20件を古い順に）
+        session_overview = self._generate_session_overview(memory.get_session_history(20)[::-1])
         
         return {
             'session_overview': session_overview,
@@ -55,53 +54,6 @@ class CrossContextManager:
             'search_context': search_result
         }
     
-    def _build_cross_references(self, gemini_hist, auditor_hist, coder_hist, data_hist) -> Dict:
-        """
-        AI間の相互参照情報を構築
-        """
-        refs = {
-            'auditor_warnings': [],
-            'coder_implementations': [],
-            'data_summaries': [],
-            'gemini_decisions': []
-        }
-        
-        # 監査役の警告を抽出
-        for msg in auditor_hist:
-            content = msg.get('content', '')
-            if 'リスク' in content or '懸念' in content or '問題' in content:
-                refs['auditor_warnings'].append({
-                    'timestamp': msg.get('timestamp', ''),
-                    'summary': content[:100] + '...'
-                })
-        
-        # コード役の実装を抽出
-        for msg in coder_hist:
-            content = msg.get('content', '')
-            if '```' in content:  # コードブロックあり
-                refs['coder_implementations'].append({
-                    'timestamp': msg.get('timestamp', ''),
-                    'summary': 'コード実装実施'
-                })
-        
-        # データ役の要約を抽出
-        for msg in data_hist:
-            refs['data_summaries'].append({
-                'timestamp': msg.get('timestamp', ''),
-                'summary': msg.get('content', '')[:100] + '...'
-            })
-        
-        # Geminiの決定を抽出
-        for msg in gemini_hist:
-            content = msg.get('content', '')
-            if 'call_' in content:  # ツール呼び出し
-                refs['gemini_decisions'].append({
-                    'timestamp': msg.get('timestamp', ''),
-                    'summary': '部下に指示を出した'
-                })
-        
-        return refs
-    
     def _generate_session_overview(self, recent_messages: List[Dict]) -> str:
         """
         セッション概要生成
@@ -121,95 +73,131 @@ class CrossContextManager:
         
         return f"継続中のトピック: {', '.join(topics)}"
     
-    def format_for_gemini(self, cross_context: Dict) -> str:
+    def _search_hit_lines(self, search_info: Dict) -> List[str]:
+        """記憶検索のヒットをプロンプト用の項目に変換"""
+        lines = []
+        for hit in search_info.get('data') or []:
+            if 'anchor_id' in hit:
+                lines.append(f"[{hit['anchor_id']}] {hit.get('keywords', '')}\n{hit.get('content', '')}")
+            else:
+                lines.append(f"入力: {hit.get('userInput', '')}\n応答: {hit.get('geminiResponse', '')}")
+        return lines
+    
+    def format_for_gemini(self, cross_context: Dict, budget: int = None) -> str:
         """
         Gemini司令塔用にフォーマット
+        
+        Args:
+            budget: トークン予算（省略時は Gemini の context_budget）
+        
+        優先度: 概要 → 自身の直近の判断 → 記憶検索のヒット → 部下の活動
         """
-        parts = []
-        parts.append("=== 全体セッション状況 ===")
-        parts.append(cross_context['session_overview'])
-        parts.append("")
-        
-        # Gemini自身の過去
-        if cross_context['gemini_history']:
-            parts.append("【あなた（Gemini）の過去10回の判断】")
-            for i, msg in enumerate(cross_context['gemini_history'][-5:], 1):
-                parts.append(f"{i}. {msg.get('content', '')[:100]}...")
-            parts.append("")
+        if budget is None:
+            budget = get_context_budget('gemini')
+        assembler = ContextAssembler(budget)
         
-        # 部下たちの状況
-        parts.append("【部下たちの最近の活動】")
+        assembler.add_section(
+            'overview', [cross_context['session_overview']],
+            priority=0, header="=== 全体セッション状況 ===",
+        )
         
-        if cross_context['auditor_history']:
-            parts.append(f"📊 監査役: {len(cross_context['auditor_history'])}回の監査実施")
-            if cross_context['cross_references']['auditor_warnings']:
-                parts.append(f"   ⚠️ {len(cross_context['cross_references']['auditor_warnings'])}件の警告あり")
+        # Gemini自身の過去（新しい順に詰め、古い順に表示）
+        assembler.add_section(
+            'recent_turns',
+            [msg.get('content', '') for msg in reversed(cross_context['gemini_history'])],
+            priority=1, header="【あなた（Gemini）の過去の判断】",
+            item_tokens=200, chronological=True, max_share=0.5,
+        )
         
+        # 部下たちの状況
+        activity = []
+        refs = cross_context['cross_references']
+        if cross_context['auditor_history']:
+            activity.append(f"📊 監査役: {len(cross_context['auditor_history'])}回の監査実施")
+            if refs['auditor_warnings']:
+                activity.append(f"   ⚠️ {len(refs['auditor_warnings'])}件の警告あり")
         if cross_context['coder_history']:
-            parts.append(f"💻 コード役: {len(cross_context['coder_history'])}回のコード作成")
-            if cross_context['cross_references']['coder_implementations']:
-                parts.append(f"   ✅ {len(cross_context['cross_references']['coder_implementations'])}件の実装完了")
-        
+            activity.append(f"💻 コード役: {len(cross_context['coder_history'])}回のコード作成")
+            if refs['coder_implementations']:
+                activity.append(f"   ✅ {len(refs['coder_implementations'])}件の実装完了")
         if cross_context['data_history']:
-            parts.append(f"📈 データ役: {len(cross_context['data_history'])}回のデータ処理")
-        
-        parts.append("")
+            activity.append(f"📈 データ役: {len(cross_context['data_history'])}回のデータ処理")
+        assembler.add_section(
+            'cross_references', activity,
+            priority=3, header="【部下たちの最近の活動】",
+        )
         
         # 検索結果
         search_info = cross_context['search_context']
-        parts.append(f"【記憶検索結果】Stage {search_info['stage']}でヒット")
+        assembler.add_section(
+            'search_hits', self._search_hit_lines(search_info),
+            priority=2, header=f"【記憶検索結果】Stage {search_info['stage']}でヒット", item_tokens=300,
+        )
         
-        return "\n".join(parts)
+        result = assembler.assemble()
+        self.last_metrics = result
+        return result.text
     
-    def format_for_subordinate(self, cross_context: Dict, ai_type: str) -> str:
+    def format_for_subordinate(self, cross_context: Dict, ai_type: str, budget: int = None) -> str:
         """
         部下AI用にフォーマット
         
         Args:
             cross_context: クロスコンテキスト
             ai_type: 'auditor', 'coder', 'data_processor'
+            budget: トークン予算（省略時は担当モデルの context_budget）
+        
+        優先度: 概要 → 自身の直近の活動 → 司令塔の指示 → 他の部下の活動
         """
-        parts = []
-        parts.append("=== チーム全体の文脈 ===")
-        parts.append(cross_context['session_overview'])
-        parts.append("")
+        if budget is None:
+            budget = get_context_budget(ai_type)
+        assembler = ContextAssembler(budget)
+        
+        assembler.add_section(
+            'overview', [cross_context['session_overview']],
+            priority=0, header="=== チーム全体の文脈 ===",
+        )
         
         # Geminiの指示履歴
-        if cross_context['gemini_history']:
-            parts.append("【司令塔（Gemini）の最近の指示】")
-            for msg in cross_context['gemini_history'][-3:]:
-                parts.append(f"- {msg.get('content', '')[:100]}...")
-            parts.append("")
+        assembler.add_section(
+            'commander_turns',
+            [f"- {msg.get('content', '')}" for msg in reversed(cross_context['gemini_history'])],
+            priority=2, header="【司令塔（Gemini）の最近の指示】", item_tokens=150, chronological=True,
+        )
         
         # 他の部下の活動
-        parts.append("【他の部下の活動】")
-        
+        activity = []
         if ai_type != 'auditor' and cross_context['auditor_history']:
-            parts.append(f"監査役: {len(cross_context['auditor_history'])}回活動")
+            activity.append(f"監査役: {len(cross_context['auditor_history'])}回活動")
             warnings = cross_context['cross_references']['auditor_warnings']
             if warnings:
-                parts.append(f"  最新の警告: {warnings[-1]['summary']}")
+                activity.append(f"  最新の警告: {warnings[-1]['summary']}")
         
         if ai_type != 'coder' and cross_context['coder_history']:
-            parts.append(f"コード役: {len(cross_context['coder_history'])}回活動")
+            activity.append(f"コード役: {len(cross_context['coder_history'])}回活動")
             impls = cross_context['cross_references']['coder_implementations']
             if impls:
-                parts.append(f"  最新実装: {impls[-1]['timestamp']}")
+                activity.append(f"  最新実装: {impls[-1]['timestamp']}")
         
         if ai_type != 'data_processor' and cross_context['data_history']:
-            parts.append(f"データ役: {len(cross_context['data_history'])}回活動")
-        
-        parts.append("")
+            activity.append(f"データ役: {len(cross_context['data_history'])}回活動")
+        assembler.add_section(
+            'cross_references', activity,
+            priority=3, header="【他の部下の活動】",
+        )
         
         # 自分の過去活動
-        history_key = f"{ai_type}_history"
-        own_history = cross_context.get(history_key, [])
-        if own_history:
-            parts.append(f"【あなた自身の過去{len(own_history)}回の活動】")
-            for i, msg in enumerate(own_history[-5:], 1):
-                parts.append(f"{i}. {msg.get('content', '')[:100]}...")
-        
-        return "\n".join(parts)
+        own_history = cross_context.get(f"{ai_type}_history", [])
+        assembler.add_section(
+            'recent_turns',
+            [msg.get('content', '') for msg in reversed(own_history)],
+            priority=1, header=f"【あなた自身の過去{len(own_history)}回の活動】",
+            item_tokens=200, chronological=True, max_share=0.5,
+        )
+        
+        result = assembler.assemble()
+        self.last_metrics = result
+        return result.text
 
 # グローバルインスタンス
 cross_context = CrossContextManager()
@@ -1,8 +1,10 @@
 # failure_analyzer.py
-# 行数: 128行
+# 行数: 167行
 
 from datetime import datetime, timedelta
 
+from failure_tracker import LATENCY_QUANTILES, sketch_quantiles
+
 class FailureAnalyzer:
     def __init__(self, tracker):
         self.tracker = tracker
@@ -35,25 +37,26 @@ class FailureAnalyzer:
         return results
     
     def get_agent_performance(self):
-        cursor = self.tracker.conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                agent_name,
-                role,
-                COUNT(*) as total_tasks,
-                SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as successful_tasks,
-                SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failed_tasks,
-                AVG(token_used) as avg_tokens,
-                SUM(cost_usd) as total_cost
-            FROM agent_executions
-            WHERE started_at >= datetime('now', '-7 days')
-            GROUP BY agent_name, role
-            ORDER BY total_tasks DESC
-        ''')
+        # 日別ロールアップから直近7日分（今日を含む7バケット）
+        with self.tracker.lock:
+            rows = self.tracker.conn.execute('''
+                SELECT 
+                    agent_name,
+                    role,
+                    SUM(total) as total_tasks,
+                    SUM(success) as successful_tasks,
+                    SUM(failed) as failed_tasks,
+                    SUM(tokens) * 1.0 / SUM(total) as avg_tokens,
+                    SUM(cost) as total_cost
+                FROM execution_rollup_daily
+                WHERE bucket >= date('now', '-6 days')
+                GROUP BY agent_name, role
+                HAVING total_tasks > 0
+                ORDER BY total_tasks DESC
+            ''').fetchall()
         
         results = []
-        for row in cursor.fetchall():
+        for row in rows:
             total = row['total_tasks']
             success = row['successful_tasks']
             success_rate = (success / total * 100) if total > 0 else 0
@@ -72,22 +75,23 @@ class FailureAnalyzer:
         return results
     
     def analyze_time_based_patterns(self):
-        cursor = self.tracker.conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                strftime('%H', started_at) as hour,
-                COUNT(*) as total,
-                SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failures
-            FROM agent_executions
-            WHERE started_at >= datetime('now', '-7 days')
-            GROUP BY hour
-            ORDER BY failures DESC
-            LIMIT 3
-        ''')
+        # 時間別ロールアップ（今の時台を含む直近168時間分）を時台（00〜23）でまとめる
+        with self.tracker.lock:
+            rows = self.tracker.conn.execute('''
+                SELECT 
+                    substr(bucket, 12, 2) as hour,
+                    SUM(total) as total,
+                    SUM(failed) as failures
+                FROM execution_rollup_hourly
+                WHERE bucket >= strftime('%Y-%m-%d %H:00:00', 'now', '-167 hours')
+                GROUP BY hour
+                HAVING total > 0
+                ORDER BY failures DESC
+                LIMIT 3
+            ''').fetchall()
         
         results = []
-        for row in cursor.fetchall():
+        for row in rows:
             total = row['total']
             failures = row['failures']
             failure_rate = (failures / total * 100) if total > 0 else 0
@@ -102,22 +106,21 @@ class FailureAnalyzer:
         return results
     
     def analyze_task_type_patterns(self):
-        cursor = self.tracker.conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                role,
-                COUNT(*) as total,
-                SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failures
-            FROM agent_executions
-            WHERE started_at >= datetime('now', '-7 days')
-            GROUP BY role
-            HAVING failures > 0
-            ORDER BY failures DESC
-        ''')
+        with self.tracker.lock:
+            rows = self.tracker.conn.execute('''
+                SELECT 
+                    role,
+                    SUM(total) as total,
+                    SUM(failed) as failures
+                FROM execution_rollup_daily
+                WHERE bucket >= date('now', '-6 days')
+                GROUP BY role
+                HAVING failures > 0
+                ORDER BY failures DESC
+            ''').fetchall()
         
         results = []
-        for row in cursor.fetchall():
+        for row in rows:
             total = row['total']
             failures = row['failures']
             failure_rate = (failures / total * 100) if total > 0 else 0
@@ -130,3 +133,35 @@ class FailureAnalyzer:
             })
         
         return results
+    
+    def get_latency_percentiles(self, days=7, quantiles=LATENCY_QUANTILES):
+        """
+        エージェント・役割ごとの所要時間の分位点（既定は p50 / p95 / p99、単位 ms）
+        今日を含む days 日分の日別スケッチを足し合わせて求める（相対誤差 1% 以内）
+        """
+        with self.tracker.lock:
+            rows = self.tracker.conn.execute('''
+                SELECT agent_name, role, bucket, SUM(count) as count
+                FROM latency_sketch
+                WHERE day >= date('now', '-' || ? || ' days')
+                GROUP BY agent_name, role, bucket
+                ORDER BY agent_name, role, bucket
+            ''', (days - 1,)).fetchall()
+        
+        sketches = {}
+        for row in rows:
+            sketches.setdefault((row['agent_name'], row['role']), []).append((row['bucket'], row['count']))
+        
+        results = []
+        for (agent_name, role), buckets in sketches.items():
+            result = {
+                'agent_name': agent_name,
+                'role': role,
+                'count': sum(count for _, count in buckets),
+            }
+            for q, value in sketch_quantiles(buckets, quantiles).items():
+                result[f"p{q * 100:g}_ms"] = round(value, 1)
+            results.append(result)
+        
+        results.sort(key=lambda r: r['count'], reverse=True)
+        return results
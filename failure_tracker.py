@@ -1,13 +1,115 @@
 # failure_tracker.py
-# 行数: 145行
+# 行数: 473行
 
+import atexit
+import math
 import sqlite3
 import os
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 from pathlib import Path
 
+# 実行記録のバッファ（件数か間隔のどちらかでまとめて書き込む）
+FLUSH_INTERVAL_SECONDS = 2.0
+FLUSH_BATCH_SIZE = 50
+# finish_execution の二重記録を防ぐために覚えておく終了済み execution_id の件数
+FINISHED_HISTORY = 10000
+
+# 集計用ロールアップ: (テーブル, バケットの strftime 書式)
+ROLLUPS = [
+    ('execution_rollup_hourly', '%Y-%m-%d %H:00:00'),
+    ('execution_rollup_daily', '%Y-%m-%d'),
+]
+
+# レイテンシのスケッチ: 相対誤差 LATENCY_RELATIVE_ERROR の対数バケット（HDR / DDSketch 方式）
+# バケット i は (γ^(i-1), γ^i] ms。1ms〜1時間でも約800バケットに収まり、件数によらず一定サイズ
+LATENCY_RELATIVE_ERROR = 0.01
+_LATENCY_GAMMA = (1 + LATENCY_RELATIVE_ERROR) / (1 - LATENCY_RELATIVE_ERROR)
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+# スキーマ作成済みの DB（プロセス内で1回だけ CREATE TABLE する）
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+def _rollup_upsert(table, bucket_format, row, sign):
+    """
+    agent_executions の1行分（row = 'new' / 'old'）をロールアップに加算（sign = 1）・減算（sign = -1）する SQL
+    実行中（status = 'running'）の行は数えない（終了時の UPDATE で加算される）
+    """
+    weight = f"{sign} * ({row}.status != 'running')"
+    return f'''
+        INSERT INTO {table}
+            (bucket, agent_name, role, total, success, failed,
+             recovery_attempts, recovery_successes, tokens, cost)
+        VALUES (
+            strftime('{bucket_format}', coalesce({row}.started_at, CURRENT_TIMESTAMP)),
+            coalesce({row}.agent_name, ''), coalesce({row}.role, ''),
+            {weight},
+            {sign} * ({row}.status = 'success'),
+            {sign} * ({row}.status = 'failed'),
+            {weight} * coalesce({row}.recovery_attempted, 0),
+            {weight} * coalesce({row}.recovery_successful, 0),
+            {weight} * coalesce({row}.token_used, 0),
+            {weight} * coalesce({row}.cost_usd, 0)
+        )
+        ON CONFLICT(bucket, agent_name, role) DO UPDATE SET
+            total = total + excluded.total,
+            success = success + excluded.success,
+            failed = failed + excluded.failed,
+            recovery_attempts = recovery_attempts + excluded.recovery_attempts,
+            recovery_successes = recovery_successes + excluded.recovery_successes,
+            tokens = tokens + excluded.tokens,
+            cost = cost + excluded.cost;
+    '''
+
+def latency_bucket(duration_ms):
+    """所要時間（ms）→ バケット番号（1ms 以下は 0）"""
+    if duration_ms <= 1:
+        return 0
+    return math.ceil(math.log(duration_ms, _LATENCY_GAMMA))
+
+def latency_bucket_value(bucket):
+    """バケットの代表値（ms）。範囲内のどの値とも相対誤差 LATENCY_RELATIVE_ERROR 以内"""
+    if bucket <= 0:
+        return 1.0
+    return 2 * _LATENCY_GAMMA ** bucket / (_LATENCY_GAMMA + 1)
+
+def sketch_quantiles(buckets, quantiles=LATENCY_QUANTILES):
+    """
+    [(バケット番号, 件数), ...]（番号の昇順）から各分位点の所要時間（ms）を求める
+    順位は nearest-rank（少数のサンプルでは p99 が最大値になり、裾を過小評価しない）
+    """
+    total = sum(count for _, count in buckets)
+    if total == 0:
+        return {q: None for q in quantiles}
+    results = {}
+    for q in quantiles:
+        rank = max(1, math.ceil(q * total))
+        seen = 0
+        for bucket, count in buckets:
+            seen += count
+            if seen >= rank:
+                results[q] = latency_bucket_value(bucket)
+                break
+    return results
+
+def _utc_now():
+    """CURRENT_TIMESTAMP と同じ書式の UTC 時刻（ロールアップの期間指定と揃える）"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
 class FailureTracker:
-    def __init__(self, db_path=None):
+    """
+    エージェント実行の記録
+    - record_execution / update_execution / categorize_failure はバッファに積むだけ（リクエスト処理を待たせない）
+    - 別スレッドが件数か間隔でまとめて1トランザクションで書き込む
+    - 接続は self.lock で保護（FailureAnalyzer など self.conn を直接使う側も共有）
+    - 時間別・日別のロールアップをトリガーで随時更新し、集計はロールアップから読む
+    - start_execution / finish_execution で所要時間を測り、エージェント・役割ごとの日別スケッチに積む
+    """
+    
+    def __init__(self, db_path=None, flush_interval=FLUSH_INTERVAL_SECONDS, batch_size=FLUSH_BATCH_SIZE):
         if db_path is None:
             base_dir = Path(__file__).parent
             data_dir = base_dir / 'data'
@@ -16,12 +118,30 @@ class FailureTracker:
         
         self.db_path = str(db_path)
         self.conn = None
+        self.lock = threading.RLock()
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        # 実行中: execution_id → 開始時の perf_counter
+        self._running = {}
+        # 終了済み（直近 FINISHED_HISTORY 件）: 2回目以降の finish_execution は無視
+        self._finished = OrderedDict()
         self.initialize()
+        
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+        atexit.register(self.close)
     
     def initialize(self):
         self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
-        self.create_tables()
+        with _init_lock:
+            if self.db_path in _initialized_paths:
+                return
+            self.create_tables()
+            _initialized_paths.add(self.db_path)
         print('✓ Failure Tracker初期化完了')
     
     def create_tables(self):
@@ -43,9 +163,13 @@ class FailureTracker:
                 recovery_successful BOOLEAN DEFAULT 0,
                 token_used INTEGER,
                 cost_usd REAL,
-                user_visible BOOLEAN DEFAULT 1
+                user_visible BOOLEAN DEFAULT 1,
+                duration_ms REAL
             )
         ''')
+        columns = {row['name'] for row in cursor.execute('PRAGMA table_info(agent_executions)')}
+        if 'duration_ms' not in columns:
+            cursor.execute('ALTER TABLE agent_executions ADD COLUMN duration_ms REAL')
         
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS failure_categories (
@@ -84,23 +208,143 @@ class FailureTracker:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_execution_date ON agent_executions(started_at)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_agent_name ON agent_executions(agent_name)')
         
+        # 所要時間のスケッチ（日 × エージェント × 役割 × バケット → 件数）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS latency_sketch (
+                day TEXT NOT NULL,
+                agent_name TEXT NOT NULL,
+                role TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, agent_name, role, bucket)
+            )
+        ''')
+        
+        self.create_rollups(cursor)
+        
         self.conn.commit()
     
+    def create_rollups(self, cursor):
+        """
+        時間別・日別のロールアップ（件数・失敗・リカバリ・トークン・コスト）
+        agent_executions の INSERT / UPDATE / DELETE にトリガーで追従するので、集計は O(バケット数)
+        """
+        for table, bucket_format in ROLLUPS:
+            exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()
+            trigger = cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (f'{table}_ai',)
+            ).fetchone()
+            # 実行中の行も数えていた旧トリガーは作り直し、ロールアップを集計し直す
+            outdated = trigger is not None and "'running'" not in trigger[0]
+            if outdated:
+                for suffix in ('ai', 'au', 'ad'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {table}_{suffix}')
+                cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket TEXT NOT NULL,
+                    agent_name TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    success INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    recovery_attempts INTEGER NOT NULL DEFAULT 0,
+                    recovery_successes INTEGER NOT NULL DEFAULT 0,
+                    tokens INTEGER NOT NULL DEFAULT 0,
+                    cost REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (bucket, agent_name, role)
+                )
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON agent_executions BEGIN
+                    {_rollup_upsert(table, bucket_format, 'new', 1)}
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE ON agent_executions BEGIN
+                    {_rollup_upsert(table, bucket_format, 'old', -1)}
+                    {_rollup_upsert(table, bucket_format, 'new', 1)}
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON agent_executions BEGIN
+                    {_rollup_upsert(table, bucket_format, 'old', -1)}
+                END
+            ''')
+            # ロールアップ追加前からある実行記録を集計
+            if not exists or outdated:
+                cursor.execute(f'''
+                    INSERT INTO {table}
+                        (bucket, agent_name, role, total, success, failed,
+                         recovery_attempts, recovery_successes, tokens, cost)
+                    SELECT
+                        strftime('{bucket_format}', coalesce(started_at, CURRENT_TIMESTAMP)),
+                        coalesce(agent_name, ''), coalesce(role, ''),
+                        COUNT(*),
+                        SUM(status = 'success'),
+                        SUM(status = 'failed'),
+                        SUM(coalesce(recovery_attempted, 0)),
+                        SUM(coalesce(recovery_successful, 0)),
+                        SUM(coalesce(token_used, 0)),
+                        SUM(coalesce(cost_usd, 0))
+                    FROM agent_executions
+                    WHERE status != 'running'
+                    GROUP BY 1, 2, 3
+                ''')
+    
+    # ------------------------------------------
+    # バッファ
+    # ------------------------------------------
+    def _enqueue(self, sql, params):
+        with self._pending_lock:
+            self._pending.append((sql, params))
+            pending = len(self._pending)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+    
+    def flush(self):
+        """バッファの記録を積まれた順に1トランザクションで書き込み、件数を返す"""
+        with self.lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            
+            written = 0
+            for sql, params in batch:
+                try:
+                    self.conn.execute(sql, params)
+                    written += 1
+                except sqlite3.Error as e:
+                    # 1件の不整合（execution_id の重複など）で他の記録を失わない
+                    print(f"⚠️ 実行記録の書き込みエラー: {e}")
+            self.conn.commit()
+            return written
+    
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ 実行記録の書き込みスレッドのエラー: {e}")
+    
+    # ------------------------------------------
+    # 記録（バッファに積むだけ）
+    # ------------------------------------------
     def record_execution(self, execution_id, agent_name, role, task_description, 
                         status, error_message=None, error_type=None, 
                         token_used=0, cost_usd=0):
-        cursor = self.conn.cursor()
-        
-        cursor.execute('''
+        self._enqueue('''
             INSERT INTO agent_executions 
             (execution_id, agent_name, role, task_description, status, 
              error_message, error_type, token_used, cost_usd)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (execution_id, agent_name, role, task_description, status,
               error_message, error_type, token_used, cost_usd))
-        
-        self.conn.commit()
-        return cursor.lastrowid
     
     def update_execution(self, execution_id, completed_at=None, status=None,
                         error_message=None, error_type=None,
@@ -108,9 +352,7 @@ class FailureTracker:
         if completed_at is None:
             completed_at = datetime.now().isoformat()
         
-        cursor = self.conn.cursor()
-        
-        cursor.execute('''
+        self._enqueue('''
             UPDATE agent_executions 
             SET completed_at = ?, status = ?, error_message = ?, error_type = ?,
                 recovery_attempted = ?, recovery_successful = ?
@@ -119,36 +361,69 @@ class FailureTracker:
               1 if recovery_attempted else 0,
               1 if recovery_successful else 0,
               execution_id))
-        
-        self.conn.commit()
-        return cursor.rowcount
+    
+    def start_execution(self, execution_id, agent_name, role, task_description):
+        """実行開始を記録（status = 'running'）。所要時間は finish_execution で確定"""
+        self._running[execution_id] = time.perf_counter()
+        self._enqueue('''
+            INSERT INTO agent_executions 
+            (execution_id, agent_name, role, task_description, status, started_at)
+            VALUES (?, ?, ?, ?, 'running', ?)
+        ''', (execution_id, agent_name, role, task_description, _utc_now()))
+    
+    def finish_execution(self, execution_id, status, error_message=None, error_type=None,
+                         token_used=None, cost_usd=None):
+        """
+        実行終了を記録し、所要時間（ms）を返す
+        所要時間はスケッチにも積む（start_execution していなければ None で、スケッチには積まない）
+        同じ execution_id の2回目以降の呼び出しは何もせず None を返す
+        """
+        with self._pending_lock:
+            if execution_id in self._finished:
+                return None
+            self._finished[execution_id] = True
+            if len(self._finished) > FINISHED_HISTORY:
+                self._finished.popitem(last=False)
+            started = self._running.pop(execution_id, None)
+        duration_ms = (time.perf_counter() - started) * 1000 if started is not None else None
+        self._enqueue('''
+            UPDATE agent_executions 
+            SET completed_at = ?, status = ?, error_message = ?, error_type = ?, duration_ms = ?,
+                token_used = coalesce(?, token_used), cost_usd = coalesce(?, cost_usd)
+            WHERE execution_id = ?
+        ''', (_utc_now(), status, error_message, error_type, duration_ms,
+              token_used, cost_usd, execution_id))
+        if duration_ms is not None:
+            self._enqueue('''
+                INSERT INTO latency_sketch (day, agent_name, role, bucket, count)
+                SELECT date(started_at), agent_name, role, ?, 1
+                FROM agent_executions WHERE execution_id = ?
+                ON CONFLICT(day, agent_name, role, bucket) DO UPDATE SET count = count + 1
+            ''', (latency_bucket(duration_ms), execution_id))
+        return duration_ms
     
     def categorize_failure(self, execution_id, category, severity, auto_recoverable=False):
-        cursor = self.conn.cursor()
-        
-        cursor.execute('''
+        self._enqueue('''
             INSERT INTO failure_categories (execution_id, category, severity, auto_recoverable)
             VALUES (?, ?, ?, ?)
         ''', (execution_id, category, severity, 1 if auto_recoverable else 0))
-        
-        self.conn.commit()
-        return cursor.lastrowid
     
+    # ------------------------------------------
+    # 集計
+    # ------------------------------------------
     def get_failure_rate(self, period_hours=24):
-        cursor = self.conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_executions,
-                SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failed_executions,
-                SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as successful_executions,
-                SUM(CASE WHEN recovery_attempted = 1 THEN 1 ELSE 0 END) as recovery_attempts,
-                SUM(CASE WHEN recovery_successful = 1 THEN 1 ELSE 0 END) as successful_recoveries
-            FROM agent_executions
-            WHERE started_at >= datetime('now', '-' || ? || ' hours')
-        ''', (period_hours,))
-        
-        row = cursor.fetchone()
+        """直近 period_hours 時間の失敗率（時間別ロールアップから。開始時刻の時台を含む）"""
+        with self.lock:
+            row = self.conn.execute('''
+                SELECT 
+                    SUM(total) as total_executions,
+                    SUM(failed) as failed_executions,
+                    SUM(success) as successful_executions,
+                    SUM(recovery_attempts) as recovery_attempts,
+                    SUM(recovery_successes) as successful_recoveries
+                FROM execution_rollup_hourly
+                WHERE bucket >= strftime('%Y-%m-%d %H:00:00', 'now', '-' || ? || ' hours')
+            ''', (period_hours,)).fetchone()
         
         total = row['total_executions'] or 0
         failed = row['failed_executions'] or 0
@@ -170,5 +445,29 @@ class FailureTracker:
         }
     
     def close(self):
+        """バッファを書き出して接続を閉じる"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
         if self.conn:
-            self.conn.close()
+            self.flush()
+            with self.lock:
+                self.conn.close()
+
+
+# ==========================================
+# 共有インスタンス
+# ==========================================
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_failure_tracker():
+    """プロセス共有の FailureTracker を取得"""
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = FailureTracker()
+    return _tracker
@@ -1,17 +1,159 @@
 """
 Firebase会話履歴管理
 全AI（Gemini/GPT/Claude/Llama）の会話履歴をFirebaseに保存・取得
+取得はローカルミラー（session_mirror.py）から。Firebase からは前回同期以降の差分だけ取り込む
+保存はバックグラウンドでまとめて送信（失敗時は再試行し、送れない分はローカルのジャーナルに退避）
 """
 
+import atexit
+import json
 import os
+import threading
+import time
 import firebase_admin
 from firebase_admin import credentials, db
 from typing import List, Dict, Optional
 from datetime import datetime
 from pathlib import Path
 
+from session_mirror import SessionMirror
+from utils.tracing import set_attributes, span, traced
+
+# 直前の同期からこの秒数以内なら Firebase に問い合わせない
+SYNC_INTERVAL_SECONDS = 30
+
+# 保存のまとめ送信（FIREBASE_WRITE_BEHIND=0 で同期書き込み）
+WRITE_BEHIND = os.getenv('FIREBASE_WRITE_BEHIND', '1') != '0'
+FLUSH_INTERVAL_SECONDS = 2.0
+FLUSH_BATCH_SIZE = 20
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 60.0
+JOURNAL_DIR = Path(__file__).parent / 'data'
+
+
+class SessionWriteQueue:
+    """
+    セッション保存のライトビハインド
+    - save_session は待ち行列に積むだけ。別スレッドが multi-path update でまとめて送信
+    - 送信失敗時は指数バックオフで再試行し、その間の分はジャーナル（JSONL）に退避
+    - ジャーナルは次の送信成功時・次回起動時に再送する
+    """
+    
+    def __init__(self, sessions_ref, journal_path: Path, flush_interval: float = FLUSH_INTERVAL_SECONDS,
+                 batch_size: int = FLUSH_BATCH_SIZE, retry_base: float = RETRY_BASE_SECONDS,
+                 retry_max: float = RETRY_MAX_SECONDS):
+        self.sessions_ref = sessions_ref
+        self.journal_path = Path(journal_path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.failures = 0
+        self.sent = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # バックオフ中はこの時刻（monotonic）まで put で送信スレッドを起こさない
+        self._retry_at = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        # 前回送れなかった分があればすぐ再送
+        if self.journal_path.exists():
+            self._wakeup.set()
+    
+    def put(self, session_id: str, record: Dict):
+        with self._lock:
+            self._pending[session_id] = record
+            pending = len(self._pending)
+        if pending >= self.batch_size and time.monotonic() >= self._retry_at:
+            self._wakeup.set()
+    
+    def _read_journal(self) -> Dict:
+        if not self.journal_path.exists():
+            return {}
+        sessions = {}
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    sessions[entry['sessionId']] = entry['record']
+        return sessions
+    
+    def _write_journal(self, sessions: Dict):
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.journal_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for session_id, record in sessions.items():
+                f.write(json.dumps({'sessionId': session_id, 'record': record}, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.journal_path)
+    
+    def flush(self) -> bool:
+        """
+        待ち行列とジャーナルの分を1回の update で送信
+        
+        Returns:
+            送信できたか（送るものがなければ True）
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            journal = self._read_journal()
+            batch = {**journal, **batch}
+            if not batch:
+                return True
+            
+            try:
+                # {session_id: record} を子パスとしてまとめて書き込む
+                with span("persist.firebase.flush", sessions=len(batch), retried=len(journal)):
+                    self.sessions_ref.update(batch)
+            except Exception as e:
+                self.failures += 1
+                self._retry_at = time.monotonic() + self.backoff()
+                self._write_journal(batch)
+                print(f"⚠️ Firebase保存エラー（{len(batch)}件をジャーナルに退避、再試行します）: {e}")
+                return False
+            
+            if journal:
+                self.journal_path.unlink(missing_ok=True)
+            self.failures = 0
+            self._retry_at = 0.0
+            self.sent += len(batch)
+            return True
+    
+    def backoff(self) -> float:
+        """次の送信までの待ち時間（失敗が続くほど伸ばす）"""
+        if not self.failures:
+            return self.flush_interval
+        return min(self.retry_base * 2 ** (self.failures - 1), self.retry_max)
+    
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.backoff())
+            self._wakeup.clear()
+            if self._closed:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Firebase保存スレッドのエラー: {e}")
+    
+    def close(self):
+        """終了時: 残りを送信（送れなければジャーナルに残る）"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+
 class FirebaseHistoryManager:
-    def __init__(self, service_account_path: str, database_url: str, user_id: str):
+    def __init__(self, service_account_path: str, database_url: str, user_id: str,
+                 sessions_ref=None, mirror: Optional[SessionMirror] = None,
+                 sync_interval: float = SYNC_INTERVAL_SECONDS, write_behind: bool = False,
+                 journal_path=None):
         """
         Firebase初期化
         
@@ -19,19 +161,81 @@ class FirebaseHistoryManager:
             service_account_path: サービスアカウントキーのパス
             database_url: Firebase Realtime DatabaseのURL
             user_id: ユーザーID
+            sessions_ref: セッションの参照（省略時は Realtime Database。テストでは代替を渡す）
+            mirror: ローカルミラー（省略時は data/session_mirror.db）
+            sync_interval: 差分同期の最短間隔（秒）
+            write_behind: 保存をバックグラウンドでまとめて送信するか
+            journal_path: 送信できなかった保存の退避先（省略時は data/firebase_journal_{user_id}.jsonl）
         """
         self.user_id = user_id
         self.database_url = database_url
+        self.mirror = mirror or SessionMirror()
+        self.sync_interval = sync_interval
+        self._last_sync = 0.0
+        self._sync_lock = threading.Lock()
+        self._last_session_ms = 0
+        
+        if sessions_ref is not None:
+            self.sessions_ref = sessions_ref
+        else:
+            # Firebase初期化（既に初期化済みならスキップ）
+            if not firebase_admin._apps:
+                cred = credentials.Certificate(service_account_path)
+                firebase_admin.initialize_app(cred, {
+                    'databaseURL': database_url
+                })
+            
+            self.sessions_ref = db.reference(f'users/{user_id}/multiAgentSessions')
         
-        # Firebase初期化（既に初期化済みならスキップ）
-        if not firebase_admin._apps:
-            cred = credentials.Certificate(service_account_path)
-            firebase_admin.initialize_app(cred, {
-                'databaseURL': database_url
-            })
+        self.write_queue = None
+        if write_behind:
+            journal_path = journal_path or JOURNAL_DIR / f'firebase_journal_{user_id}.jsonl'
+            self.write_queue = SessionWriteQueue(self.sessions_ref, journal_path)
+            atexit.register(self.close)
+    
+    def close(self):
+        """未送信の保存を送り切る（プロセス終了時）"""
+        if self.write_queue:
+            self.write_queue.close()
+    
+    def sync(self, force: bool = False) -> int:
+        """
+        Firebase → ローカルミラーの差分同期
+        
+        同期カーソル（取り込み済みの最新 timestamp）以降のレコードだけを取得する。
+        start_at は境界を含むので、同じ timestamp のレコードは上書きで重複しない。
+        
+        Returns:
+            取り込んだ件数（同期間隔内・エラー時は 0）
+        """
+        # Stage 1 と Stage 3 が並列に呼んでも問い合わせは1回
+        with self._sync_lock:
+            return self._sync(force)
+    
+    def _sync(self, force: bool) -> int:
+        if not force and time.monotonic() - self._last_sync < self.sync_interval:
+            return 0
         
-        self.sessions_ref = db.reference(f'users/{user_id}/multiAgentSessions')
+        try:
+            cursor = self.mirror.get_cursor(self.user_id)
+            query = self.sessions_ref.order_by_child('timestamp')
+            if cursor:
+                query = query.start_at(cursor)
+            sessions = query.get() or {}
+            
+            count = self.mirror.upsert_sessions(self.user_id, sessions)
+            timestamps = [data.get('timestamp', '') for data in sessions.values() if isinstance(data, dict)]
+            if timestamps and max(timestamps) > (cursor or ''):
+                self.mirror.set_cursor(self.user_id, max(timestamps))
+            self._last_sync = time.monotonic()
+            return count
+            
+        except Exception as e:
+            # 同期できなくてもミラーの内容で応答する
+            print(f"⚠️ Firebase同期エラー（ローカルミラーで続行）: {e}")
+            return 0
     
+    @traced("persist.firebase")
     def save_session(self, session_data: Dict):
         """
         セッション保存
@@ -44,14 +248,26 @@ class FirebaseHistoryManager:
                 'coderCalls': [{input, output}],
                 'dataCalls': [{input, output}]
             }
-        """
-        session_id = f"session_{int(datetime.now().timestamp() * 1000)}"
         
-        self.sessions_ref.child(session_id).set({
+        write_behind 時は待ち行列に積んで即座に返る（送信はバックグラウンド）
+        """
+        # 同じミリ秒に続けて保存しても ID が重ならないようにする（待ち行列で上書きされる）
+        session_ms = max(int(datetime.now().timestamp() * 1000), self._last_session_ms + 1)
+        self._last_session_ms = session_ms
+        session_id = f"session_{session_ms}"
+        record = {
             **session_data,
             'timestamp': datetime.now().isoformat(),
             'sessionId': session_id
-        })
+        }
+        
+        # 書いた分はその場でミラーにも反映（次の同期・送信を待たずに検索対象にする）
+        self.mirror.upsert_sessions(self.user_id, {session_id: record})
+        set_attributes(write_behind=self.write_queue is not None)
+        if self.write_queue:
+            self.write_queue.put(session_id, record)
+        else:
+            self.sessions_ref.child(session_id).set(record)
         
         return session_id
     
@@ -63,29 +279,10 @@ class FirebaseHistoryManager:
             limit: 取得件数
             
         Returns:
-            セッションデータのリスト（新しい順）
+            セッションデータのリスト（新しい順、ローカルミラーから）
         """
-        try:
-            # 全セッション取得してソート
-            all_sessions = self.sessions_ref.order_by_child('timestamp').get()
-            
-            if not all_sessions:
-                return []
-            
-            # 辞書をリストに変換してソート
-            sessions_list = []
-            for session_id, data in all_sessions.items():
-                data['sessionId'] = session_id
-                sessions_list.append(data)
-            
-            # タイムスタンプでソート（新しい順）
-            sessions_list.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-            
-            return sessions_list[:limit]
-            
-        except Exception as e:
-            print(f"❌ Firebase取得エラー: {e}")
-            return []
+        self.sync()
+        return self.mirror.recent_sessions(self.user_id, limit)
     
     def get_all_sessions(self, limit: int = 1000) -> List[Dict]:
         """
@@ -95,27 +292,30 @@ class FirebaseHistoryManager:
             limit: 最大取得件数
             
         Returns:
-            全セッションデータのリスト
+            全セッションデータのリスト（新しい順、ローカルミラーから）
         """
-        try:
-            all_sessions = self.sessions_ref.order_by_child('timestamp').limit_to_last(limit).get()
-            
-            if not all_sessions:
-                return []
-            
-            sessions_list = []
-            for session_id, data in all_sessions.items():
-                data['sessionId'] = session_id
-                sessions_list.append(data)
-            
-            # タイムスタンプでソート（新しい順）
-            sessions_list.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-            
-            return sessions_list
+        self.sync()
+        return self.mirror.recent_sessions(self.user_id, limit)
+    
+    def count_sessions(self) -> int:
+        """ミラー済みのセッション数"""
+        return self.mirror.count_sessions(self.user_id)
+    
+    def search_sessions(self, keyword: str, limit: int = 20, sync: bool = True) -> List[Dict]:
+        """
+        ミラー済み全セッションの索引検索（Stage 3用）
+        
+        Args:
+            keyword: 検索キーワード
+            limit: 最大取得件数（関連度の高い順）
+            sync: 検索前に差分同期するか（呼び出し側で同期済みなら False）
             
-        except Exception as e:
-            print(f"❌ Firebase全件取得エラー: {e}")
-            return []
+        Returns:
+            ヒットしたセッションリスト（入力・応答・各AI呼び出しの入出力が対象）
+        """
+        if sync:
+            self.sync()
+        return self.mirror.search(self.user_id, keyword, limit)
     
     def search_sessions_by_keyword(self, keyword: str, sessions: List[Dict]) -> List[Dict]:
         """
@@ -166,15 +366,15 @@ class FirebaseHistoryManager:
             from datetime import timedelta
             cutoff_date = (datetime.now() - timedelta(days=keep_days)).isoformat()
             
-            all_sessions = self.sessions_ref.get()
-            if not all_sessions:
-                return
+            # 期限切れのものだけ取得
+            old_sessions = self.sessions_ref.order_by_child('timestamp').end_at(cutoff_date).get()
             
             deleted_count = 0
-            for session_id, data in all_sessions.items():
+            for session_id, data in (old_sessions or {}).items():
                 if data.get('timestamp', '') < cutoff_date:
                     self.sessions_ref.child(session_id).delete()
                     deleted_count += 1
+            self.mirror.delete_before(self.user_id, cutoff_date)
             
             print(f"🗑️ {deleted_count}件の古いセッションを削除しました")
             
@@ -203,7 +403,8 @@ def get_firebase_manager():
         _firebase_manager = FirebaseHistoryManager(
             service_account_path,
             database_url,
-            user_id
+            user_id,
+            write_behind=WRITE_BEHIND
         )
     
     return _firebase_manager
@@ -12,6 +12,9 @@ from past_threads_loader import initialize_memory_system
 from three_stage_search import search_engine
 from firebase_history_manager import get_firebase_manager
 from cross_context_manager import cross_context
+from context_assembler import estimate_tokens, get_context_budget
+from utils import record_usage, span
+from utils.llm_cache import get_model_name
 
 # 環境変数を読み込む
 load_dotenv()
@@ -106,25 +109,32 @@ def main():
             if not user_input:
                 continue
 
-            print("\n⏳ Gemini 3 Proが思考中... 必要な部下を選定しています...\n")
+            # 1回の入力を1トレースとして記録
+            with span("request", ui="cli"):
+                print("\n⏳ Gemini 3 Proが思考中... 必要な部下を選定しています...\n")
             
-            # 🧠 3段階記憶検索
-            search_result = search_engine.search(user_input)
+                # 🧠 3段階記憶検索
+                search_result = search_engine.search(user_input)
             
-            # 🤝 クロスコンテキスト生成（全AIが文脈共有）
-            cross_context_data = cross_context.build_cross_context(search_result)
+                # 🤝 クロスコンテキスト生成（全AIが文脈共有）
+                cross_context_data = cross_context.build_cross_context(search_result)
             
-            # 🔄 tools.pyにクロスコンテキストを設定（全AIが参照可能に）
-            set_cross_context(cross_context_data)
+                # 🔄 tools.pyにクロスコンテキストを設定（全AIが参照可能に）
+                set_cross_context(cross_context_data)
             
-            # Gemini用にフォーマット
-            gemini_context = cross_context.format_for_gemini(cross_context_data)
+                # Gemini用にフォーマット（質問文の分を差し引いたトークン予算内に収める）
+                context_budget = get_context_budget('gemini') - estimate_tokens(user_input)
+                gemini_context = cross_context.format_for_gemini(cross_context_data, budget=max(context_budget, 0))
+                metrics = cross_context.last_metrics
+                print("📏 コンテキスト: " + ", ".join(
+                    f"{name} {m['tokens']}" for name, m in metrics.sections.items()
+                ) + f" / 予算 {metrics.budget} tokens")
             
-            # ユーザーメッセージを記憶に追加
-            memory.add_session_message('user', user_input)
+                # ユーザーメッセージを記憶に追加
+                memory.add_session_message('user', user_input)
             
-            # 記憶を含めたプロンプト作成
-            enhanced_prompt = f"""
+                # 記憶を含めたプロンプト作成
+                enhanced_prompt = f"""
 【チーム全体の文脈】
 {gemini_context}
 
@@ -132,34 +142,39 @@ def main():
 {user_input}
 """
             
-            # エージェント実行
-            result = agent_executor.invoke({
-                "messages": [HumanMessage(content=enhanced_prompt)]
-            })
+                # エージェント実行
+                with span("commander", team="commander", role="commander"):
+                    result = agent_executor.invoke({
+                        "messages": [HumanMessage(content=enhanced_prompt)]
+                    })
+                    # 司令塔の各ステップ（ツール呼び出しの判断・最終回答）の使用量
+                    for message in result["messages"]:
+                        record_usage(message, get_model_name(llm))
             
-            # 最終回答を取得
-            final_message = result["messages"][-1]
-            if hasattr(final_message, 'content') and final_message.content:
-                print(f"🤖 Gemini: {final_message.content}\n")
+                # 最終回答を取得
+                final_message = result["messages"][-1]
+                if hasattr(final_message, 'content') and final_message.content:
+                    print(f"🤖 Gemini: {final_message.content}\n")
                 
-                # 🧠 Geminiの回答を記憶に追加
-                memory.add_session_message('assistant', final_message.content, 'Gemini')
+                    # 🧠 Geminiの回答を記憶に追加
+                    memory.add_session_message('assistant', final_message.content, 'Gemini')
                 
-                # 💾 Firebaseにセッション保存
-                try:
-                    firebase = get_firebase_manager()
-                    # 各AIの呼び出し情報を収集（実装簡略化版）
-                    session_data = {
-                        'userInput': user_input,
-                        'geminiResponse': final_message.content,
-                        'auditorCalls': [],  # tools.pyから収集する場合は別途実装
-                        'coderCalls': [],
-                        'dataCalls': []
-                    }
-                    firebase.save_session(session_data)
-                    print("✅ セッションをFirebaseに保存しました")
-                except Exception as e:
-                    print(f"⚠️ Firebase保存エラー: {e}")
+                    # 💾 Firebaseにセッション保存
+                    try:
+                        firebase = get_firebase_manager()
+                        # 各AIの呼び出し情報を収集（実装簡略化版）
+                        session_data = {
+                            'userInput': user_input,
+                            'geminiResponse': final_message.content,
+                            'auditorCalls': [],  # tools.pyから収集する場合は別途実装
+                            'coderCalls': [],
+                            'dataCalls': []
+                        }
+                        # 送信はバックグラウンド（次の入力を待たせない。終了時に送り切る）
+                        firebase.save_session(session_data)
+                        print("✅ セッションを保存しました")
+                    except Exception as e:
+                        print(f"⚠️ Firebase保存エラー: {e}")
 
         except KeyboardInterrupt:
             print("\n👋 中断されました。システムを終了します。")
@@ -0,0 +1,207 @@
+"""
+Firebaseセッションのローカルミラー
+- multiAgentSessions を SQLite に複製し、Stage 1/3 の検索はローカルで読む
+- 同期カーソル（最後に取り込んだ timestamp）より新しいレコードだけを取り込む
+- 入力・応答・各AI呼び出しの入出力を FTS5（trigram）で索引し、BM25 順に検索
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.sqlite_conn import SQLiteConnection, fts_match_query
+
+# データベースパス
+DB_PATH = Path(__file__).parent / 'data' / 'session_mirror.db'
+
+# 索引するAI呼び出しの種類
+CALL_FIELDS = ('auditorCalls', 'coderCalls', 'dataCalls')
+
+
+def _index_columns(data: Dict) -> tuple:
+    """検索対象のテキスト（入力, 応答, AI呼び出しの入出力）"""
+    calls = []
+    for field in CALL_FIELDS:
+        for call in data.get(field) or []:
+            if isinstance(call, dict):
+                calls.append(str(call.get('input', '')))
+                calls.append(str(call.get('output', '')))
+            else:
+                calls.append(str(call))
+    return (str(data.get('userInput', '')), str(data.get('geminiResponse', '')), '\n'.join(calls))
+
+
+class SessionMirror:
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else DB_PATH
+        self.db = SQLiteConnection(self.db_path)
+        self.fts_enabled = False
+        # ユーザーごとのセッション数（書き込みのたびに破棄し、次の参照で数え直す）
+        self._counts = {}
+        self._init_database()
+    
+    def _init_database(self):
+        """データベース初期化"""
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    user_id TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    timestamp TEXT,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (user_id, session_id)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_time ON sessions(user_id, timestamp)')
+            
+            # 同期カーソル（ユーザーごとに最後に取り込んだ timestamp）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    user_id TEXT PRIMARY KEY,
+                    cursor TEXT,
+                    synced_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            self.fts_enabled = self._init_fts(cursor)
+    
+    def _init_fts(self, cursor) -> bool:
+        """
+        全文検索索引（rowid は sessions の rowid）
+        ネストした呼び出しの入出力は JSON から取り出すので、同期は SQL トリガーではなく書き込み側で行う
+        """
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions_fts'"
+        ).fetchone()
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(
+                    user_input, gemini_response, calls, tokenize='trigram'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ FTS5が使えないためLIKE検索で動作します: {e}")
+            return False
+        # 索引追加前からあるセッションを取り込む
+        if not exists:
+            rows = cursor.execute('SELECT rowid, data FROM sessions').fetchall()
+            cursor.executemany(
+                'INSERT INTO sessions_fts (rowid, user_input, gemini_response, calls) VALUES (?, ?, ?, ?)',
+                [(rowid, *_index_columns(json.loads(data))) for rowid, data in rows]
+            )
+        return True
+    
+    def upsert_sessions(self, user_id: str, sessions: Dict[str, Dict]) -> int:
+        """セッション（{session_id: data}）を取り込み、件数を返す"""
+        rows = []
+        for session_id, data in sessions.items():
+            if not isinstance(data, dict):
+                continue
+            data = {**data, 'sessionId': session_id}
+            rows.append((user_id, session_id, data.get('timestamp', ''),
+                         json.dumps(data, ensure_ascii=False)))
+        if not rows:
+            return 0
+        self._counts.pop(user_id, None)
+        with self.db.transaction() as cursor:
+            for row in rows:
+                cursor.execute('''
+                    INSERT INTO sessions (user_id, session_id, timestamp, data)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(user_id, session_id) DO UPDATE SET
+                        timestamp = excluded.timestamp, data = excluded.data
+                ''', row)
+                if self.fts_enabled:
+                    rowid = cursor.execute(
+                        'SELECT rowid FROM sessions WHERE user_id = ? AND session_id = ?', row[:2]
+                    ).fetchone()[0]
+                    cursor.execute('DELETE FROM sessions_fts WHERE rowid = ?', (rowid,))
+                    cursor.execute(
+                        'INSERT INTO sessions_fts (rowid, user_input, gemini_response, calls) VALUES (?, ?, ?, ?)',
+                        (rowid, *_index_columns(json.loads(row[3])))
+                    )
+        return len(rows)
+    
+    def get_cursor(self, user_id: str) -> Optional[str]:
+        row = self.db.fetchone('SELECT cursor FROM sync_state WHERE user_id = ?', (user_id,))
+        return row[0] if row else None
+    
+    def set_cursor(self, user_id: str, cursor: str):
+        self.db.execute('''
+            INSERT INTO sync_state (user_id, cursor, synced_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id) DO UPDATE SET
+                cursor = excluded.cursor, synced_at = excluded.synced_at
+        ''', (user_id, cursor))
+    
+    def recent_sessions(self, user_id: str, limit: int = 10) -> List[Dict]:
+        """新しい順に limit 件"""
+        rows = self.db.fetchall('''
+            SELECT data FROM sessions
+            WHERE user_id = ?
+            ORDER BY timestamp DESC
+            LIMIT ?
+        ''', (user_id, limit))
+        return [json.loads(row[0]) for row in rows]
+    
+    def search(self, user_id: str, query: str, limit: int = 20) -> List[Dict]:
+        """
+        キーワード検索（BM25 の関連度順に上位 limit 件）
+        
+        入力の一致を応答・AI呼び出しより重視する。3文字未満の語だけなら部分一致（新しい順）
+        """
+        if not query:
+            return []
+        match = fts_match_query(query) if self.fts_enabled else None
+        if match:
+            rows = self.db.fetchall('''
+                SELECT s.data, bm25(sessions_fts, 3.0, 1.0, 1.0) AS rank
+                FROM sessions_fts
+                JOIN sessions s ON s.rowid = sessions_fts.rowid
+                WHERE sessions_fts MATCH ? AND s.user_id = ?
+                ORDER BY rank
+                LIMIT ?
+            ''', (match, user_id, limit))
+        elif self.fts_enabled:
+            pattern = f'%{query}%'
+            rows = self.db.fetchall('''
+                SELECT s.data, NULL
+                FROM sessions_fts
+                JOIN sessions s ON s.rowid = sessions_fts.rowid
+                WHERE s.user_id = ?
+                  AND (sessions_fts.user_input LIKE ? OR sessions_fts.gemini_response LIKE ?
+                       OR sessions_fts.calls LIKE ?)
+                ORDER BY s.timestamp DESC
+                LIMIT ?
+            ''', (user_id, pattern, pattern, pattern, limit))
+        else:
+            rows = self.db.fetchall('''
+                SELECT data, NULL FROM sessions
+                WHERE user_id = ? AND data LIKE ?
+                ORDER BY timestamp DESC
+                LIMIT ?
+            ''', (user_id, f'%{query}%', limit))
+        return [json.loads(row[0]) for row in rows]
+    
+    def count_sessions(self, user_id: str) -> int:
+        if user_id not in self._counts:
+            self._counts[user_id] = self.db.fetchone(
+                'SELECT COUNT(*) FROM sessions WHERE user_id = ?', (user_id,)
+            )[0]
+        return self._counts[user_id]
+    
+    def delete_before(self, user_id: str, cutoff: str) -> int:
+        """cutoff より古いセッションを削除"""
+        self._counts.pop(user_id, None)
+        with self.db.transaction() as cursor:
+            if self.fts_enabled:
+                cursor.execute('''
+                    DELETE FROM sessions_fts WHERE rowid IN (
+                        SELECT rowid FROM sessions WHERE user_id = ? AND timestamp < ?
+                    )
+                ''', (user_id, cutoff))
+            return cursor.execute(
+                'DELETE FROM sessions WHERE user_id = ? AND timestamp < ?', (user_id, cutoff)
+            ).rowcount
+
@@ -0,0 +1,95 @@
+# test_client_pool.py
+# LLMクライアントの共有レジストリ（接続プールの共有・生成時のロック・アイドル破棄）のテスト
+# 行数: 95行
+
+import threading
+import time
+
+from core.client_pool import ClientPool
+
+
+class _FakeLLM:
+    def __init__(self, model, http_kwargs):
+        self.model = model
+        self.http_client = http_kwargs.get("http_client")
+
+
+def _factory(model):
+    return lambda http_kwargs: _FakeLLM(model, http_kwargs)
+
+
+def test_http_clients_are_shared_per_provider_and_base_url():
+    pool = ClientPool()
+    gpt = pool.get("openai", "gpt-a", 0, None, _factory("gpt-a"))
+    assert pool.get("openai", "gpt-a", 0, None, _factory("gpt-a")) is gpt
+    other_model = pool.get("openai", "gpt-b", 0.7, None, _factory("gpt-b"))
+    proxy = pool.get("openai", "gpt-a", 0, "https://proxy.example/v1", _factory("gpt-a"))
+    claude = pool.get("anthropic", "claude", 0, None, _factory("claude"))
+
+    assert other_model.http_client is gpt.http_client
+    assert proxy.http_client is not gpt.http_client
+    assert claude.http_client is None
+    assert pool.stats() == {"hits": 1, "misses": 4, "evictions": 0, "size": 4, "http_pools": 2}
+    pool.clear()
+    assert gpt.http_client.is_closed
+
+
+def test_slow_factory_does_not_block_other_keys():
+    pool = ClientPool()
+    cached = pool.get("openai", "fast", 0, None, _factory("fast"))
+    building = threading.Event()
+    release = threading.Event()
+
+    def slow_factory(http_kwargs):
+        building.set()
+        release.wait(5)
+        return _FakeLLM("slow", http_kwargs)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.get("openai", "slow", 0, None, slow_factory)))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert building.wait(5)
+
+    start = time.perf_counter()
+    assert pool.get("openai", "fast", 0, None, _factory("fast")) is cached
+    assert time.perf_counter() - start < 0.5
+    release.set()
+    for thread in threads:
+        thread.join()
+    # 同じキーの生成は1回だけ
+    assert results[0] is results[1]
+    assert pool.stats()["misses"] == 2
+
+
+def test_idle_eviction_closes_unused_http_clients():
+    pool = ClientPool(idle_timeout=0.05)
+    http_client = pool.get("openai", "old", 0, None, _factory("old")).http_client
+    time.sleep(0.1)
+    shared = pool.get("xai", "grok", 0, "https://api.x.ai/v1", _factory("grok"))
+
+    assert pool.stats()["evictions"] == 1
+    assert http_client.is_closed
+    assert not shared.http_client.is_closed
+    pool.clear()
+
+
+def test_idle_eviction_keeps_http_clients_of_held_llms_open():
+    pool = ClientPool(idle_timeout=0.05)
+    # チームが初期化時に取得して保持し続けるクライアント
+    held = pool.get("openai", "leader", 0, None, _factory("leader"))
+    time.sleep(0.1)
+    pool.get("xai", "grok", 0, "https://api.x.ai/v1", _factory("grok"))
+
+    assert pool.stats()["evictions"] == 1
+    assert not held.http_client.is_closed
+    assert pool.stats()["http_pools"] == 2
+
+    # 保持していた側が手放した後のアクセスで閉じる
+    http_client = held.http_client
+    del held
+    pool.evict_idle()
+    assert http_client.is_closed
+    assert pool.stats()["http_pools"] == 1
+    pool.clear()
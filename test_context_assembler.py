@@ -0,0 +1,55 @@
+# test_context_assembler.py
+# トークン予算付きコンテキスト組み立てのテスト
+# 行数: 55行
+
+from context_assembler import ContextAssembler, estimate_tokens, truncate_to_tokens
+
+
+def test_estimate_tokens_counts_cjk_and_ascii():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("日本語") == 3
+    assert estimate_tokens("abcd日本") == 3
+
+
+def test_truncate_to_tokens_respects_budget():
+    text = "あ" * 100
+    truncated = truncate_to_tokens(text, 20)
+    assert estimate_tokens(truncated) <= 20
+    assert truncated.endswith("...")
+    assert truncate_to_tokens("short", 20) == "short"
+
+
+def test_priorities_fill_budget_greedily():
+    assembler = ContextAssembler(budget=120)
+    assembler.add_section("threads", ["古" * 80, "古" * 80], priority=3, header="スレッド")
+    assembler.add_section("recent", ["新しい発言" * 4, "ひとつ前" * 4], priority=1,
+                          header="履歴", chronological=True)
+    result = assembler.assemble()
+
+    assert result.total_tokens <= 120
+    assert result.sections["recent"]["items"] == 2
+    assert result.sections["threads"]["dropped"] >= 1
+    # 追加順にセクションを並べ、chronological は古い順で表示
+    assert result.text.index("スレッド") < result.text.index("履歴")
+    assert result.text.index("ひとつ前") < result.text.index("新しい発言")
+
+
+def test_prompt_size_is_bounded_as_history_grows():
+    sizes = []
+    for n in (10, 100, 1000):
+        assembler = ContextAssembler(budget=500)
+        assembler.add_section("recent", [f"user: メッセージ{i}" * 3 for i in range(n)], priority=1, item_tokens=50)
+        sizes.append(estimate_tokens(assembler.assemble().text))
+    assert max(sizes) <= 500
+    assert sizes[1] == sizes[2]
+
+
+def test_max_share_leaves_room_for_later_sections():
+    assembler = ContextAssembler(budget=200)
+    assembler.add_section("recent", ["発言" * 30] * 10, priority=1, max_share=0.5)
+    assembler.add_section("hits", ["検索結果" * 10], priority=2)
+    result = assembler.assemble()
+    assert result.sections["recent"]["tokens"] <= 100
+    assert result.sections["hits"]["items"] == 1
+    assert result.total_tokens <= 200
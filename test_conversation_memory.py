@@ -0,0 +1,151 @@
+"""
+conversation_memory.py の FTS5 全文検索テスト
+"""
+
+import sqlite3
+
+import pytest
+
+from conversation_memory import ConversationMemory, fts_match_query
+
+
+@pytest.fixture
+def memory(tmp_path):
+    return ConversationMemory(db_path=tmp_path / "memory.db")
+
+
+def _save_anchor(memory, anchor_id, keywords, content, thread_id="t1"):
+    memory.extract_and_save_anchors(
+        thread_id, f'<anchor id="{anchor_id}" keywords="{keywords}">{content}</anchor>'
+    )
+
+
+def test_fts_match_query_quotes_terms_and_skips_short_ones():
+    assert fts_match_query('データベース 設計') == '"データベース"'
+    assert fts_match_query('say "hi" there') == '"say" OR """hi""" OR "there"'
+    assert fts_match_query('ab') is None
+
+
+def test_search_anchors_ranks_keyword_hits_first(memory):
+    assert memory.fts_enabled
+    _save_anchor(memory, "a1", "雑談", "データベース設計の話が少しだけ出た")
+    _save_anchor(memory, "a2", "データベース設計", "正規化とインデックスの方針")
+    _save_anchor(memory, "a3", "料理", "カレーの作り方")
+
+    results = memory.search_anchors("データベース設計")
+    assert [r["anchor_id"] for r in results] == ["a2", "a1"]
+    assert "【データベース設計】" in results[1]["snippet"]
+
+
+def test_anchor_update_keeps_index_in_sync(memory):
+    _save_anchor(memory, "a1", "旧キーワード", "古い内容")
+    _save_anchor(memory, "a1", "新キーワード", "新しい内容")
+
+    assert memory.search_anchors("旧キーワード") == []
+    assert [r["content"] for r in memory.search_anchors("新キーワード")] == ["新しい内容"]
+    assert memory.count_anchors() == 1
+
+
+def test_short_query_falls_back_to_like(memory):
+    _save_anchor(memory, "a1", "猫", "猫の写真")
+    assert [r["anchor_id"] for r in memory.search_anchors("猫")] == ["a1"]
+    assert [r["anchor_id"] for r in memory.search_anchors("")] == ["a1"]
+
+
+def test_search_threads_and_session_history(memory):
+    memory.save_thread("t1", "FastAPI入門", "ルーティングの基本", "2026-01-01")
+    memory.save_thread("t2", "料理メモ", "FastAPIとは関係ない", "2026-01-02")
+    memory.add_session_message("user", "SQLiteの全文検索を使いたい")
+    memory.add_session_message("assistant", "FTS5が使えます", "Gemini")
+
+    assert [t["thread_id"] for t in memory.search_threads("FastAPI")] == ["t1", "t2"]
+    assert [h["role"] for h in memory.search_session_history("全文検索")] == ["user"]
+
+    memory.clear_session()
+    assert memory.search_session_history("全文検索") == []
+
+
+def test_existing_rows_are_indexed_on_upgrade(tmp_path):
+    db_path = tmp_path / "old.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("""CREATE TABLE anchors (id INTEGER PRIMARY KEY AUTOINCREMENT, anchor_id TEXT UNIQUE,
+                    keywords TEXT, content TEXT, thread_id TEXT, created_at TEXT)""")
+    conn.execute("INSERT INTO anchors (anchor_id, keywords, content) VALUES ('old', '既存アンカー', '移行前')")
+    conn.commit()
+    conn.close()
+
+    memory = ConversationMemory(db_path=db_path)
+    assert [r["anchor_id"] for r in memory.search_anchors("既存アンカー")] == ["old"]
+
+
+def test_connection_uses_wal(memory):
+    assert memory.db.fetchone("PRAGMA journal_mode")[0] == "wal"
+
+
+def test_write_behind_batches_and_reads_own_writes(tmp_path):
+    memory = ConversationMemory(db_path=tmp_path / "wb.db", write_behind=True, flush_interval=60)
+    for i in range(5):
+        memory.add_session_message("user", f"メッセージ{i}")
+    assert memory.db.fetchone("SELECT COUNT(*) FROM session_history")[0] == 0
+
+    history = memory.get_session_history()
+    assert [h["content"] for h in history] == [f"メッセージ{i}" for i in range(5)]
+    assert all(h["timestamp"] for h in history)
+
+    memory.add_session_message("assistant", "未書き込み", "Gemini")
+    memory.close()
+    assert memory.db.fetchone("SELECT COUNT(*) FROM session_history")[0] == 6
+
+
+def test_clear_session_drops_pending_messages(tmp_path):
+    memory = ConversationMemory(db_path=tmp_path / "wb.db", write_behind=True, flush_interval=60)
+    memory.add_session_message("user", "消える")
+    memory.clear_session()
+    assert memory.get_session_history() == []
+
+
+def test_get_recent_by_agent_returns_last_n_per_agent_oldest_first(memory):
+    for i in range(30):
+        memory.add_session_message("assistant", f"監査{i}", "auditor")
+        memory.add_session_message("assistant", f"コード{i}", "coder")
+    memory.add_session_message("user", "質問")
+
+    recent = memory.get_recent_by_agent(["auditor", "coder", "Gemini"], 3)
+    assert [m["content"] for m in recent["auditor"]] == ["監査27", "監査28", "監査29"]
+    assert [m["content"] for m in recent["coder"]] == ["コード27", "コード28", "コード29"]
+    assert recent["Gemini"] == []
+
+    plan = memory.db.fetchall(
+        "EXPLAIN QUERY PLAN SELECT id FROM session_history WHERE ai_type = ? ORDER BY id DESC LIMIT 3",
+        ("auditor",))
+    assert "idx_session_agent" in str(plan)
+
+
+def test_cross_references_are_collected_on_insert(memory):
+    memory.add_session_message("assistant", "特に指摘なし", "auditor")
+    memory.add_session_message("assistant", "セキュリティのリスクがあります", "auditor")
+    memory.add_session_message("assistant", "```python\nprint(1)\n```", "coder")
+    memory.add_session_message("assistant", "call_coder を実行", "Gemini")
+    memory.add_session_message("assistant", "callback の説明", "Gemini")
+
+    refs = memory.get_cross_references()
+    assert [r["summary"] for r in refs["auditor_warnings"]] == ["セキュリティのリスクがあります..."]
+    assert [r["summary"] for r in refs["coder_implementations"]] == ["コード実装実施"]
+    assert [r["summary"] for r in refs["gemini_decisions"]] == ["部下に指示を出した"]
+    assert refs["data_summaries"] == []
+
+    memory.clear_session()
+    assert all(not items for items in memory.get_cross_references().values())
+
+
+def test_cross_references_backfill_existing_history(tmp_path):
+    db_path = tmp_path / "old.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("""CREATE TABLE session_history (id INTEGER PRIMARY KEY AUTOINCREMENT, role TEXT,
+                    content TEXT, ai_type TEXT, timestamp TEXT DEFAULT CURRENT_TIMESTAMP)""")
+    conn.execute("INSERT INTO session_history (role, content, ai_type) VALUES ('assistant', '要約です', 'data_processor')")
+    conn.commit()
+    conn.close()
+
+    memory = ConversationMemory(db_path=db_path)
+    assert [r["summary"] for r in memory.get_cross_references()["data_summaries"]] == ["要約です..."]
@@ -0,0 +1,94 @@
+# test_crosscheck.py
+# クロスチェック（並列採点・クォーラム打ち切り）のテスト
+# 行数: 94行
+
+import time
+
+import core.crosscheck as crosscheck
+
+
+class _FakeChecker:
+    def __init__(self, model_name, delay, total):
+        self.model_name = model_name
+        self.delay = delay
+        self.total = total
+
+
+def _fake_invoke(model, messages):
+    time.sleep(model.delay)
+    if model.total is None:
+        raise RuntimeError("rate limited")
+    return f"正確性: 20/25点\n合計: {model.total}/100点\n\n改善提案:\n- なし"
+
+
+def _patch_checkers(monkeypatch, specs):
+    for getter, (delay, total) in zip(
+        ["get_commander", "get_auditor", "get_coder", "get_searcher", "get_data_processor"], specs
+    ):
+        checker = _FakeChecker(getter, delay, total)
+        monkeypatch.setattr(crosscheck, getter, lambda checker=checker: checker)
+    monkeypatch.setattr(crosscheck, "cached_invoke", _fake_invoke)
+
+
+def test_checkers_run_concurrently(monkeypatch):
+    _patch_checkers(monkeypatch, [(0.2, 80)] * 4 + [(0.2, None)])
+    start = time.perf_counter()
+    result = crosscheck.cross_check("coder", "print(1)", "1を表示")
+    assert time.perf_counter() - start < 0.6
+    statuses = [c["status"] for c in result["checks"]]
+    assert statuses == ["ok", "ok", "ok", "ok", "error"]
+    assert result["stragglers"] == []
+
+
+def test_quorum_stops_and_marks_stragglers(monkeypatch):
+    _patch_checkers(monkeypatch, [(0.05, 80), (0.1, 30), (0.1, 85), (0.15, 78), (1.0, 90)])
+    start = time.perf_counter()
+    result = crosscheck.cross_check("coder", "print(1)", "1を表示", mode="quorum", quorum=3, tolerance=10)
+    assert time.perf_counter() - start < 0.6
+    last = result["checks"][-1]
+    assert last["status"] == "cancelled"
+    assert result["stragglers"] == [last["checker"]]
+    assert result["total_checkers"] == 4
+
+
+def test_timeout_marks_slow_checkers(monkeypatch):
+    _patch_checkers(monkeypatch, [(0.05, 80)] * 4 + [(1.0, 80)])
+    result = crosscheck.cross_check("coder", "print(1)", "1を表示", timeout=0.3)
+    assert result["checks"][-1]["status"] == "timeout"
+    assert len(result["stragglers"]) == 1
+
+
+def test_aggregate_scores_locally():
+    from core.scoring import aggregate_scores, format_aggregate_summary, parse_crosscheck_scores
+
+    parsed = parse_crosscheck_scores("正確性: 20/25点\n妥当性: 22/25点\nセキュリティ: 15/25点\nパフォーマンス: 18/25点")
+    assert parsed["criteria"]["セキュリティ"] == 15
+    assert parsed["total"] == 75  # 合計行がなければ観点の和
+
+    checks = [
+        {"checker": "A", "evaluation": "正確性: 20/25点\nセキュリティ: 10/25点\n合計: 80/100点"},
+        {"checker": "B", "evaluation": "正確性: 24/25点\nセキュリティ: 20/25点\n合計: 90/100点"},
+        {"checker": "C", "evaluation": "⏱️ 未完了", "status": "timeout"},
+    ]
+    aggregate = aggregate_scores(checks)
+    assert aggregate["total"]["mean"] == 85
+    assert aggregate["total"]["variance"] == 25
+    assert aggregate["criteria"]["セキュリティ"]["mean"] == 15
+    assert not aggregate["disagreement"]
+    assert [c["checker"] for c in aggregate["per_checker"]] == ["A", "B"]
+
+    summary = format_aggregate_summary(aggregate)
+    assert "85.0/100点" in summary
+    assert "最も評価が低い観点: セキュリティ" in summary
+
+
+def test_summary_does_not_call_llm(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("LLMを呼んではいけない")
+    monkeypatch.setattr(crosscheck, "cached_invoke", fail)
+    summary = crosscheck.generate_crosscheck_summary([
+        {"checker": "A", "evaluation": "合計: 60/100点"},
+        {"checker": "B", "evaluation": "合計: 100/100点"},
+    ])
+    assert "総合得点: 80.0/100点" in summary
+    assert "評価が大きく割れています" in summary
@@ -0,0 +1,111 @@
+# test_diff_patch.py
+# 差分ベース修正（unified diff の抽出・適用・検証）のテスト
+# 行数: 111行
+
+import pytest
+
+from utils.diff_patch import PatchError, apply_unified_diff, changed_hunks, extract_diff, validate_patch
+
+ORIGINAL = """def add(a, b):
+    return a - b
+
+
+def mul(a, b):
+    return a * b
+"""
+
+
+def test_apply_fenced_diff_with_wrong_line_numbers():
+    """行番号がずれていてもコンテキストで位置を特定して適用"""
+    reply = """修正しました。
+
+```diff
+--- a/calc.py
++++ b/calc.py
+@@ -10,2 +10,2 @@
+ def add(a, b):
+-    return a - b
++    return a + b
+```"""
+    patched = apply_unified_diff(ORIGINAL, extract_diff(reply))
+    assert "return a + b" in patched
+    assert "return a * b" in patched
+    validate_patch(ORIGINAL, patched)
+
+
+def test_multiple_hunks_keep_offsets():
+    diff = """@@ -1,2 +1,3 @@
+ def add(a, b):
++    # 加算
+     return a - b
+@@ -5,2 +6,2 @@
+ def mul(a, b):
+-    return a * b
++    return b * a
+"""
+    patched = apply_unified_diff(ORIGINAL, diff)
+    assert patched.splitlines()[1] == "    # 加算"
+    assert patched.splitlines()[-1] == "    return b * a"
+
+
+def test_hunk_lines_that_look_like_file_headers_are_applied():
+    """ハンク内の "-- " で始まる削除行・"++ " で始まる追加行をファイルヘッダと取り違えない"""
+    added = apply_unified_diff("a = 1\nb = 2\n", """--- a/x.py
++++ b/x.py
+@@ -1,2 +1,3 @@
+ a = 1
++++ counter
+ b = 2
+""")
+    assert added == "a = 1\n++ counter\nb = 2\n"
+
+    removed = apply_unified_diff("-- old comment\nSELECT 1;\n", """--- a/q.sql
++++ b/q.sql
+@@ -1,2 +1,1 @@
+--- old comment
+ SELECT 1;
+""")
+    assert removed == "SELECT 1;\n"
+
+
+def test_file_headers_between_hunks_are_skipped():
+    diff = """--- a/a.py
++++ b/a.py
+@@ -1,1 +1,1 @@
+-a = 1
++a = 2
+--- a/a.py
++++ b/a.py
+@@ -3,1 +3,1 @@
+-c = 3
++c = 4
+"""
+    assert apply_unified_diff("a = 1\nb = 2\nc = 3\n", diff) == "a = 2\nb = 2\nc = 4\n"
+
+
+def test_mismatched_hunk_raises():
+    diff = """@@ -1,1 +1,1 @@
+-def sub(a, b):
++def subtract(a, b):
+"""
+    with pytest.raises(PatchError):
+        apply_unified_diff(ORIGINAL, diff)
+
+
+def test_validate_rejects_noop_and_broken_python():
+    with pytest.raises(PatchError):
+        validate_patch(ORIGINAL, ORIGINAL)
+    with pytest.raises(PatchError):
+        validate_patch(ORIGINAL, ORIGINAL.replace("return a * b", "return a *"))
+
+
+def test_extract_diff_without_hunks_raises():
+    with pytest.raises(PatchError):
+        extract_diff("修正版のコードは以下です。")
+
+
+def test_changed_hunks_contain_only_context():
+    patched = ORIGINAL.replace("a - b", "a + b")
+    hunks = changed_hunks(ORIGINAL, patched, context=1)
+    assert "+    return a + b" in hunks
+    assert "mul" not in hunks
@@ -0,0 +1,283 @@
+"""
+failure_tracker.py のバッファ書き込みテスト
+"""
+
+import threading
+import time
+
+import pytest
+
+from failure_tracker import FailureTracker
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    tracker = FailureTracker(db_path=tmp_path / "failures.db", flush_interval=60, batch_size=100)
+    yield tracker
+    tracker.close()
+
+
+def _count(tracker, table="agent_executions"):
+    with tracker.lock:
+        return tracker.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_records_are_buffered_until_flush(tracker):
+    tracker.record_execution("e1", "監査チーム", "auditor", "タスク", "success")
+    assert _count(tracker) == 0
+    assert tracker.flush() == 1
+    assert _count(tracker) == 1
+
+
+def test_insert_and_update_apply_in_order(tracker):
+    tracker.record_execution("e1", "コーディングチーム", "coder", "タスク", "running")
+    tracker.update_execution("e1", status="failed", error_message="timeout")
+    tracker.categorize_failure("e1", "timeout", "high")
+    tracker.flush()
+
+    assert tracker.get_failure_rate(24)["failed_executions"] == 1
+    assert _count(tracker, "failure_categories") == 1
+
+
+def test_duplicate_does_not_drop_the_batch(tracker):
+    tracker.record_execution("dup", "a", "coder", "t", "success")
+    tracker.record_execution("dup", "a", "coder", "t", "success")
+    tracker.record_execution("e2", "a", "coder", "t", "failed")
+    assert tracker.flush() == 2
+    assert tracker.get_failure_rate(24)["total_executions"] == 2
+
+
+def test_batch_size_triggers_background_flush(tmp_path):
+    tracker = FailureTracker(db_path=tmp_path / "failures.db", flush_interval=60, batch_size=3)
+    for i in range(3):
+        tracker.record_execution(f"e{i}", "a", "coder", "t", "success")
+    deadline = time.time() + 5
+    while _count(tracker) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert _count(tracker) == 3
+    tracker.close()
+
+
+def test_concurrent_recording_is_safe(tracker):
+    def worker(n):
+        for i in range(50):
+            tracker.record_execution(f"w{n}-{i}", "a", "coder", "t", "success")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    tracker.flush()
+    assert _count(tracker) == 200
+
+
+def test_schema_is_created_once_per_process(tmp_path, capsys):
+    FailureTracker(db_path=tmp_path / "once.db").close()
+    FailureTracker(db_path=tmp_path / "once.db").close()
+    assert capsys.readouterr().out.count("初期化完了") == 1
+
+
+def test_close_flushes_pending_records(tmp_path):
+    db_path = tmp_path / "failures.db"
+    tracker = FailureTracker(db_path=db_path, flush_interval=60)
+    tracker.record_execution("e1", "a", "coder", "t", "success")
+    tracker.close()
+
+    reopened = FailureTracker(db_path=db_path)
+    assert reopened.get_failure_rate(24)["total_executions"] == 1
+    reopened.close()
+
+
+def _rollup(tracker, table="execution_rollup_daily"):
+    with tracker.lock:
+        return [dict(row) for row in tracker.conn.execute(
+            f"SELECT * FROM {table} ORDER BY agent_name, role")]
+
+
+def test_rollups_follow_inserts_updates_and_deletes(tracker):
+    tracker.record_execution("e1", "コーディングチーム", "coder", "t", "success", token_used=100, cost_usd=0.5)
+    tracker.record_execution("e2", "コーディングチーム", "coder", "t", "running", token_used=50)
+    tracker.update_execution("e2", status="failed", recovery_attempted=True)
+    tracker.record_execution("e3", "検索チーム", "searcher", "t", "failed")
+    tracker.flush()
+
+    hourly = _rollup(tracker, "execution_rollup_hourly")
+    daily = _rollup(tracker)
+    for rows in (hourly, daily):
+        assert [(r["agent_name"], r["total"], r["failed"]) for r in rows] == [("コーディングチーム", 2, 1), ("検索チーム", 1, 1)]
+        coder = rows[0]
+        assert (coder["success"], coder["recovery_attempts"], coder["tokens"], coder["cost"]) == (1, 1, 150, 0.5)
+
+    with tracker.lock:
+        tracker.conn.execute("DELETE FROM agent_executions WHERE execution_id = 'e1'")
+        tracker.conn.commit()
+    assert _rollup(tracker)[0]["total"] == 1
+
+    stats = tracker.get_failure_rate(24)
+    assert (stats["total_executions"], stats["failed_executions"], stats["recovery_attempts"]) == (2, 2, 1)
+
+
+def test_rollups_backfill_existing_executions(tmp_path):
+    import sqlite3
+    db_path = tmp_path / "old.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("""CREATE TABLE agent_executions (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    execution_id TEXT UNIQUE NOT NULL, agent_name TEXT NOT NULL, role TEXT NOT NULL,
+                    task_description TEXT, started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    completed_at DATETIME, status TEXT NOT NULL, error_message TEXT, error_type TEXT,
+                    recovery_attempted BOOLEAN DEFAULT 0, recovery_successful BOOLEAN DEFAULT 0,
+                    token_used INTEGER, cost_usd REAL, user_visible BOOLEAN DEFAULT 1)""")
+    conn.executemany("INSERT INTO agent_executions (execution_id, agent_name, role, status) VALUES (?, 'a', 'coder', ?)",
+                     [("old1", "success"), ("old2", "failed")])
+    conn.commit()
+    conn.close()
+
+    tracker = FailureTracker(db_path=db_path)
+    assert tracker.get_failure_rate(24)["failure_rate"] == 50.0
+    tracker.close()
+
+
+def test_analyzer_reads_rollups(tracker):
+    from failure_analyzer import FailureAnalyzer
+    for i, status in enumerate(["success", "failed", "failed"]):
+        tracker.record_execution(f"e{i}", "検索チーム", "searcher", "t", status, token_used=30)
+    tracker.flush()
+    analyzer = FailureAnalyzer(tracker)
+
+    performance = analyzer.get_agent_performance()
+    assert performance == [{
+        "agent_name": "検索チーム", "role": "searcher", "total_tasks": 3, "successful_tasks": 1,
+        "failed_tasks": 2, "success_rate": 33.33, "avg_tokens": 30, "total_cost": 0,
+    }]
+    assert analyzer.analyze_task_type_patterns()[0]["failure_rate"] == 66.67
+    assert analyzer.analyze_time_based_patterns()[0]["failures"] == 2
+
+
+def test_sketch_quantiles_stay_within_relative_error():
+    import math
+    from failure_tracker import LATENCY_RELATIVE_ERROR, latency_bucket, sketch_quantiles
+    durations = list(range(1, 10001))
+    buckets = {}
+    for d in durations:
+        buckets[latency_bucket(d)] = buckets.get(latency_bucket(d), 0) + 1
+    estimates = sketch_quantiles(sorted(buckets.items()))
+    for q, estimate in estimates.items():
+        exact = durations[math.ceil(q * len(durations)) - 1]
+        assert abs(estimate - exact) / exact <= LATENCY_RELATIVE_ERROR + 1e-9
+
+
+def test_start_and_finish_record_duration_and_percentiles(tracker, monkeypatch):
+    import failure_tracker
+    from failure_analyzer import FailureAnalyzer
+    clock = iter([0.0, 0.2, 10.0, 10.4, 20.0, 21.0])
+    monkeypatch.setattr(failure_tracker.time, "perf_counter", lambda: next(clock))
+
+    for i, status in enumerate(["success", "success", "failed"]):
+        tracker.start_execution(f"e{i}", "コーディングチーム", "coder", "t")
+        tracker.finish_execution(f"e{i}", status=status)
+    assert tracker.finish_execution("unknown", status="success") is None
+    tracker.flush()
+
+    with tracker.lock:
+        rows = tracker.conn.execute(
+            "SELECT status, duration_ms, completed_at FROM agent_executions ORDER BY execution_id").fetchall()
+    assert [(r["status"], round(r["duration_ms"])) for r in rows] == [("success", 200), ("success", 400), ("failed", 1000)]
+    assert all(r["completed_at"] for r in rows)
+    assert tracker.get_failure_rate(24)["failure_rate"] == 33.33
+
+    [latency] = FailureAnalyzer(tracker).get_latency_percentiles()
+    assert (latency["agent_name"], latency["role"], latency["count"]) == ("コーディングチーム", "coder", 3)
+    assert latency["p50_ms"] == pytest.approx(400, rel=0.01)
+    assert latency["p99_ms"] == pytest.approx(1000, rel=0.01)
+
+
+def test_finish_execution_records_usage_in_rollups(tracker):
+    from failure_analyzer import FailureAnalyzer
+    tracker.start_execution("e1", "監査チーム", "auditor", "t")
+    tracker.finish_execution("e1", status="success", token_used=1200, cost_usd=0.0123)
+    tracker.start_execution("e2", "監査チーム", "auditor", "t")
+    tracker.finish_execution("e2", status="failed", token_used=800, cost_usd=0.0077)
+    tracker.flush()
+
+    [performance] = FailureAnalyzer(tracker).get_agent_performance()
+    assert (performance["avg_tokens"], performance["total_cost"]) == (1000, 0.02)
+
+
+def test_finish_execution_records_only_once(tracker):
+    tracker.start_execution("e1", "コーディングチーム", "coder", "t")
+    assert tracker.finish_execution("e1", status="success") is not None
+    assert tracker.finish_execution("e1", status="failed", error_message="後続処理の失敗") is None
+    tracker.flush()
+
+    with tracker.lock:
+        row = tracker.conn.execute("SELECT status, error_message FROM agent_executions").fetchone()
+        sketched = tracker.conn.execute("SELECT SUM(count) FROM latency_sketch").fetchone()[0]
+    assert (row["status"], row["error_message"], sketched) == ("success", None, 1)
+    assert tracker.get_failure_rate(24)["failed_executions"] == 0
+
+
+def test_running_executions_do_not_change_failure_rate(tracker):
+    tracker.start_execution("e1", "監査チーム", "auditor", "t")
+    tracker.finish_execution("e1", status="failed")
+    tracker.start_execution("e2", "監査チーム", "auditor", "t")
+    tracker.flush()
+
+    stats = tracker.get_failure_rate(24)
+    assert (stats["total_executions"], stats["failure_rate"]) == (1, 100.0)
+    assert _rollup(tracker)[0]["total"] == 1
+
+    tracker.finish_execution("e2", status="success")
+    tracker.flush()
+    assert tracker.get_failure_rate(24)["failure_rate"] == 50.0
+
+
+def test_outdated_rollup_triggers_are_rebuilt(tmp_path):
+    import failure_tracker
+    db_path = tmp_path / "old.db"
+    tracker = FailureTracker(db_path=db_path)
+    with tracker.lock:
+        for table, _ in failure_tracker.ROLLUPS:
+            tracker.conn.execute(f"DROP TRIGGER {table}_ai")
+            tracker.conn.execute(f"""CREATE TRIGGER {table}_ai AFTER INSERT ON agent_executions BEGIN
+                INSERT INTO {table} (bucket, agent_name, role, total) VALUES ('x', new.agent_name, new.role, 1)
+                ON CONFLICT(bucket, agent_name, role) DO UPDATE SET total = total + 1; END""")
+        tracker.conn.commit()
+    tracker.record_execution("e1", "監査チーム", "auditor", "t", "running")
+    tracker.record_execution("e2", "監査チーム", "auditor", "t", "failed")
+    tracker.close()
+
+    failure_tracker._initialized_paths.discard(str(db_path))
+    tracker = FailureTracker(db_path=db_path)
+    stats = tracker.get_failure_rate(24)
+    assert (stats["total_executions"], stats["failed_executions"]) == (1, 1)
+    tracker.close()
+
+
+def test_analyzer_windows_cover_exactly_seven_days(tracker):
+    from failure_analyzer import FailureAnalyzer
+    from failure_tracker import latency_bucket
+    # 7日前（8日目）のバケットは含めず、6日前（7日目）までを含める
+    with tracker.lock:
+        for offset, agent in (("-6 days", "範囲内"), ("-7 days", "範囲外")):
+            tracker.conn.execute('''
+                INSERT INTO execution_rollup_daily (bucket, agent_name, role, total, failed)
+                VALUES (date('now', ?), ?, 'r', 1, 1)
+            ''', (offset, agent))
+            tracker.conn.execute('''
+                INSERT INTO latency_sketch (day, agent_name, role, bucket, count)
+                VALUES (date('now', ?), ?, 'r', ?, 1)
+            ''', (offset, agent, latency_bucket(100)))
+        for offset, failed in (("-167 hours", 1), ("-168 hours", 5)):
+            tracker.conn.execute('''
+                INSERT INTO execution_rollup_hourly (bucket, agent_name, role, total, failed)
+                VALUES (strftime('%Y-%m-%d %H:00:00', 'now', ?), 'a', 'r', ?, ?)
+            ''', (offset, failed, failed))
+        tracker.conn.commit()
+    analyzer = FailureAnalyzer(tracker)
+
+    assert [p["agent_name"] for p in analyzer.get_agent_performance()] == ["範囲内"]
+    assert analyzer.analyze_task_type_patterns()[0]["failures"] == 1
+    assert analyzer.analyze_time_based_patterns()[0]["failures"] == 1
+    assert [p["agent_name"] for p in analyzer.get_latency_percentiles()] == ["範囲内"]
+    assert [p["agent_name"] for p in analyzer.get_latency_percentiles(days=1)] == []
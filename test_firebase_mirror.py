@@ -0,0 +1,256 @@
+"""
+firebase_history_manager.py のローカルミラー・差分同期テスト
+（Realtime Database の参照 API をメモリ上の代替で再現）
+"""
+
+import time
+
+import pytest
+
+from firebase_history_manager import FirebaseHistoryManager, SessionWriteQueue
+from session_mirror import SessionMirror
+
+
+class FakeQuery:
+    def __init__(self, ref, start=None, end=None, last=None):
+        self.ref = ref
+        self.start = start
+        self.end = end
+        self.last = last
+
+    def start_at(self, value):
+        return FakeQuery(self.ref, value, self.end, self.last)
+
+    def end_at(self, value):
+        return FakeQuery(self.ref, self.start, value, self.last)
+
+    def limit_to_last(self, n):
+        return FakeQuery(self.ref, self.start, self.end, n)
+
+    def get(self):
+        items = sorted(self.ref.data.items(), key=lambda kv: kv[1].get("timestamp", ""))
+        if self.start is not None:
+            items = [kv for kv in items if kv[1].get("timestamp", "") >= self.start]
+        if self.end is not None:
+            items = [kv for kv in items if kv[1].get("timestamp", "") <= self.end]
+        if self.last is not None:
+            items = items[-self.last:]
+        self.ref.fetched += len(items)
+        return {key: dict(value) for key, value in items}
+
+
+class FakeChild:
+    def __init__(self, ref, key):
+        self.ref = ref
+        self.key = key
+
+    def set(self, value):
+        self.ref.data[self.key] = dict(value)
+
+    def delete(self):
+        self.ref.data.pop(self.key, None)
+
+
+class FakeReference:
+    """firebase_admin.db.Reference の代替（使う API だけ）"""
+
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+        self.fetched = 0
+        self.updates = 0
+        self.offline = False
+
+    def child(self, key):
+        return FakeChild(self, key)
+
+    def update(self, values):
+        if self.offline:
+            raise ConnectionError("offline")
+        self.updates += 1
+        for key, value in values.items():
+            self.data[key] = dict(value)
+
+    def order_by_child(self, key):
+        assert key == "timestamp"
+        return FakeQuery(self)
+
+    def get(self):
+        self.fetched += len(self.data)
+        return dict(self.data)
+
+
+def _session(i, text="雑談"):
+    return f"session_{i}", {"userInput": f"{text}{i}", "geminiResponse": "了解",
+                            "timestamp": f"2026-01-01T00:00:{i:02d}"}
+
+
+@pytest.fixture
+def ref():
+    return FakeReference(dict(_session(i) for i in range(5)))
+
+
+@pytest.fixture
+def manager(ref, tmp_path):
+    return FirebaseHistoryManager("", "", "user1", sessions_ref=ref,
+                                  mirror=SessionMirror(tmp_path / "mirror.db"), sync_interval=0)
+
+
+def test_recent_sessions_are_served_from_mirror(manager, ref):
+    recent = manager.get_recent_sessions(3)
+    assert [s["sessionId"] for s in recent] == ["session_4", "session_3", "session_2"]
+    assert manager.count_sessions() == 5
+    assert manager.mirror.get_cursor("user1") == "2026-01-01T00:00:04"
+
+
+def test_sync_fetches_only_records_after_cursor(manager, ref):
+    manager.sync()
+    ref.fetched = 0
+    key, value = _session(9, "新着")
+    ref.data[key] = value
+
+    assert manager.sync() == 2  # カーソル位置の1件 + 新着1件
+    assert ref.fetched == 2
+    assert manager.get_all_sessions()[0]["userInput"] == "新着9"
+
+
+def test_sync_interval_skips_remote_reads(ref, tmp_path):
+    manager = FirebaseHistoryManager("", "", "user1", sessions_ref=ref,
+                                     mirror=SessionMirror(tmp_path / "mirror.db"), sync_interval=60)
+    manager.get_recent_sessions()
+    ref.fetched = 0
+    manager.get_all_sessions()
+    assert ref.fetched == 0
+
+
+def test_save_session_is_visible_locally_before_sync(manager, ref):
+    manager.sync()
+    manager.sync_interval = 60
+    session_id = manager.save_session({"userInput": "保存テスト", "geminiResponse": "OK"})
+
+    assert session_id in ref.data
+    assert manager.get_recent_sessions(1)[0]["sessionId"] == session_id
+
+
+def test_sync_error_falls_back_to_mirror(manager, ref):
+    manager.sync()
+
+    def broken(key):
+        raise ConnectionError("offline")
+    ref.order_by_child = broken
+    assert manager.sync() == 0
+    assert len(manager.get_recent_sessions(10)) == 5
+
+
+def test_clear_old_sessions_removes_from_remote_and_mirror(manager, ref):
+    manager.sync()
+    old_key, old = _session(1)
+    old["timestamp"] = "2000-01-01T00:00:00"
+    ref.data[old_key] = old
+    manager.mirror.upsert_sessions("user1", {old_key: old})
+
+    manager.clear_old_sessions(keep_days=30)
+    assert old_key not in ref.data
+    assert old_key not in [s["sessionId"] for s in manager.get_all_sessions()]
+
+
+def test_search_sessions_ranks_and_covers_nested_calls(manager, ref):
+    ref.data["session_20"] = {"userInput": "Firestoreの設計", "geminiResponse": "了解",
+                              "timestamp": "2026-01-01T00:00:20"}
+    ref.data["session_21"] = {"userInput": "雑談", "geminiResponse": "了解",
+                              "coderCalls": [{"input": "実装して", "output": "Firestoreのクライアント"}],
+                              "timestamp": "2026-01-01T00:00:21"}
+
+    results = manager.search_sessions("Firestore")
+    assert [s["sessionId"] for s in results] == ["session_20", "session_21"]
+    assert manager.search_sessions("firestore", limit=1)[0]["sessionId"] == "session_20"
+    assert manager.search_sessions("存在しない語") == []
+
+
+def test_search_index_follows_updates_and_deletes(manager, ref):
+    manager.sync()
+    key, value = _session(3)
+    manager.mirror.upsert_sessions("user1", {key: {**value, "userInput": "書き換えた入力"}})
+    assert [s["sessionId"] for s in manager.search_sessions("書き換えた")] == [key]
+    assert manager.search_sessions("雑談3") == []
+
+    manager.mirror.delete_before("user1", "2100-01-01")
+    assert manager.search_sessions("書き換えた") == []
+
+
+def test_existing_mirror_rows_are_indexed_on_upgrade(tmp_path):
+    import json
+    import sqlite3
+    db_path = tmp_path / "old.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("""CREATE TABLE sessions (user_id TEXT NOT NULL, session_id TEXT NOT NULL, timestamp TEXT,
+                    data TEXT NOT NULL, PRIMARY KEY (user_id, session_id))""")
+    conn.execute("INSERT INTO sessions VALUES ('u', 's1', '2026', ?)",
+                 (json.dumps({"userInput": "移行前のセッション", "sessionId": "s1"}),))
+    conn.commit()
+    conn.close()
+
+    assert [s["sessionId"] for s in SessionMirror(db_path).search("u", "移行前")] == ["s1"]
+
+
+def test_write_behind_batches_sessions_into_one_update(ref, tmp_path):
+    manager = FirebaseHistoryManager("", "", "user1", sessions_ref=ref, sync_interval=60,
+                                     mirror=SessionMirror(tmp_path / "mirror.db"), write_behind=True,
+                                     journal_path=tmp_path / "journal.jsonl")
+    manager.write_queue.flush_interval = 60
+    ids = [manager.save_session({"userInput": f"入力{i}", "geminiResponse": "OK"}) for i in range(3)]
+
+    assert ref.updates == 0
+    assert manager.get_recent_sessions(1)[0]["userInput"] == "入力2"
+    manager.close()
+    assert ref.updates == 1
+    assert len(set(ids)) == 3
+    assert all(i in ref.data for i in ids)
+
+
+def test_write_behind_spills_to_journal_and_replays(ref, tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    queue = SessionWriteQueue(ref, journal, flush_interval=60)
+    ref.offline = True
+    queue.put("s_offline", {"userInput": "オフライン中", "timestamp": "t"})
+
+    assert queue.flush() is False
+    assert journal.exists()
+    assert queue.backoff() == queue.retry_base
+    queue.failures = 10
+    assert queue.backoff() == queue.retry_max
+    queue.close()
+    assert "s_offline" not in ref.data
+
+    # 次回起動時にジャーナルから再送
+    ref.offline = False
+    queue = SessionWriteQueue(ref, journal, flush_interval=60)
+    assert queue.flush() is True
+    queue.close()
+    assert ref.data["s_offline"]["userInput"] == "オフライン中"
+    assert not journal.exists()
+
+
+def test_put_does_not_cut_backoff_short(ref, tmp_path):
+    queue = SessionWriteQueue(ref, tmp_path / "journal.jsonl", flush_interval=60,
+                              batch_size=2, retry_base=60)
+    ref.offline = True
+    queue.put("s0", {"userInput": "0", "timestamp": "t"})
+    assert queue.flush() is False
+
+    # バックオフ中はバッチが溜まっても送信スレッドを起こさない
+    ref.offline = False
+    for i in range(1, 4):
+        queue.put(f"s{i}", {"userInput": str(i), "timestamp": "t"})
+    assert not queue._wakeup.is_set()
+    assert ref.updates == 0
+
+    # バックオフが明ければ次の put で送信される
+    queue._retry_at = 0.0
+    queue.put("s4", {"userInput": "4", "timestamp": "t"})
+    for _ in range(100):
+        if ref.updates:
+            break
+        time.sleep(0.01)
+    queue.close()
+    assert ref.updates == 1
+    assert all(f"s{i}" in ref.data for i in range(5))
@@ -0,0 +1,128 @@
+# test_llm_cache.py
+# LLMレスポンスキャッシュのテスト
+# 行数: 128行
+
+from utils.llm_cache import (
+    MemoryLRUTier,
+    SQLiteTier,
+    ResponseCache,
+    cached_invoke,
+    make_cache_key,
+    make_llm_cache_key,
+)
+
+
+class _Message:
+    def __init__(self, type, content):
+        self.type = type
+        self.content = content
+
+
+class _Response:
+    def __init__(self, content):
+        self.content = content
+
+
+class _FakeLLM:
+    """呼び出し回数を数えるだけのダミーLLM"""
+
+    def __init__(self, temperature=0, model_name="fake-model"):
+        self.temperature = temperature
+        self.model_name = model_name
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return _Response(f"応答{self.calls}")
+
+
+def _make_cache(tmp_path, **kwargs):
+    return ResponseCache(tiers=[MemoryLRUTier(), SQLiteTier(tmp_path / "cache.db")], **kwargs)
+
+
+def test_cache_key_normalization():
+    """前後空白・改行コードの違いは同一キーになる"""
+    a = [_Message("human", "こんにちは\r\n")]
+    b = [_Message("human", "  こんにちは")]
+    c = [_Message("system", "こんにちは")]
+    assert make_cache_key("m", 0, a) == make_cache_key("m", 0, b)
+    assert make_cache_key("m", 0, a) != make_cache_key("m", 0, c)
+    assert make_cache_key("m", 0, a) != make_cache_key("m2", 0, a)
+
+
+def test_cache_key_includes_provider_and_base_url():
+    """同じモデル名でも接続先（プロバイダ・URL）が違えば別キー"""
+    messages = [_Message("human", "タスク")]
+    direct = _FakeLLM()
+    proxied = _FakeLLM()
+    proxied.openai_api_base = "https://proxy.example/v1"
+    assert make_llm_cache_key(direct, messages) != make_llm_cache_key(proxied, messages)
+    assert make_cache_key("m", 0, messages, "openai-chat") != make_cache_key("m", 0, messages, "groq-chat")
+
+
+def test_deterministic_call_hits_cache(tmp_path):
+    """温度0の同一呼び出しは2回目からキャッシュを返す"""
+    cache = _make_cache(tmp_path)
+    llm = _FakeLLM()
+    messages = [_Message("human", "タスク")]
+
+    assert cached_invoke(llm, messages, cache=cache) == "応答1"
+    assert cached_invoke(llm, messages, cache=cache) == "応答1"
+    assert llm.calls == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_bypass_and_nonzero_temperature(tmp_path):
+    """bypass指定・温度0以外はキャッシュしない"""
+    cache = _make_cache(tmp_path)
+    messages = [_Message("human", "タスク")]
+
+    llm = _FakeLLM()
+    cached_invoke(llm, messages, bypass=True, cache=cache)
+    cached_invoke(llm, messages, bypass=True, cache=cache)
+    assert llm.calls == 2
+
+    warm = _FakeLLM(temperature=0.5)
+    cached_invoke(warm, messages, cache=cache)
+    cached_invoke(warm, messages, cache=cache)
+    assert warm.calls == 2
+    assert cache.stats()["bypassed"] == 4
+
+
+def test_sqlite_tier_survives_memory_eviction(tmp_path):
+    """メモリ層から追い出されてもSQLite層から復元・昇格する"""
+    memory = MemoryLRUTier(max_entries=1)
+    cache = ResponseCache(tiers=[memory, SQLiteTier(tmp_path / "cache.db")])
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert memory.get("a") is None
+    assert cache.get("a") == "A"
+    assert memory.get("a") == "A"
+    assert cache.stats()["tier_hits"]["sqlite"] == 1
+
+
+def test_promotion_keeps_remaining_ttl(tmp_path):
+    """SQLite層から昇格したエントリはSQLite側の期限までしか残らない"""
+    memory = MemoryLRUTier()
+    disk = SQLiteTier(tmp_path / "cache.db")
+    cache = ResponseCache(tiers=[memory, disk], ttl=3600)
+    disk.set("a", "A", ttl=60)
+    _, disk_expiry = disk.get_with_expiry("a")
+
+    assert cache.get("a") == "A"
+    _, memory_expiry = memory.get_with_expiry("a")
+    assert memory_expiry <= disk_expiry + 0.01
+
+
+def test_ttl_and_size_cap(tmp_path):
+    """TTL切れは読めず、件数上限を超えた古いエントリは削除される"""
+    disk = SQLiteTier(tmp_path / "cache.db", max_entries=2)
+    disk.set("old", "x", ttl=-1)
+    assert disk.get("old") is None
+
+    for key in ["k1", "k2", "k3"]:
+        disk.set(key, key, ttl=60)
+    disk.prune()
+    assert len(disk) == 2
+    assert disk.get("k3") == "k3"
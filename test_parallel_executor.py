@@ -0,0 +1,116 @@
+# test_parallel_executor.py
+# 並列実行エンジン（先着・クォーラム・ヘッジ）のテスト
+# 行数: 116行
+
+import time
+
+import core.parallel_executor as parallel_executor
+from core.parallel_executor import LatencyTracker, run_race, submit
+
+
+class _FakeAI:
+    def __init__(self, model_name, delay, answer=None, fail=False):
+        self.model_name = model_name
+        self.delay = delay
+        self.answer = answer if answer is not None else model_name
+        self.fail = fail
+
+
+def _call(ai):
+    time.sleep(ai.delay)
+    if ai.fail:
+        raise RuntimeError(f"{ai.model_name} failed")
+    return ai.answer
+
+
+def test_all_mode_measures_wall_time_per_task():
+    """全件待ちでは各タスクの実行時間がそれぞれ計測される"""
+    results = run_race([(_FakeAI("fast", 0.05), _call), (_FakeAI("slow", 0.3), _call)],
+                       tracker=LatencyTracker())
+    times = {r["ai"]: r["time"] for r in results}
+    assert [r["ai"] for r in results] == ["fast", "slow"]
+    assert times["fast"] < 0.2
+    assert times["slow"] >= 0.3
+
+
+def test_first_mode_cancels_losers():
+    """先着1件で打ち切り、残りは cancelled として返る"""
+    start = time.perf_counter()
+    results = run_race([(_FakeAI("fast", 0.05), _call), (_FakeAI("slow", 1.0), _call)],
+                       mode="first", tracker=LatencyTracker())
+    assert time.perf_counter() - start < 0.5
+    assert results[0]["ai"] == "fast" and results[0]["success"]
+    assert results[1]["ai"] == "slow" and results[1]["cancelled"]
+
+
+def test_quorum_mode_stops_on_agreement():
+    """agree_key が一致する2件が揃った時点で終了"""
+    tasks = [
+        (_FakeAI("a", 0.05, answer="80点"), _call),
+        (_FakeAI("b", 0.1, answer="80点"), _call),
+        (_FakeAI("c", 1.0, answer="40点"), _call),
+    ]
+    results = run_race(tasks, mode="quorum", n=2, agree_key=lambda r: r,
+                       tracker=LatencyTracker())
+    finished = [r["ai"] for r in results if r["success"]]
+    assert finished == ["a", "b"]
+    assert results[-1]["cancelled"]
+
+
+def test_hedge_fires_after_delay():
+    """主タスクが hedge_after を超えたら予備タスクを送信し先着を採用"""
+    results = run_race([(_FakeAI("primary", 1.0), _call)], mode="first",
+                       hedge_tasks=[(_FakeAI("backup", 0.05), _call)], hedge_after=0.1,
+                       tracker=LatencyTracker())
+    winner = results[0]
+    assert winner["ai"] == "backup" and winner["hedge"]
+
+
+def test_hedge_fires_when_primary_fails():
+    """主タスクが期限前に失敗した場合も予備タスクを送信"""
+    results = run_race([(_FakeAI("primary", 0.01, fail=True), _call)], mode="first",
+                       hedge_tasks=[(_FakeAI("backup", 0.01), _call)], hedge_after=5,
+                       tracker=LatencyTracker())
+    assert [r["ai"] for r in results] == ["primary", "backup"]
+    assert results[1]["success"]
+
+
+def test_latency_percentile_needs_samples():
+    """サンプル不足のときはパーセンタイルを返さない"""
+    tracker = LatencyTracker()
+    for v in [1.0, 2.0, 3.0, 4.0]:
+        tracker.record("m", v)
+    assert tracker.percentile("m", 0.95) is None
+    tracker.record("m", 5.0)
+    assert tracker.percentile("m", 0.95) == 5.0
+    assert tracker.percentile("m", 0.5) == 3.0
+
+
+def test_quorum_with_tolerance_and_index():
+    """数値が tolerance 以内の n 件で成立し、index で元のタスクを特定できる"""
+    tasks = [
+        (_FakeAI("a", 0.05, answer=82), _call),
+        (_FakeAI("b", 0.1, answer=40), _call),
+        (_FakeAI("c", 0.15, answer=88), _call),
+        (_FakeAI("d", 1.0, answer=85), _call),
+    ]
+    results = run_race(tasks, mode="quorum", n=2, agree_key=lambda r: r, tolerance=10,
+                       tracker=LatencyTracker())
+    by_index = {r["index"]: r for r in results}
+    assert [by_index[i]["success"] for i in range(3)] == [True, True, True]
+    assert by_index[3]["cancelled"] and by_index[3]["error"] == "cancelled"
+
+
+def test_nested_race_inside_worker_does_not_starve_pool(monkeypatch):
+    """ワーカー内の入れ子の run_race（投機実行中のヘッジ等）はプールが埋まっていても完了する"""
+    monkeypatch.setattr(parallel_executor, "MAX_WORKERS", 1)
+    monkeypatch.setattr(parallel_executor, "_executors", {})
+
+    def hedged(_ai):
+        return run_race([(_FakeAI("inner", 0.01), _call)], mode="first", timeout=2,
+                        tracker=LatencyTracker())
+
+    outer = submit(run_race, [(_FakeAI("outer", 0), hedged)], timeout=5, tracker=LatencyTracker())
+    [result] = outer.result(timeout=5)
+    [inner] = result["result"]
+    assert inner["ai"] == "inner" and inner["success"]
@@ -0,0 +1,95 @@
+# test_router.py
+# ローカル高速ルーター（ルール・分類器・記録）のテスト
+# 行数: 95行
+
+import threading
+import time
+
+import agents.router as router_module
+from agents.router import LocalRouter, extract_tag
+
+
+def _router(**kwargs):
+    return LocalRouter(db_path=":memory:", **kwargs)
+
+
+def test_rules_route_confident_requests():
+    router = _router()
+    decision = router.route("Pythonでファイルを読み込む関数を書いて")
+    assert decision.tag == "[CODER]" and decision.source == "rule"
+    assert decision.confidence >= 0.8
+    assert decision.commander_response("依頼").startswith("[CODER]\n")
+
+
+def test_low_confidence_falls_back_to_commander():
+    router = _router()
+    assert router.route("こんにちは、元気？") is None
+    # 競合するルール（コード + 最新情報）は確信度が下がる
+    assert router.route("最新のpythonのニュース") is None
+
+
+def test_classifier_learns_from_commander_decisions():
+    router = _router(min_samples=6)
+    for _ in range(3):
+        router.record_commander("請求書の明細を月別に並べ替えて", "[DATA] 明細を整理")
+        router.record_commander("今週の為替の動きを教えて", "[SEARCH] 為替")
+    assert router.train() == 6
+    decision = router.classify("請求書の明細を並べ替えて")
+    assert decision.tag == "[DATA]" and decision.source == "classifier"
+
+
+def test_retrain_runs_in_background_once_per_threshold(monkeypatch):
+    monkeypatch.setattr(router_module, "RETRAIN_EVERY", 10)
+    router = _router()
+    trained = []
+    release = threading.Event()
+
+    def slow_train():
+        release.wait(5)
+        trained.append(threading.current_thread().name)
+        return 0
+
+    monkeypatch.setattr(router, "train", slow_train)
+    threads = [threading.Thread(target=router.record_commander, args=(f"依頼{i}", "[DATA] 整理"))
+               for i in range(25)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 学習中は重ねて起動せず、呼び出し側も待たない
+    assert trained == [] and router._training
+    release.set()
+    for _ in range(50):
+        if not router._training:
+            break
+        time.sleep(0.05)
+    assert len(trained) == 1 and trained[0] != threading.current_thread().name
+    # 学習中に増えた分は次の再学習に持ち越す
+    assert router._new_labels == 15
+
+
+def test_training_uses_recent_window_and_prunes_log(monkeypatch):
+    monkeypatch.setattr(router_module, "TRAINING_WINDOW", 4)
+    monkeypatch.setattr(router_module, "LOG_MAX_ROWS", 6)
+    router = _router()
+    for i in range(8):
+        router.record_commander(f"依頼{i}", "[DATA] 整理")
+    assert router.train() == 4
+    assert router.conn.execute("SELECT MIN(id), COUNT(*) FROM routing_log").fetchone() == (3, 6)
+
+
+def test_decisions_are_logged():
+    router = _router()
+    router.route("このコードを実装して")
+    router.record_commander("やあ", "雑談です")
+    rows = router.conn.execute(
+        "SELECT tag, source, fast_path, local_tag FROM routing_log ORDER BY id"
+    ).fetchall()
+    assert rows == [("[CODER]", "rule", 1, "[CODER]"), ("[SELF]", "commander", 0, None)]
+    assert router.stats()["fast_path"] == 1
+
+
+def test_extract_tag_defaults_to_self():
+    assert extract_tag("[SEARCH] 天気") == "[SEARCH]"
+    assert extract_tag("[SELF] こんにちは") == "[SELF]"
+    assert extract_tag(None) == "[SELF]"
@@ -0,0 +1,59 @@
+# test_routing_cache.py
+# 振り分けキャッシュ（正規化キー・TTL・チーム構成変更による無効化）のテスト
+# 行数: 59行
+
+from agents.routing_cache import RoutingCache
+
+
+def _cache(config, **kwargs):
+    return RoutingCache(db_path=":memory:", config_provider=lambda: config, **kwargs)
+
+
+HISTORY = [{"role": "assistant", "content": "了解です"}, {"role": "user", "content": "このコードをレビューして"}]
+
+
+def test_near_identical_prompts_hit():
+    cache = _cache({"coder": {"leader": "claude"}})
+    cache.set("commander", "このコードをレビューして。", HISTORY, "[AUDITOR] コードレビュー")
+    assert cache.get("commander", "  このコードをレビューして ", HISTORY) == "[AUDITOR] コードレビュー"
+    assert cache.get("commander", "このコードをレビューして！", HISTORY) is not None
+    assert cache.stats()["hits"] == 2
+
+
+def test_code_and_attachments_keep_their_whitespace():
+    cache = _cache({})
+    code = "このコードを直して\n```\nif x:\n    return 1\n```"
+    cache.set("commander", code, [], "[CODER] 修正")
+    assert cache.get("commander", code.replace("直して", "直して  "), []) == "[CODER] 修正"
+    assert cache.get("commander", code.replace("    return", "  return"), []) is None
+
+    attached = "レビューして\n\n【添付ファイル】\n--- a.py ---\n```\nx = 1\n```"
+    cache.set("commander", attached, [], "[AUDITOR] レビュー")
+    assert cache.get("commander", attached.replace("x = 1", "x=1"), []) is None
+    assert cache.get("commander", "レビューして", []) is None
+
+
+def test_history_and_scope_are_part_of_key():
+    cache = _cache({})
+    cache.set("commander", "続けて", HISTORY, "[CODER] 続き")
+    other_history = [{"role": "assistant", "content": "別の話"}, HISTORY[-1]]
+    assert cache.get("commander", "続けて", other_history) is None
+    assert cache.get("concierge", "続けて", HISTORY) is None
+
+
+def test_self_answers_are_not_cached():
+    cache = _cache({})
+    cache.set("commander", "こんにちは", [], "[SELF] こんにちは！")
+    assert cache.get("commander", "こんにちは", []) is None
+
+
+def test_ttl_and_team_config_change_invalidate():
+    config = {"coder": {"leader": "claude"}}
+    cache = _cache(config)
+    cache.set("commander", "関数を書いて", [], "[CODER] 関数")
+    config["coder"]["leader"] = "gpt"
+    assert cache.get("commander", "関数を書いて", []) is None
+
+    expired = _cache({}, ttl=-1)
+    expired.set("commander", "関数を書いて", [], "[CODER] 関数")
+    assert expired.get("commander", "関数を書いて", []) is None
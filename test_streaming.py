@@ -0,0 +1,126 @@
+# test_streaming.py
+# ストリーミング経路（司令塔のタグ先読み・キャッシュ済みストリームの再生・実行結果の記録）のテスト
+# 行数: 126行
+
+import pytest
+
+import agents.commander as commander
+from agents.routing_cache import RoutingCache
+from utils import track_stream
+from utils.llm_cache import MemoryLRUTier, ResponseCache, cached_stream
+from utils.tracing import TraceStore, Tracer
+
+
+class _Chunk:
+    def __init__(self, content):
+        self.content = content
+        self.usage_metadata = None
+
+
+class _StreamLLM:
+    """決められたチャンクを流すダミーLLM（読み出したチャンク数を数える）"""
+
+    temperature = 0
+    model_name = "fake-commander"
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+        self.consumed = 0
+
+    def stream(self, messages):
+        self.calls += 1
+        for text in self.chunks:
+            self.consumed += 1
+            yield _Chunk(text)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ResponseCache(tiers=[MemoryLRUTier()])
+    monkeypatch.setattr("utils.llm_cache._response_cache", cache)
+    monkeypatch.setattr("utils.tracing._tracer", Tracer(store=TraceStore(tmp_path / "traces.db")))
+    return cache
+
+
+@pytest.fixture
+def commander_llm(cache, monkeypatch):
+    routing_cache = RoutingCache(db_path=":memory:", config_provider=lambda: {})
+    monkeypatch.setattr(commander, "get_routing_cache", lambda: routing_cache)
+
+    def install(chunks):
+        llm = _StreamLLM(chunks)
+        monkeypatch.setattr(commander, "get_commander", lambda: llm)
+        return llm
+    return install
+
+
+def test_agent_tag_is_routed_with_full_response(commander_llm):
+    llm = commander_llm(["[COD", "ER] ", "ログ解析の", "スクリプトを書く"])
+    response, stream = commander.stream_commander("ログを解析して", [])
+    assert (response, stream) == ("[CODER] ログ解析のスクリプトを書く", None)
+    assert llm.consumed == 4
+
+
+def test_self_answer_streams_without_tag(commander_llm):
+    llm = commander_llm(["[SELF] ", "こんにちは", "！", "元気です"])
+    response, stream = commander.stream_commander("やあ", [])
+    assert response is None
+    # [SELF] を見た時点で判定し、残りは呼び出し側が読む
+    assert llm.consumed == 1
+    assert list(stream) == ["こんにちは", "！", "元気です"]
+
+
+def test_untagged_answer_is_returned_as_self(commander_llm):
+    commander_llm(["今日は", "晴れです"])
+    response, stream = commander.stream_commander("天気は？", [])
+    assert response is None
+    assert "".join(stream) == "今日は晴れです"
+
+
+def test_tag_after_long_preamble_is_still_routed(commander_llm):
+    preamble = "承知しました。ご依頼の内容を確認したところ、最新の情報が必要になるため担当を決めます。"
+    commander_llm([preamble, "[SEARCH] ", "今日の為替"])
+    response, stream = commander.stream_commander("今日の為替は？", [])
+    assert stream is None
+    assert response == preamble + "[SEARCH] 今日の為替"
+
+
+def test_cached_stream_replays_same_text(cache):
+    llm = _StreamLLM(["一", "二", "三"])
+    first = list(cached_stream(llm, ["同じ依頼"], cache=cache))
+    replay = list(cached_stream(llm, ["同じ依頼"], cache=cache))
+    assert first == ["一", "二", "三"]
+    assert "".join(replay) == "".join(first)
+    assert llm.calls == 1
+
+    # 途中で打ち切ったストリームは保存しない
+    partial = cached_stream(llm, ["別の依頼"], cache=cache)
+    next(partial)
+    partial.close()
+    assert list(cached_stream(llm, ["別の依頼"], cache=cache)) == ["一", "二", "三"]
+    assert llm.calls == 3
+
+
+def _recorder():
+    events = []
+    return events, (lambda: events.append("success"),
+                    lambda e: events.append(f"failure:{type(e).__name__}"),
+                    lambda: events.append("cancel"))
+
+
+def test_track_stream_records_success_failure_and_cancel():
+    events, callbacks = _recorder()
+    assert list(track_stream(iter(["a", "b"]), *callbacks)) == ["a", "b"]
+
+    def broken():
+        yield "a"
+        raise ValueError("接続断")
+
+    with pytest.raises(ValueError):
+        list(track_stream(broken(), *callbacks))
+
+    stopped = track_stream(iter(["a", "b"]), *callbacks)
+    next(stopped)
+    stopped.close()
+    assert events == ["success", "failure:ValueError", "cancel"]
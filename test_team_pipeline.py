@@ -0,0 +1,189 @@
+# test_team_pipeline.py
+# チームパイプライン（作成役 → チェック役 → 長）のテスト
+# 行数: 189行
+
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from agents.base import TeamExecutor
+from core.async_engine import run_sync
+from core.scoring import parse_verdict, verdict_passes
+from utils.llm_cache import MemoryLRUTier, ResponseCache
+
+
+class _FakeTeam(TeamExecutor):
+    """LLMを呼ばずに役割ごとの呼び出しを記録するチーム"""
+
+    def __init__(self, speculative=False, delay=0.0, checker_reply=None):
+        self.team_name = "fake"
+        self.config = {"name": "テストチーム", "leader": "gpt", "creator": "claude", "checker": "grok"}
+        self.use_cache = False
+        self.speculative_checker = speculative
+        self.delay = delay
+        self.checker_reply = checker_reply
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get_team_info(self) -> dict:
+        return {"name": self.config["name"]}
+
+    def _invoke(self, role: str, messages: list) -> str:
+        time.sleep(self.delay)
+        return self._record(role, messages)
+
+    async def _ainvoke(self, role: str, messages: list) -> str:
+        await asyncio.sleep(self.delay)
+        return self._record(role, messages)
+
+    def _record(self, role: str, messages: list) -> str:
+        with self._lock:
+            self.calls.append((role, messages))
+            if role == "checker" and self.checker_reply:
+                return self.checker_reply
+            return f"{role}:{len(self.calls)}"
+
+
+def _pipeline():
+    return dict(
+        creator_messages=[SystemMessage(content="作成役"), HumanMessage(content="課題")],
+        checker_messages=lambda creator_result: [
+            SystemMessage(content="チェック役"),
+            HumanMessage(content=f"課題\n\n{creator_result}"),
+        ],
+        leader_messages=lambda creator_result, checker_result: [
+            HumanMessage(content=f"{creator_result}\n{checker_result}"),
+        ],
+    )
+
+
+def test_sequential_pipeline_calls_each_role_once():
+    team = _FakeTeam()
+    result = team._execute(**_pipeline())
+    assert [role for role, _ in team.calls] == ["creator", "checker", "leader"]
+    assert "preview" not in result["scores"][0]
+
+
+def test_speculative_preview_runs_alongside_creator():
+    """事前分析は作成役と並行実行され、差分評価に引き継がれる"""
+    team = _FakeTeam(speculative=True, delay=0.2)
+    start = time.perf_counter()
+    result = team._execute(**_pipeline())
+    elapsed = time.perf_counter() - start
+
+    roles = [role for role, _ in team.calls]
+    assert sorted(roles[:2]) == ["checker", "creator"]
+    assert roles[2:] == ["checker", "leader"]
+    # 4回の呼び出しのうち2回は並行するため、クリティカルパスは3往復分
+    assert elapsed < 0.75
+
+    preview_messages = next(m for role, m in team.calls[:2] if role == "checker")
+    assert preview_messages[0].content == "チェック役"
+    assert "課題" in preview_messages[-1].content
+
+    delta_messages = team.calls[2][1]
+    assert result["scores"][0]["preview"] in delta_messages[-1].content
+
+
+def test_async_speculative_preview_runs_alongside_creator():
+    """非同期版でも事前分析は作成役と並行し、差分評価に引き継がれる"""
+    team = _FakeTeam(speculative=True, delay=0.2)
+    start = time.perf_counter()
+    result = run_sync(team._aexecute(**_pipeline()))
+    elapsed = time.perf_counter() - start
+
+    roles = [role for role, _ in team.calls]
+    assert sorted(roles[:2]) == ["checker", "creator"]
+    assert roles[2:] == ["checker", "leader"]
+    # 4回の呼び出しのうち2回は並行するため、クリティカルパスは3往復分
+    assert elapsed < 0.75
+    assert result["scores"][0]["preview"] in team.calls[2][1][-1].content
+    assert result["final_result"] == "leader:4"
+
+
+def test_parse_verdict_reads_tags_and_fallback():
+    assert parse_verdict("問題なし\n【採点】95/100\n【判定】OK") == {"score": 95, "approve": True}
+    assert parse_verdict("総合評価: 70点\n【判定】NG") == {"score": 70, "approve": False}
+    assert parse_verdict("特になし") == {"score": None, "approve": None}
+    # 観点別の点数だけでは合計とみなさない
+    assert parse_verdict("正確性: 25点\n妥当性: 20点\n【判定】OK") == {"score": None, "approve": True}
+    assert not verdict_passes({"score": 95, "approve": True}, None)
+    assert not verdict_passes({"score": 85, "approve": True}, 90)
+    assert not verdict_passes({"score": 95, "approve": None}, 90)
+
+
+def test_leader_skipped_when_checker_approves():
+    """承認かつ閾値以上なら作成役の出力をそのまま返し、長は呼ばない"""
+    team = _FakeTeam(checker_reply="良好\n【採点】96/100\n【判定】OK")
+    result = team._execute(**_pipeline(), stream=True)
+    assert [role for role, _ in team.calls] == ["creator", "checker"]
+    assert result["leader_skipped"] is True
+    assert result["final_result"] == "creator:1"
+    assert result["streaming"] is False
+    assert result["verdict"] == {"score": 96, "approve": True}
+    assert result["scores"][0]["score"] == 96
+
+
+def test_async_leader_skipped_when_checker_approves():
+    team = _FakeTeam(checker_reply="良好\n【採点】96/100\n【判定】OK")
+    result = run_sync(team._aexecute(**_pipeline()))
+    assert [role for role, _ in team.calls] == ["creator", "checker"]
+    assert (result["leader_skipped"], result["final_result"]) == (True, "creator:1")
+    assert result["verdict"] == {"score": 96, "approve": True}
+
+
+@pytest.mark.parametrize("checker_reply", ["要修正\n【採点】96/100\n【判定】NG", "いくつか気になる点があります"])
+def test_async_leader_runs_on_failing_or_unparsed_verdict(checker_reply):
+    team = _FakeTeam(checker_reply=checker_reply)
+    result = run_sync(team._aexecute(**_pipeline()))
+    assert [role for role, _ in team.calls] == ["creator", "checker", "leader"]
+    assert (result["leader_skipped"], result["final_result"]) == (False, "leader:3")
+    # チェック役への指示には採点・判定の出力形式が付く
+    assert "【判定】" in team.calls[1][1][-1].content
+
+
+def test_leader_runs_below_threshold():
+    team = _FakeTeam(checker_reply="要修正\n【採点】96/100\n【判定】NG")
+    result = team._execute(**_pipeline())
+    assert [role for role, _ in team.calls] == ["creator", "checker", "leader"]
+    assert result["leader_skipped"] is False
+
+
+class _AsyncAI:
+    def __init__(self, name):
+        self.model_name = name
+        self.temperature = 0
+
+    async def ainvoke(self, messages):
+        return AIMessage(content=f"{self.model_name}:async")
+
+
+class _HedgedTeam(TeamExecutor):
+    """作成役だけ予備AIとの先着勝ちにするチーム"""
+
+    hedge_roles = {"creator": "grok"}
+
+    def __init__(self):
+        self.team_name = "fake"
+        self.config = {"name": "テストチーム", "leader": "gpt", "creator": "perplexity", "checker": "llama"}
+        self.use_cache = False
+        self.creator_ai = _AsyncAI("creator")
+        self.checker_ai = _AsyncAI("checker")
+        self.hedged = []
+
+    def _invoke_hedged(self, role, messages):
+        self.hedged.append((role, threading.current_thread().name))
+        return f"{role}:hedged"
+
+
+def test_async_invoke_applies_hedging(monkeypatch):
+    """非同期実行でもヘッジ対象の役割は予備AIとの先着勝ちを使う（イベントループのスレッド外で）"""
+    monkeypatch.setattr("utils.llm_cache._response_cache", ResponseCache(tiers=[MemoryLRUTier()]))
+    team = _HedgedTeam()
+    assert run_sync(team._ainvoke("creator", [HumanMessage(content="課題")])) == "creator:hedged"
+    assert run_sync(team._ainvoke("checker", [HumanMessage(content="課題")])) == "checker:async"
+    [(role, thread_name)] = team.hedged
+    assert role == "creator" and thread_name != "agent-event-loop"
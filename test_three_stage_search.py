@@ -0,0 +1,128 @@
+"""
+three_stage_search.py の並列実行・段キャッシュのテスト
+"""
+
+import threading
+import time
+
+import pytest
+
+import firebase_history_manager
+from conversation_memory import ConversationMemory
+from firebase_history_manager import FirebaseHistoryManager
+from session_mirror import SessionMirror
+from test_firebase_mirror import FakeReference
+
+# モジュール読み込み時のグローバルインスタンス用（Firebase 認証情報なしで動かす）
+if firebase_history_manager._firebase_manager is None:
+    firebase_history_manager._firebase_manager = FirebaseHistoryManager(
+        "", "", "test", sessions_ref=FakeReference(), mirror=SessionMirror(":memory:"))
+
+from three_stage_search import StageCache, ThreeStageSearch  # noqa: E402
+
+
+@pytest.fixture
+def stores(tmp_path):
+    ref = FakeReference({
+        "session_1": {"userInput": "Rustの所有権", "geminiResponse": "借用の説明",
+                      "timestamp": "2026-01-01T00:00:01"},
+    })
+    firebase = FirebaseHistoryManager("", "", "u", sessions_ref=ref,
+                                      mirror=SessionMirror(tmp_path / "mirror.db"), sync_interval=0)
+    memory = ConversationMemory(db_path=tmp_path / "memory.db")
+    memory.extract_and_save_anchors("t1", '<anchor id="a1" keywords="デプロイ手順">本番へのデプロイ</anchor>')
+    return firebase, memory
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_parallel_and_sequential_agree(stores, parallel):
+    firebase, memory = stores
+    engine = ThreeStageSearch(parallel=parallel, firebase=firebase, memory_store=memory)
+
+    assert engine.search("Rustの所有権")["stage"] == 1
+    result = engine.search("デプロイ手順")
+    assert result["stage"] == 2
+    assert [a["anchor_id"] for a in result["data"]] == ["a1"]
+    assert result["search_info"]["stage2_checked"] == 1
+    assert result["search_info"]["stage3_checked"] == 0
+
+    miss = engine.search("該当なしの語")
+    assert miss["stage"] == 3 and miss["data"] is None
+    assert miss["search_info"]["stage3_checked"] == 1
+
+
+def test_parallel_waits_for_earlier_stage(stores):
+    firebase, memory = stores
+    engine = ThreeStageSearch(parallel=True, firebase=firebase, memory_store=memory)
+    release = threading.Event()
+    started = []
+
+    def slow_stage1(query, cancel):
+        started.append(1)
+        release.wait(5)
+        return [{"sessionId": "slow"}]
+
+    engine._stages[1] = slow_stage1
+    threading.Timer(0.1, release.set).start()
+    result = engine.search("デプロイ手順")
+    assert started == [1]
+    assert result["stage"] == 1
+    assert result["data"] == [{"sessionId": "slow"}]
+
+
+def test_stage3_is_skipped_after_earlier_hit(stores, monkeypatch):
+    """Stage 1 で確定したら、同期中だった Stage 3 は全文検索をせず結果もキャッシュしない"""
+    firebase, memory = stores
+    engine = ThreeStageSearch(parallel=True, firebase=firebase, memory_store=memory)
+    engine._stages[1] = lambda query, cancel: [{"sessionId": "recent"}]
+    searched = []
+    original_sync = firebase.sync
+
+    def slow_sync(force=False):
+        time.sleep(0.2)
+        return original_sync(force)
+
+    monkeypatch.setattr(firebase, "sync", slow_sync)
+    monkeypatch.setattr(firebase.mirror, "search", lambda *args: searched.append(args) or [])
+
+    result = engine.search("Rustの所有権")
+    assert result["stage"] == 1
+    time.sleep(0.4)
+    assert searched == []
+    assert engine.cache.get(3, "Rustの所有権") == (False, None)
+
+
+def test_stage_results_are_cached(stores):
+    firebase, memory = stores
+    engine = ThreeStageSearch(parallel=False, firebase=firebase, memory_store=memory)
+    calls = []
+    original = engine._stages[2]
+    engine._stages[2] = lambda q, cancel: calls.append(q) or original(q, cancel)
+
+    engine.search("デプロイ手順")
+    engine.search("デプロイ手順")
+    assert calls == ["デプロイ手順"]
+    assert engine.cache.hits >= 2
+
+
+def test_stage_cache_expires_and_evicts():
+    cache = StageCache(ttl=0, max_entries=2)
+    cache.set(1, "q", ["x"])
+    assert cache.get(1, "q") == (False, None)
+
+    cache = StageCache(ttl=60, max_entries=2)
+    for query in ("a", "b", "c"):
+        cache.set(1, query, [query])
+    assert cache.get(1, "a") == (False, None)
+    assert cache.get(1, "c") == (True, ["c"])
+
+
+def test_counts_are_maintained_without_recounting(stores):
+    firebase, memory = stores
+    assert memory.count_anchors() == 1
+    memory.extract_and_save_anchors("t2", '<anchor id="a2" keywords="k">v</anchor>')
+    assert memory.count_anchors() == 2
+
+    assert firebase.count_sessions() == 0
+    firebase.sync()
+    assert firebase.count_sessions() == 1
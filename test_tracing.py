@@ -0,0 +1,191 @@
+# test_tracing.py
+# トレース（入れ子スパン・保存・OTLP 書き出し）のテスト
+# 行数: 191行
+
+import json
+import threading
+
+import httpx
+import pytest
+
+import agents.base
+from core.client_pool import ClientPool
+from utils.llm_cache import MemoryLRUTier, ResponseCache, cached_invoke, cached_stream
+from utils.tracing import TraceStore, Tracer, to_otlp
+from utils.usage import estimate_cost, set_model_prices, usage_totals
+
+
+class _Response:
+    def __init__(self, content, usage=None):
+        self.content = content
+        self.usage_metadata = usage
+
+
+class _FakeLLM:
+    """トークン数付きの応答を返すダミーLLM"""
+
+    temperature = 0
+    model_name = "fake-model"
+
+    def invoke(self, messages):
+        return _Response("応答", {"input_tokens": 12, "output_tokens": 5})
+
+    def stream(self, messages):
+        yield _Response("応", {"input_tokens": 12, "output_tokens": 1})
+        yield _Response("答", {"input_tokens": 0, "output_tokens": 1})
+
+
+@pytest.fixture
+def tracer(tmp_path, monkeypatch):
+    tracer = Tracer(store=TraceStore(tmp_path / "traces.db"))
+    monkeypatch.setattr("utils.tracing._tracer", tracer)
+    return tracer
+
+
+def _spans(tracer):
+    [root] = tracer.store.recent_traces(1)
+    return {span['name']: span for span in tracer.store.get_trace(root['trace_id'])}
+
+
+def test_nested_spans_share_trace_and_flush_with_root(tracer):
+    with tracer.span("request") as root:
+        with tracer.span("memory.search", parallel=True):
+            with tracer.span("memory.stage1") as stage:
+                stage.set_attribute("hits", 2)
+        assert tracer.store.recent_traces() == []
+
+    spans = _spans(tracer)
+    assert spans["memory.search"]["parent_id"] == root.span_id
+    assert spans["memory.stage1"]["parent_id"] == spans["memory.search"]["span_id"]
+    assert spans["memory.stage1"]["attributes"] == {"hits": 2}
+    assert {s["trace_id"] for s in spans.values()} == {root.trace_id}
+
+
+def test_exception_marks_span_as_error(tracer):
+    with pytest.raises(ValueError):
+        with tracer.span("request"):
+            raise ValueError("boom")
+    [root] = tracer.store.recent_traces()
+    assert (root["status"], root["error"]) == ("ERROR", "ValueError: boom")
+
+
+def test_wrap_carries_parent_into_threads(tracer):
+    with tracer.span("request") as root:
+        def work():
+            with tracer.span("worker"):
+                pass
+        thread = threading.Thread(target=tracer.wrap(work))
+        thread.start()
+        thread.join()
+    assert _spans(tracer)["worker"]["parent_id"] == root.span_id
+
+
+def test_llm_calls_record_model_tokens_and_cache_hits(tracer):
+    cache = ResponseCache(tiers=[MemoryLRUTier()])
+    with tracer.span("request"):
+        with tracer.span("team.creator"):
+            cached_invoke(_FakeLLM(), ["タスク"], cache=cache)
+        with tracer.span("team.checker"):
+            cached_invoke(_FakeLLM(), ["タスク"], cache=cache)
+        chunks = tracer.trace_stream("team.leader", cached_stream(_FakeLLM(), ["別タスク"], cache=cache))
+    assert "".join(chunks) == "応答"
+
+    spans = _spans(tracer)
+    creator = spans["team.creator"]["attributes"]
+    assert (creator["cache.hit"], creator["llm.model"], creator["llm.tokens_in"], creator["llm.tokens_out"]) == (
+        False, "fake-model", 12, 5)
+    assert spans["team.checker"]["attributes"] == {"cache.hit": True, "llm.model": "fake-model"}
+    leader = spans["team.leader"]["attributes"]
+    assert (leader["llm.tokens_in"], leader["llm.tokens_out"], leader["chunks"]) == (12, 2, 2)
+    assert spans["team.leader"]["parent_id"] == spans["request"]["span_id"]
+
+
+def test_summary_and_otlp_export(tracer):
+    with tracer.span("request"):
+        with tracer.span("team.creator", tokens=3, ratio=0.5, cached=False):
+            pass
+
+    summary = {row["name"]: row for row in tracer.store.summarize()}
+    assert summary["team.creator"]["count"] == 1
+
+    exported = tracer.store.export_otlp(since_hours=1)
+    [resource] = exported["resourceSpans"]
+    assert resource["resource"]["attributes"][0] == {"key": "service.name", "value": {"stringValue": "multi-agent-team"}}
+    spans = {s["name"]: s for s in resource["scopeSpans"][0]["spans"]}
+    creator = spans["team.creator"]
+    assert creator["parentSpanId"] == spans["request"]["spanId"]
+    assert len(creator["traceId"]) == 32 and len(creator["spanId"]) == 16
+    assert int(creator["endTimeUnixNano"]) >= int(creator["startTimeUnixNano"])
+    assert creator["attributes"] == [
+        {"key": "tokens", "value": {"intValue": "3"}},
+        {"key": "ratio", "value": {"doubleValue": 0.5}},
+        {"key": "cached", "value": {"boolValue": False}},
+    ]
+    assert spans["request"]["parentSpanId"] == ""
+    assert to_otlp([])["resourceSpans"][0]["scopeSpans"][0]["spans"] == []
+
+
+def test_usage_rolls_up_cost_by_request_team_role_and_model(tracer):
+    set_model_prices({"fake-model": {"input": 2.0, "output": 10.0}})
+    cache = ResponseCache(tiers=[MemoryLRUTier()])
+    assert estimate_cost("fake-model", 1_000_000, 0) == 2.0
+    assert estimate_cost("unknown-model", 10, 10) is None
+
+    with tracer.span("request") as request:
+        with tracer.span("process_command") as command:
+            with tracer.span("team.creator", team="coder", role="creator"):
+                cached_invoke(_FakeLLM(), ["作成"], cache=cache)
+            with tracer.span("team.checker", team="coder", role="checker"):
+                # 親のチーム・役割を引き継ぐ
+                with tracer.span("llm.hedge_call"):
+                    cached_invoke(_FakeLLM(), ["確認"], cache=cache)
+            with tracer.span("team.leader", team="coder", role="leader"):
+                cached_invoke(_FakeLLM(), ["作成"], cache=cache)
+        tokens, cost = usage_totals(command)
+
+    one_call = (12 * 2.0 + 5 * 10.0) / 1_000_000
+    assert tokens == 34 and cost == pytest.approx(2 * one_call)
+    assert usage_totals(request) == (tokens, cost)
+    [root] = tracer.store.recent_traces(1)
+    assert root["attributes"]["usage.tokens_in"] == 24
+
+    breakdown = {(row["team"], row["role"]): row for row in tracer.store.usage_breakdown()}
+    assert set(breakdown) == {("coder", "creator"), ("coder", "checker"), ("coder", "leader")}
+    assert breakdown[("coder", "checker")]["cost_usd"] == pytest.approx(one_call)
+    leader = breakdown[("coder", "leader")]
+    assert (leader["calls"], leader["cache_hits"], leader["tokens_in"], leader["cost_usd"]) == (1, 1, 0, 0)
+
+
+def _openai_stream(request):
+    """OpenAI のストリーム応答（stream_options.include_usage 指定時のみ最後に usage を返す）"""
+    body = json.loads(request.content)
+    chunks = [{"choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]} for text in ("応", "答")]
+    if body.get("stream_options", {}).get("include_usage"):
+        chunks.append({"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 2, "total_tokens": 14}})
+    lines = [
+        "data: " + json.dumps({"id": "c1", "object": "chat.completion.chunk", "created": 0, "model": body["model"], **chunk})
+        for chunk in chunks
+    ]
+    return httpx.Response(200, text="\n\n".join(lines + ["data: [DONE]"]) + "\n\n",
+                          headers={"content-type": "text/event-stream"})
+
+
+def test_pooled_openai_stream_records_usage(tracer, monkeypatch):
+    pool = ClientPool()
+    transport = httpx.MockTransport(_openai_stream)
+    monkeypatch.setattr(pool, "_make_http_clients", lambda provider: {
+        "http_client": httpx.Client(transport=transport),
+        "http_async_client": httpx.AsyncClient(transport=transport),
+    })
+    monkeypatch.setattr("core.client_pool._client_pool", pool)
+    monkeypatch.setattr(agents.base, "OPENAI_KEY", "sk-test")
+
+    llm = agents.base.get_ai_instance("gpt")
+    assert llm.stream_usage is True
+    with tracer.span("request"):
+        chunks = tracer.trace_stream("team.leader", cached_stream(
+            llm, ["タスク"], cache=ResponseCache(tiers=[MemoryLRUTier()])))
+        assert "".join(chunks) == "応答"
+
+    leader = _spans(tracer)["team.leader"]["attributes"]
+    assert (leader["llm.tokens_in"], leader["llm.tokens_out"]) == (12, 2)
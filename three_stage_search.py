@@ -1,22 +1,115 @@
 """
 3段階記憶検索システム
 Stage 1: 直近10件 → Stage 2: 全アンカー → Stage 3: 全セッション
+- 並列モード: 3段階を同時に走らせ、ヒットした最も若い段で確定
+  （取り消しイベントを立て、後段は重い処理の前に確認して打ち切る）
+- 段ごとの結果をクエリ単位で短時間キャッシュ
 """
 
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from conversation_memory import memory
 from firebase_history_manager import get_firebase_manager
+from utils.tracing import span, wrap_context
+
+# 段の並列実行（MEMORY_PARALLEL_SEARCH=0 で逐次）
+PARALLEL_SEARCH = os.getenv("MEMORY_PARALLEL_SEARCH", "1") != "0"
+# 段ごとの検索結果キャッシュ
+STAGE_CACHE_TTL_SECONDS = 30
+STAGE_CACHE_MAX_ENTRIES = 256
+
+_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="memory-search")
+
+
+class StageCache:
+    """(段, クエリ) → 検索結果 の TTL 付き LRU"""
+    
+    def __init__(self, ttl: float = STAGE_CACHE_TTL_SECONDS, max_entries: int = STAGE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, stage: int, query: str):
+        """(ヒットしたか, 結果)"""
+        key = (stage, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() > entry[0]:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+    
+    def set(self, stage: int, query: str, result):
+        with self._lock:
+            self._entries[(stage, query)] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end((stage, query))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
 
 class ThreeStageSearch:
-    def __init__(self):
-        self.firebase = get_firebase_manager()
+    def __init__(self, parallel: bool = PARALLEL_SEARCH, cache_ttl: float = STAGE_CACHE_TTL_SECONDS,
+                 firebase=None, memory_store=None):
+        self.firebase = firebase or get_firebase_manager()
+        self.memory = memory_store or memory
+        self.parallel = parallel
+        self.cache = StageCache(cache_ttl)
+        self._stages = {
+            1: self._search_recent_10,
+            2: self._search_all_anchors,
+            3: self._search_all_sessions,
+        }
+    
+    def _run_stage(self, stage: int, query: str,
+                   cancel: Optional[threading.Event] = None) -> Optional[List[Dict]]:
+        """
+        キャッシュ経由で1段を実行
+        cancel が立っていれば（前段で確定済み）実行しない。打ち切られた段の結果はキャッシュしない
+        """
+        cancel = cancel or threading.Event()
+        with span(f"memory.stage{stage}") as stage_span:
+            if cancel.is_set():
+                stage_span.set_attribute("cancelled", True)
+                return None
+            cached, result = self.cache.get(stage, query)
+            if not cached:
+                result = self._stages[stage](query, cancel)
+                if cancel.is_set():
+                    stage_span.set_attribute("cancelled", True)
+                    return None
+                self.cache.set(stage, query, result)
+            stage_span.set_attributes(**{"cache.hit": cached, "hits": len(result or [])})
+            return result
+    
+    def _checked_counts(self) -> Dict:
+        """各段の検索対象件数（ストア側で保持している件数を読むだけ）"""
+        return {
+            'stage1_checked': 10,
+            'stage2_checked': self.memory.count_anchors(),
+            'stage3_checked': self.firebase.count_sessions(),
+        }
     
-    def search(self, query: str) -> Dict:
+    def search(self, query: str, parallel: bool = None) -> Dict:
         """
         3段階検索実行
         
         Args:
             query: 検索クエリ
+            parallel: 段を並列実行するか（省略時はインスタンスの設定）
             
         Returns:
             {
@@ -32,6 +125,14 @@ class ThreeStageSearch:
         """
         print(f"\n🔍 3段階記憶検索開始: '{query}'")
         
+        parallel = self.parallel if parallel is None else parallel
+        with span("memory.search", parallel=parallel) as search_span:
+            result = self._search_parallel(query) if parallel else self._search_sequential(query)
+            search_span.set_attribute("stage", result['stage'])
+            return result
+    
+    def _search_sequential(self, query: str) -> Dict:
+        """Stage 1 → 2 → 3 の順に、ヒットした段で打ち切り"""
         search_info = {
             'query': query,
             'stage1_checked': 0,
@@ -41,7 +142,7 @@ class ThreeStageSearch:
         
         # Stage 1: 直近10件検索
         print("📚 Stage 1: 直近10件検索中...")
-        stage1_result = self._search_recent_10(query)
+        stage1_result = self._run_stage(1, query)
         search_info['stage1_checked'] = 10
         
         if stage1_result:
@@ -56,8 +157,8 @@ class ThreeStageSearch:
         
         # Stage 2: 全アンカー検索
         print("🔖 Stage 2: 全アンカー検索中...")
-        stage2_result = self._search_all_anchors(query)
-        search_info['stage2_checked'] = len(memory.search_anchors(''))  # 全アンカー数取得
+        stage2_result = self._run_stage(2, query)
+        search_info['stage2_checked'] = self.memory.count_anchors()
         
         if stage2_result:
             print(f"✅ Stage 2でヒット: {len(stage2_result)}件")
@@ -71,8 +172,8 @@ class ThreeStageSearch:
         
         # Stage 3: 全セッション検索
         print("🌐 Stage 3: 全セッション検索中（重い処理）...")
-        stage3_result = self._search_all_sessions(query)
-        search_info['stage3_checked'] = len(self.firebase.get_all_sessions())
+        stage3_result = self._run_stage(3, query)
+        search_info['stage3_checked'] = self.firebase.count_sessions()
         
         if stage3_result:
             print(f"✅ Stage 3でヒット: {len(stage3_result)}件")
@@ -85,7 +186,49 @@ class ThreeStageSearch:
             'search_info': search_info
         }
     
-    def _search_recent_10(self, query: str) -> Optional[List[Dict]]:
+    def _search_parallel(self, query: str) -> Dict:
+        """
+        3段階を同時に開始し、若い段から順に結果を確定
+        
+        逐次実行と同じ段の結果を返す（Stage 2 が先に終わっても Stage 1 の結果を待つ）。
+        ヒットが確定した時点で取り消しイベントを立てる。
+        後段は開始時と重い処理（同期・全文検索）の前にイベントを確認して打ち切る。
+        """
+        print("⚡ Stage 1〜3を並列検索中...")
+        cancel = threading.Event()
+        futures = {stage: _executor.submit(wrap_context(self._run_stage), stage, query, cancel)
+                   for stage in self._stages}
+        
+        result_stage, result = 3, None
+        for stage, future in futures.items():
+            result = future.result()
+            if result:
+                result_stage = stage
+                cancel.set()
+                break
+            print(f"⚠️ Stage {stage}: ヒットなし")
+        
+        for stage, future in futures.items():
+            if stage > result_stage:
+                future.cancel()
+        
+        # 逐次実行と同じく、到達しなかった段の件数は 0
+        search_info = {'query': query}
+        for stage, (key, count) in enumerate(self._checked_counts().items(), 1):
+            search_info[key] = count if stage <= result_stage else 0
+        
+        if result:
+            print(f"✅ Stage {result_stage}でヒット: {len(result)}件")
+        else:
+            print("❌ Stage 3: ヒットなし（全検索完了）")
+        
+        return {
+            'stage': result_stage,
+            'data': result,
+            'search_info': search_info
+        }
+    
+    def _search_recent_10(self, query: str, cancel: threading.Event) -> Optional[List[Dict]]:
         """Stage 1: 直近10件検索"""
         try:
             recent_sessions = self.firebase.get_recent_sessions(10)
@@ -99,24 +242,23 @@ class ThreeStageSearch:
             print(f"❌ Stage 1エラー: {e}")
             return None
     
-    def _search_all_anchors(self, query: str) -> Optional[List[Dict]]:
+    def _search_all_anchors(self, query: str, cancel: threading.Event) -> Optional[List[Dict]]:
         """Stage 2: 全アンカー検索"""
         try:
-            anchors = memory.search_anchors(query)
+            anchors = self.memory.search_anchors(query)
             return anchors if anchors else None
             
         except Exception as e:
             print(f"❌ Stage 2エラー: {e}")
             return None
     
-    def _search_all_sessions(self, query: str) -> Optional[List[Dict]]:
-        """Stage 3: 全セッション検索"""
+    def _search_all_sessions(self, query: str, cancel: threading.Event) -> Optional[List[Dict]]:
+        """Stage 3: 全セッション検索（同期の後、全文検索の前にも取り消しを確認）"""
         try:
-            all_sessions = self.firebase.get_all_sessions(limit=1000)
-            if not all_sessions:
+            self.firebase.sync()
+            if cancel.is_set():
                 return None
-            
-            results = self.firebase.search_sessions_by_keyword(query, all_sessions)
+            results = self.firebase.search_sessions(query, sync=False)
             return results if results else None
             
         except Exception as e:
@@ -7,6 +7,8 @@ from langchain_core.tools import tool
 from langchain_core.messages import HumanMessage, SystemMessage
 from conversation_memory import memory
 from cross_context_manager import cross_context
+from utils import record_usage, span
+from utils.llm_cache import get_model_name
 
 load_dotenv()
 
@@ -48,7 +50,9 @@ def call_auditor(plan_text: str) -> str:
 {context_text}"""),
             HumanMessage(content=plan_text)
         ]
-        response = model.invoke(messages)
+        with span("tool.auditor", team="cli", role="auditor"):
+            response = model.invoke(messages)
+            record_usage(response, get_model_name(model))
         
         # 🧠 回答を記憶に追加
         memory.add_session_message('assistant', response.content, 'auditor')
@@ -89,7 +93,9 @@ def call_coder(requirement_text: str) -> str:
 【要件】
 {requirement_text}""")
         ]
-        response = model.invoke(messages)
+        with span("tool.coder", team="cli", role="coder"):
+            response = model.invoke(messages)
+            record_usage(response, get_model_name(model))
         
         # 🧠 回答を記憶に追加
         memory.add_session_message('assistant', response.content, 'coder')
@@ -128,7 +134,9 @@ def call_data_processor(text_data: str) -> str:
 {context_text}"""),
             HumanMessage(content=text_data)
         ]
-        response = model.invoke(messages)
+        with span("tool.data_processor", team="cli", role="data_processor"):
+            response = model.invoke(messages)
+            record_usage(response, get_model_name(model))
         
         # 🧠 回答を記憶に追加
         memory.add_session_message('assistant', response.content, 'data_processor')
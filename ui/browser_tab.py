@@ -199,6 +199,8 @@ def _analyze_page(url: str):
             from agents.base import get_ai_instance
             from langchain_core.messages import HumanMessage, SystemMessage
             from concurrent.futures import ThreadPoolExecutor, as_completed
+            from utils import record_usage, span, wrap_context
+            from utils.llm_cache import get_model_name
             
             prompt = f"""以下のWebページを分析してください。
 
@@ -223,13 +225,15 @@ URL: {url}
                         SystemMessage(content="あなたはWebページ分析の専門家です。簡潔に分析してください。"),
                         HumanMessage(content=prompt)
                     ]
-                    response = ai.invoke(messages)
+                    with span("browser.analyze", team="browser", role=ai_key):
+                        response = ai.invoke(messages)
+                        record_usage(response, get_model_name(ai))
                     return {"ai": ai_key, "result": response.content, "success": True}
                 except Exception as e:
                     return {"ai": ai_key, "result": str(e), "success": False}
             
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = {executor.submit(analyze_with_ai, key): key for key in ai_keys}
+            with span("browser.analysis", url=url), ThreadPoolExecutor(max_workers=5) as executor:
+                futures = {executor.submit(wrap_context(analyze_with_ai), key): key for key in ai_keys}
                 for future in as_completed(futures):
                     results.append(future.result())
             
@@ -156,8 +156,8 @@ def _render_system_info():
     
     st.markdown("**システム透明性**")
     try:
-        from failure_tracker import FailureTracker
-        tracker = FailureTracker()
+        from failure_tracker import get_failure_tracker
+        tracker = get_failure_tracker()
         stats_24h = tracker.get_failure_rate(24)
         stats_7d = tracker.get_failure_rate(168)
         m1, m2 = st.columns(2)
@@ -166,6 +166,18 @@ def _render_system_info():
         with m2:
             st.metric("7日間失敗率", f"{stats_7d['failure_rate']}%")
         st.caption(f"総実行回数（24時間）: {stats_24h['total_executions']}回")
+        from failure_analyzer import FailureAnalyzer
+        for latency in FailureAnalyzer(tracker).get_latency_percentiles()[:4]:
+            st.caption(
+                f"{latency['agent_name']} 所要時間（7日間）: p50 {latency['p50_ms'] / 1000:.1f}s / "
+                f"p95 {latency['p95_ms'] / 1000:.1f}s / p99 {latency['p99_ms'] / 1000:.1f}s"
+            )
+        from utils import get_tracer
+        for usage in get_tracer().store.usage_breakdown(24)[:5]:
+            st.caption(
+                f"{usage['team']} / {usage['role']}（{usage['model']}）: ${usage['cost_usd']:.4f}・"
+                f"{usage['tokens_in'] + usage['tokens_out']} tokens（24時間）"
+            )
     except:
         st.caption("データ準備中...")
 
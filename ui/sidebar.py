@@ -1,6 +1,6 @@
 # ui/sidebar.py
 # サイドバーの実装（設定ボタンを緑色に）
-# 行数: 200行
+# 行数: 263行
 
 import streamlit as st
 import pandas as pd
@@ -175,6 +175,21 @@ def _render_quick_settings():
     st.markdown("📊 **クロスチェック機能**")
     use_crosscheck = st.toggle("クロスチェック", value=st.session_state.use_crosscheck, key="sidebar_use_crosscheck", label_visibility="collapsed")
     st.session_state.use_crosscheck = use_crosscheck
+    if use_crosscheck:
+        use_llm_summary = st.checkbox("司令塔によるまとめも生成", value=st.session_state.get("use_llm_summary", False), key="sidebar_use_llm_summary")
+        st.session_state.use_llm_summary = use_llm_summary
+    
+    st.markdown("⚡ **ストリーミング表示**")
+    use_streaming = st.toggle("ストリーミング", value=st.session_state.get("use_streaming", True), key="sidebar_use_streaming", label_visibility="collapsed")
+    st.session_state.use_streaming = use_streaming
+    
+    st.markdown("🧭 **ローカル振り分け**")
+    use_fast_router = st.toggle("ローカル振り分け", value=st.session_state.get("use_fast_router", True), key="sidebar_use_fast_router", label_visibility="collapsed")
+    st.session_state.use_fast_router = use_fast_router
+    
+    st.markdown("🚀 **チェック役の先行分析**")
+    use_speculative = st.toggle("先行分析", value=st.session_state.get("use_speculative", False), key="sidebar_use_speculative", label_visibility="collapsed")
+    st.session_state.use_speculative = use_speculative
 
 def _render_api_keys():
     """APIキー状態"""
@@ -189,8 +204,8 @@ def _render_system_transparency():
     """システム透明性"""
     st.header("📊 システム透明性")
     try:
-        from failure_tracker import FailureTracker
-        tracker = FailureTracker()
+        from failure_tracker import get_failure_tracker
+        tracker = get_failure_tracker()
         stats_24h = tracker.get_failure_rate(24)
         stats_7d = tracker.get_failure_rate(168)
         col1, col2 = st.columns(2)
@@ -1,15 +1,16 @@
 # ui/work_tab.py
 # 作業タブ(チャット)の実装
-# 行数: 150行
+# 行数: 211行
 
 import streamlit as st
 import uuid
 from config import check_api_keys
-from agents import call_commander
+from agents import call_commander, stream_commander, get_router
 from ui.chat_uploader import render_chat_uploader, get_uploaded_files_for_prompt, clear_uploaded_files
 from ui.conversation_history import render_history_detail
 from ui.file_history_panel import render_version_detail
-from core import generate_crosscheck_summary
+from core.scoring import aggregate_scores
+from utils import span, traced
 
 def render_work_tab(active_tab, process_command_func, get_failure_tracker_func):
     """作業タブをレンダリング"""
@@ -53,23 +54,29 @@ def render_work_tab(active_tab, process_command_func, get_failure_tracker_func):
 
 def _render_crosscheck_panel(crosscheck_key):
     """クロスチェック結果パネル"""
-    import re
-    
     st.markdown('<div class="work-tab-left">', unsafe_allow_html=True)
     st.markdown('<div style="font-size: 1.2rem; font-weight: bold; margin-bottom: 0.5rem;">📊 クロスチェック結果</div>', unsafe_allow_html=True)
     
     if st.session_state[crosscheck_key]:
         crosscheck = st.session_state[crosscheck_key]
+        aggregate = crosscheck.get("aggregate") or aggregate_scores(crosscheck.get("checks", []))
         
         if "summary" in crosscheck:
             st.success(crosscheck["summary"])
         
+        # 司令塔のまとめ（バックグラウンド生成）
+        llm_summary = st.session_state.get(f"{crosscheck_key}_llm_summary")
+        if llm_summary is not None:
+            if llm_summary.done():
+                st.info(llm_summary.result())
+            else:
+                st.caption("📝 司令塔のまとめを生成中...")
+        
+        totals = {c["checker"]: c["total"] for c in aggregate["per_checker"]}
         for check in crosscheck.get("checks", []):
             checker = check.get("checker", "不明")
             evaluation = check.get("evaluation", "")
-            
-            score_match = re.search(r'(\d{1,3})\s*[/点分]', evaluation)
-            score = int(score_match.group(1)) if score_match else None
+            score = totals.get(checker)
             
             if score is not None:
                 if score >= 80:
@@ -118,8 +125,9 @@ def _render_chat_area(messages_key, crosscheck_key, process_command_func, get_fa
     if prompt := st.chat_input("メッセージを入力してください..."):
         _handle_user_input(prompt, messages_key, crosscheck_key, process_command_func)
 
+@traced("request", ui="streamlit")
 def _handle_user_input(prompt, messages_key, crosscheck_key, process_command_func):
-    """ユーザー入力処理"""
+    """ユーザー入力処理（1回の入力を1トレースとして記録）"""
     
     file_context = get_uploaded_files_for_prompt()
     full_prompt = prompt + file_context if file_context else prompt
@@ -131,46 +139,73 @@ def _handle_user_input(prompt, messages_key, crosscheck_key, process_command_fun
             st.caption(f"📎 ファイル添付あり")
     
     with st.chat_message("assistant", avatar="👑"):
-        with st.spinner("🤔 Gemini司令塔が思考中..."):
-            try:
-                commander_response = call_commander(full_prompt, st.session_state[messages_key])
-                
-                use_loop = st.session_state.use_loop
-                use_crosscheck = st.session_state.use_crosscheck
-                
-                agent_type, result, loop_data = process_command_func(
-                    commander_response, prompt, use_loop, use_crosscheck
-                )
-                
-                agent_info = {
-                    "auditor": "👮‍♂️ 監査チーム",
-                    "coder": "👨‍💻 コーディングチーム",
-                    "data": "🦙 データ処理チーム",
-                    "searcher": "🔍 検索チーム",
-                    "self": "👑 司令塔"
-                }
-                
-                if agent_type != "self":
-                    st.info(f"📋 {agent_info.get(agent_type, '不明')} に依頼")
+        try:
+            use_loop = st.session_state.use_loop
+            use_crosscheck = st.session_state.use_crosscheck
+            use_streaming = st.session_state.get("use_streaming", True)
+            use_speculative = st.session_state.get("use_speculative", False)
+            
+            # 最初のチャンクが届くまでスピナー表示
+            with st.spinner("🤔 Gemini司令塔が思考中..."):
+                with span("commander.route") as route_span:
+                    # 確信度が高ければ司令塔を呼ばずにローカルで振り分け
+                    router = get_router()
+                    route = router.route(prompt) if st.session_state.get("use_fast_router", True) else None
+                    
+                    if route is not None:
+                        commander_response, self_stream = route.commander_response(full_prompt), None
+                    elif use_streaming:
+                        commander_response, self_stream = stream_commander(full_prompt, st.session_state[messages_key])
+                    else:
+                        commander_response, self_stream = call_commander(full_prompt, st.session_state[messages_key]), None
+                    
+                    if route is None:
+                        router.record_commander(prompt, commander_response or "[SELF]")
+                    route_span.set_attributes(fast_path=route is not None, self_answer=self_stream is not None)
                 
+                if self_stream is not None:
+                    agent_type, result, loop_data = "self", self_stream, None
+                else:
+                    agent_type, result, loop_data = process_command_func(
+                        commander_response, prompt, use_loop, use_crosscheck,
+                        stream=use_streaming, speculative=use_speculative
+                    )
+            
+            agent_info = {
+                "auditor": "👮‍♂️ 監査チーム",
+                "coder": "👨‍💻 コーディングチーム",
+                "data": "🦙 データ処理チーム",
+                "searcher": "🔍 検索チーム",
+                "self": "👑 司令塔"
+            }
+            
+            if agent_type != "self":
+                st.info(f"📋 {agent_info.get(agent_type, '不明')} に依頼")
+            
+            if isinstance(result, str):
                 st.markdown(result)
-                
-                crosscheck_data = loop_data.get("crosscheck") if loop_data else None
-                if crosscheck_data:
-                    st.session_state[crosscheck_key] = crosscheck_data
-                
-                st.session_state[messages_key].append({
-                    "role": "assistant",
-                    "content": result,
-                    "avatar": "👑",
-                    "agent": agent_type,
-                    "crosscheck": crosscheck_data
-                })
-                
-                clear_uploaded_files()
-                st.rerun()
-                
-            except Exception as e:
-                st.error(f"❌ エラー: {str(e)}")
-                import traceback
-                st.code(traceback.format_exc())
+            else:
+                # 長（または司令塔の即答）の出力を逐次表示
+                result = st.write_stream(result)
+            
+            crosscheck_data = loop_data.get("crosscheck") if loop_data else None
+            if crosscheck_data:
+                # Future は履歴に残さずパネル表示用に別キーで保持
+                st.session_state[f"{crosscheck_key}_llm_summary"] = crosscheck_data.pop("llm_summary_future", None)
+                st.session_state[crosscheck_key] = crosscheck_data
+            
+            st.session_state[messages_key].append({
+                "role": "assistant",
+                "content": result,
+                "avatar": "👑",
+                "agent": agent_type,
+                "crosscheck": crosscheck_data
+            })
+            
+            clear_uploaded_files()
+            st.rerun()
+            
+        except Exception as e:
+            st.error(f"❌ エラー: {str(e)}")
+            import traceback
+            st.code(traceback.format_exc())
@@ -1,4 +1,12 @@
 # utils/__init__.py
-from .helpers import extract_content
+from .helpers import extract_content, track_stream
+from .diff_patch import PatchError, apply_unified_diff, changed_hunks, extract_diff, validate_patch
+from .llm_cache import cached_invoke, cached_ainvoke, cached_stream, get_response_cache
+from .sqlite_conn import SQLiteConnection
+from .tracing import current_span, get_tracer, set_attributes, span, trace_stream, traced, wrap_context
+from .usage import estimate_cost, record_usage, set_model_prices, usage_totals
 
-__all__ = ['extract_content']
+__all__ = ['extract_content', 'track_stream', 'cached_invoke', 'cached_ainvoke', 'cached_stream', 'get_response_cache',
+           'PatchError', 'apply_unified_diff', 'changed_hunks', 'extract_diff', 'validate_patch',
+           'SQLiteConnection', 'current_span', 'get_tracer', 'set_attributes', 'span', 'trace_stream', 'traced',
+           'wrap_context', 'estimate_cost', 'record_usage', 'set_model_prices', 'usage_totals']
@@ -0,0 +1,158 @@
+# utils/diff_patch.py
+# 行数: 158行
+# unified diff の抽出・適用・検証（差分ベースの修正ループ用）
+
+import ast
+import difflib
+import re
+from typing import List, Optional
+
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+_DIFF_FENCE = re.compile(r'```(?:diff|patch)\s*\n(.*?)```', re.DOTALL)
+_PYTHON_FENCE = re.compile(r'```(?:python|py)\s*\n(.*?)```', re.DOTALL)
+
+
+class PatchError(ValueError):
+    """差分の解析・適用・検証に失敗"""
+
+
+def extract_diff(text: str) -> str:
+    """
+    LLMの応答から unified diff 部分を取り出す
+    - ```diff コードブロックを優先し、なければ最初の ---/@@ 行以降
+    """
+    blocks = _DIFF_FENCE.findall(text or "")
+    if blocks:
+        return "\n".join(blocks)
+    lines = (text or "").splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith("--- ") or line.startswith("@@"):
+            return "\n".join(lines[i:])
+    raise PatchError("差分が見つかりません")
+
+
+def _parse_hunks(diff_text: str) -> List[dict]:
+    """
+    ハンクごとの削除側・追加側の行
+    - @@ の行数を数え、ハンク内の "--- " / "+++ " で始まる行は本文として扱う
+      （ファイルヘッダとして読み飛ばすのは行数を消化し終えた後だけ）
+    - 行数を消化した後の +/-/コンテキスト行は、行数の誤った差分のため同じハンクに含める
+    """
+    hunks = []
+    current = None
+    remaining_old = remaining_new = 0
+    for line in diff_text.splitlines():
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = {"old_start": int(header.group(1)), "old": [], "new": []}
+            hunks.append(current)
+            remaining_old = int(header.group(2)) if header.group(2) is not None else 1
+            remaining_new = int(header.group(4)) if header.group(4) is not None else 1
+            continue
+        in_body = remaining_old > 0 or remaining_new > 0
+        if current is None or (not in_body and (line.startswith("--- ") or line.startswith("+++ "))):
+            continue
+        if line.startswith("\\"):
+            # "\ No newline at end of file"
+            continue
+        if line.startswith("+"):
+            current["new"].append(line[1:])
+            remaining_new -= 1
+        elif line.startswith("-"):
+            current["old"].append(line[1:])
+            remaining_old -= 1
+        elif line.startswith(" ") or line == "":
+            # 末尾空白を削ったコンテキスト行（空行）も許容
+            current["old"].append(line[1:])
+            current["new"].append(line[1:])
+            remaining_old -= 1
+            remaining_new -= 1
+        elif line.startswith("```"):
+            break
+        else:
+            raise PatchError(f"不正な差分行: {line[:40]}")
+    if not hunks:
+        raise PatchError("ハンクがありません")
+    return hunks
+
+
+def _find_block(lines: List[str], block: List[str], expected: int, start: int) -> Optional[int]:
+    """block が一致する位置のうち expected に最も近いもの（start 以降）"""
+    def matches(strip: bool) -> List[int]:
+        norm = (lambda s: s.rstrip()) if strip else (lambda s: s)
+        target = [norm(b) for b in block]
+        return [
+            i for i in range(start, len(lines) - len(block) + 1)
+            if [norm(l) for l in lines[i:i + len(block)]] == target
+        ]
+
+    candidates = matches(False) or matches(True)
+    if not candidates:
+        return None
+    return min(candidates, key=lambda i: abs(i - expected))
+
+
+def apply_unified_diff(original: str, diff_text: str) -> str:
+    """
+    unified diff を元テキストに適用
+    - 行番号がずれていてもコンテキスト行と削除行の一致で位置を特定
+    - どこにも一致しないハンクがあれば PatchError
+    """
+    lines = original.splitlines()
+    trailing_newline = original.endswith("\n")
+    offset = 0
+    cursor = 0
+
+    for number, hunk in enumerate(_parse_hunks(diff_text), start=1):
+        expected = max(0, hunk["old_start"] - 1 + offset)
+        if hunk["old"]:
+            position = _find_block(lines, hunk["old"], expected, cursor)
+            if position is None:
+                raise PatchError(f"ハンク{number}が元のコードに一致しません")
+        else:
+            position = min(expected, len(lines))
+
+        lines[position:position + len(hunk["old"])] = hunk["new"]
+        offset += len(hunk["new"]) - len(hunk["old"])
+        cursor = position + len(hunk["new"])
+
+    patched = "\n".join(lines)
+    return patched + "\n" if trailing_newline else patched
+
+
+def _python_sources(text: str) -> List[str]:
+    """```python ブロック（なければ全体）"""
+    return _PYTHON_FENCE.findall(text) or [text]
+
+
+def _compiles(source: str) -> bool:
+    try:
+        ast.parse(source)
+        return True
+    except (SyntaxError, ValueError):
+        return False
+
+
+def validate_patch(original: str, patched: str):
+    """
+    適用結果の検証
+    - 変更がなければ PatchError
+    - 元のPythonコードが構文的に正しく、適用後に壊れた場合は PatchError
+    """
+    if patched.strip() == original.strip():
+        raise PatchError("差分を適用しても変更がありません")
+
+    before = _python_sources(original)
+    after = _python_sources(patched)
+    if len(before) == len(after):
+        for old_source, new_source in zip(before, after):
+            if _compiles(old_source) and not _compiles(new_source):
+                raise PatchError("適用後のコードに構文エラーがあります")
+
+
+def changed_hunks(original: str, patched: str, context: int = 3) -> str:
+    """レビュー用に変更箇所とその前後 context 行だけの unified diff を作る"""
+    return "\n".join(difflib.unified_diff(
+        original.splitlines(), patched.splitlines(),
+        fromfile="修正前", tofile="修正後", n=context, lineterm="",
+    ))
@@ -1,5 +1,5 @@
 # utils/helpers.py
-# 行数: 15行
+# 行数: 38行
 # ヘルパー関数
 
 def extract_content(response):
@@ -14,3 +14,25 @@ def extract_content(response):
                 texts.append(str(c))
         return " ".join(texts)
     return content
+
+
+def track_stream(chunks, on_success, on_failure, on_cancel):
+    """
+    ストリームの終了時に実行結果を1回だけ記録
+    最後まで流れたら成功、例外なら失敗、途中で打ち切られたら（再実行・GeneratorExit）中断
+    """
+    error = None
+    completed = False
+    try:
+        yield from chunks
+        completed = True
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if completed:
+            on_success()
+        elif error is not None:
+            on_failure(error)
+        else:
+            on_cancel()
@@ -0,0 +1,421 @@
+# utils/llm_cache.py
+# 行数: 421行
+# LLMレスポンスキャッシュ（メモリLRU + SQLite、TTL・件数上限・ヒット率計測）
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Iterator, List, Optional
+
+from .helpers import extract_content
+from .tracing import current_span
+from .usage import record_usage
+
+# データベースパス
+DB_PATH = Path(__file__).parent.parent / 'data' / 'llm_cache.db'
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MEMORY_ENTRIES = 256
+DEFAULT_DISK_ENTRIES = 5000
+# これを超えるレスポンスは保存しない
+MAX_VALUE_BYTES = 512 * 1024
+
+
+# ==========================================
+# キー生成
+# ==========================================
+def _normalize_content(content: Any) -> Any:
+    """メッセージ本文の正規化（改行統一・前後空白除去）"""
+    if isinstance(content, str):
+        return content.replace("\r\n", "\n").strip()
+    return content
+
+
+def normalize_messages(messages: list) -> List[list]:
+    """メッセージリストを [種別, 本文] のリストに正規化"""
+    normalized = []
+    for m in messages:
+        role = getattr(m, "type", None) or type(m).__name__
+        normalized.append([role, _normalize_content(getattr(m, "content", m))])
+    return normalized
+
+
+def get_model_name(llm: Any) -> str:
+    """LangChainインスタンスからモデル名を取得"""
+    return (
+        getattr(llm, "model_name", None)
+        or getattr(llm, "model", None)
+        or type(llm).__name__
+    )
+
+
+# 接続先URLを持つ属性名（ChatOpenAI / ChatAnthropic / ChatGroq / ChatGoogleGenerativeAI）
+_BASE_URL_ATTRIBUTES = ("openai_api_base", "anthropic_api_url", "groq_api_base", "base_url")
+
+
+def get_endpoint(llm: Any) -> tuple:
+    """LangChainインスタンスの (プロバイダ種別, 接続先URL)。OpenAI互換の別サービスは URL で区別される"""
+    provider = getattr(llm, "_llm_type", None) or type(llm).__name__
+    base_url = next((getattr(llm, name) for name in _BASE_URL_ATTRIBUTES if getattr(llm, name, None)), None)
+    return provider, base_url
+
+
+def make_cache_key(model: str, temperature: Any, messages: list,
+                   provider: str = "", base_url: Optional[str] = None) -> str:
+    """(プロバイダ, 接続先URL, モデル, 温度, 正規化メッセージ) からキャッシュキーを生成"""
+    payload = json.dumps(
+        [provider, base_url, model, temperature, normalize_messages(messages)],
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def make_llm_cache_key(llm: Any, messages: list) -> str:
+    """LangChainインスタンスの設定とメッセージからキャッシュキーを生成"""
+    provider, base_url = get_endpoint(llm)
+    return make_cache_key(get_model_name(llm), getattr(llm, "temperature", None), messages,
+                          provider, base_url)
+
+
+def record_call(cache_hit: bool, response: Any = None, model: str = ""):
+    """
+    現在のスパンにキャッシュの当否を記録し、応答の使用量（トークン・料金）を積み上げる
+    ストリームのチャンクごとに呼ばれても合計になるよう、使用量は加算
+    """
+    span = current_span()
+    if span is None:
+        return
+    span.set_attributes(**{"cache.hit": cache_hit, "llm.model": model or None})
+    record_usage(response, model, span)
+
+
+# ==========================================
+# キャッシュ層
+# ==========================================
+class MemoryLRUTier:
+    """プロセス内LRUキャッシュ"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = DEFAULT_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.get_with_expiry(key)
+        return entry[0] if entry else None
+
+    def get_with_expiry(self, key: str) -> Optional[tuple]:
+        """(値, 期限の time.time()) 。なければ None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item
+
+    def set(self, key: str, value: str, ttl: float, model: str = ""):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteTier:
+    """data/ 配下のSQLite永続キャッシュ"""
+
+    name = "sqlite"
+
+    def __init__(self, db_path=DB_PATH, max_entries: int = DEFAULT_DISK_ENTRIES):
+        self.db_path = str(db_path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._init_database()
+
+    def _init_database(self):
+        """データベース初期化"""
+        with self._lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT,
+                    content TEXT NOT NULL,
+                    size_bytes INTEGER,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)')
+            self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.get_with_expiry(key)
+        return entry[0] if entry else None
+
+    def get_with_expiry(self, key: str) -> Optional[tuple]:
+        """(値, 期限の time.time()) 。なければ None"""
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT content, expires_at FROM llm_cache WHERE cache_key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self.conn.execute('DELETE FROM llm_cache WHERE cache_key = ?', (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute('UPDATE llm_cache SET last_access = ? WHERE cache_key = ?', (now, key))
+            self.conn.commit()
+            return row[0], row[1]
+
+    def set(self, key: str, value: str, ttl: float, model: str = ""):
+        now = time.time()
+        with self._lock:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO llm_cache
+                (cache_key, model, content, size_bytes, created_at, expires_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (key, model, value, len(value.encode("utf-8")), now, now + ttl, now))
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= 50:
+                self._prune_locked(now)
+            self.conn.commit()
+
+    def _prune_locked(self, now: float):
+        """期限切れ削除 + 件数上限を超えた分をアクセスの古い順に削除"""
+        self._writes_since_prune = 0
+        self.conn.execute('DELETE FROM llm_cache WHERE expires_at < ?', (now,))
+        self.conn.execute('''
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache
+                ORDER BY last_access DESC
+                LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+
+    def prune(self):
+        with self._lock:
+            self._prune_locked(time.time())
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute('DELETE FROM llm_cache')
+            self.conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+
+
+# ==========================================
+# キャッシュ本体
+# ==========================================
+class ResponseCache:
+    """
+    多層レスポンスキャッシュ
+    - 上位層から順に検索し、下位層でヒットしたら上位層へ昇格（残りの有効期限を引き継ぐ）
+    - 層は get_with_expiry/set/clear を持つ任意のオブジェクトに差し替え可能
+    """
+
+    def __init__(self, tiers: Optional[list] = None, ttl: float = DEFAULT_TTL_SECONDS,
+                 enabled: bool = True):
+        self.tiers = tiers if tiers is not None else [MemoryLRUTier(), SQLiteTier()]
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+        self._tier_hits = {getattr(t, "name", str(i)): 0 for i, t in enumerate(self.tiers)}
+
+    def get(self, key: str) -> Optional[str]:
+        for i, tier in enumerate(self.tiers):
+            try:
+                entry = tier.get_with_expiry(key)
+            except Exception as e:
+                print(f"⚠️ キャッシュ読込エラー: {e}")
+                continue
+            if entry is not None:
+                value, expires_at = entry
+                # 昇格先でも下位層の期限を超えて残らないよう、残り時間だけ保持
+                remaining = expires_at - time.time()
+                if remaining > 0:
+                    for upper in self.tiers[:i]:
+                        upper.set(key, value, remaining)
+                with self._lock:
+                    self._stats["hits"] += 1
+                    self._tier_hits[getattr(tier, "name", str(i))] += 1
+                return value
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: str, model: str = ""):
+        if not isinstance(value, str) or len(value.encode("utf-8")) > MAX_VALUE_BYTES:
+            return
+        for tier in self.tiers:
+            try:
+                tier.set(key, value, self.ttl, model=model)
+            except Exception as e:
+                print(f"⚠️ キャッシュ保存エラー: {e}")
+        with self._lock:
+            self._stats["stores"] += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self) -> dict:
+        """ヒット・ミス・保存・バイパス件数とヒット率"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "tier_hits": dict(self._tier_hits),
+                "hit_rate": round(self._stats["hits"] / lookups * 100, 2) if lookups else 0,
+            }
+
+
+def is_deterministic(llm: Any) -> bool:
+    """温度0のモデルのみ透過キャッシュ対象"""
+    temperature = getattr(llm, "temperature", None)
+    return temperature is not None and float(temperature) == 0.0
+
+
+def cached_invoke(llm: Any, messages: list, bypass: bool = False,
+                  cache: Optional[ResponseCache] = None) -> str:
+    """
+    キャッシュ経由でLLMを呼び出し、本文テキストを返す
+
+    Args:
+        llm: LangChainインスタンス
+        messages: メッセージリスト
+        bypass: True ならキャッシュを読まずに必ずLLMを呼ぶ（結果も保存しない）
+        cache: 使用するキャッシュ（省略時はグローバル）
+    """
+    cache = cache or get_response_cache()
+
+    model = get_model_name(llm)
+    if bypass or not cache.enabled or not is_deterministic(llm):
+        cache.record_bypass()
+        response = llm.invoke(messages)
+        record_call(False, response, model)
+        return extract_content(response)
+
+    key = make_llm_cache_key(llm, messages)
+    cached = cache.get(key)
+    if cached is not None:
+        record_call(True, model=model)
+        return cached
+
+    response = llm.invoke(messages)
+    record_call(False, response, model)
+    content = extract_content(response)
+    cache.set(key, content, model=model)
+    return content
+
+
+async def cached_ainvoke(llm: Any, messages: list, bypass: bool = False,
+                         cache: Optional[ResponseCache] = None) -> str:
+    """cached_invoke の非同期版（LLM呼び出しに ainvoke を使用）"""
+    cache = cache or get_response_cache()
+
+    model = get_model_name(llm)
+    if bypass or not cache.enabled or not is_deterministic(llm):
+        cache.record_bypass()
+        response = await llm.ainvoke(messages)
+        record_call(False, response, model)
+        return extract_content(response)
+
+    key = make_llm_cache_key(llm, messages)
+    cached = cache.get(key)
+    if cached is not None:
+        record_call(True, model=model)
+        return cached
+
+    response = await llm.ainvoke(messages)
+    record_call(False, response, model)
+    content = extract_content(response)
+    cache.set(key, content, model=model)
+    return content
+
+
+def cached_stream(llm: Any, messages: list, bypass: bool = False,
+                  cache: Optional[ResponseCache] = None) -> Iterator[str]:
+    """
+    キャッシュ経由でLLMをストリーミング呼び出しし、本文チャンクを順に返す
+    - キャッシュヒット時は保存済みの本文を1チャンクで返す
+    - 最後まで受信できた場合のみ結合結果をキャッシュに保存
+    """
+    cache = cache or get_response_cache()
+    use_cache = not bypass and cache.enabled and is_deterministic(llm)
+    model = get_model_name(llm)
+
+    if not use_cache:
+        cache.record_bypass()
+    else:
+        key = make_llm_cache_key(llm, messages)
+        cached = cache.get(key)
+        if cached is not None:
+            record_call(True, model=model)
+            yield cached
+            return
+
+    chunks = []
+    for chunk in llm.stream(messages):
+        record_call(False, chunk, model)
+        text = extract_content(chunk)
+        if text:
+            chunks.append(text)
+            yield text
+
+    if use_cache:
+        cache.set(key, "".join(chunks), model=model)
+
+
+# グローバルインスタンス（遅延初期化）
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """ResponseCacheのシングルトン取得"""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+    return _response_cache
+
+
+def set_response_cache(cache: Optional[ResponseCache]):
+    """グローバルキャッシュを差し替え（None で次回取得時に再生成）"""
+    global _response_cache
+    with _response_cache_lock:
+        _response_cache = cache
@@ -0,0 +1,86 @@
+# utils/sqlite_conn.py
+# 行数: 86行
+# スレッド共有の SQLite 接続（WAL・synchronous=NORMAL・文キャッシュ）と FTS5 検索式
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+# sqlite3 が接続ごとに保持するコンパイル済み SQL の数
+DEFAULT_CACHED_STATEMENTS = 256
+# trigram トークナイザは3文字未満の語を索引できない
+FTS_MIN_TERM_LENGTH = 3
+
+
+def fts_match_query(query: str) -> Optional[str]:
+    """
+    検索語を FTS5 の MATCH 式に変換（空白区切りの語を OR で結合）
+    trigram で検索できる語がなければ None（呼び出し側で LIKE 検索）
+    """
+    terms = [t for t in query.split() if len(t) >= FTS_MIN_TERM_LENGTH]
+    if not terms:
+        return None
+    return ' OR '.join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+class SQLiteConnection:
+    """
+    プロセス内で使い回す SQLite 接続
+    - メソッドごとの connect/close をやめ、1本の接続をロックで共有
+    - WAL + synchronous=NORMAL（コミットごとの fsync を避け、読み書きを並行させる）
+    - 同じ SQL 文字列はコンパイル済みの文を再利用（cached_statements）
+    """
+
+    def __init__(self, db_path, cached_statements: int = DEFAULT_CACHED_STATEMENTS, wal: bool = True):
+        self.db_path = db_path
+        if str(db_path) != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False,
+                                    cached_statements=cached_statements)
+        if wal and str(db_path) != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    @contextmanager
+    def transaction(self):
+        """ロックを握ったままカーソルを渡し、抜けるときにコミット（例外時はロールバック）"""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                yield cursor
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        """書き込み1文をコミットまで実行"""
+        with self._lock:
+            cursor = self.conn.execute(sql, params)
+            self.conn.commit()
+            return cursor
+
+    def executemany(self, sql: str, rows) -> int:
+        """まとめて書き込み（1トランザクション）"""
+        with self._lock:
+            cursor = self.conn.executemany(sql, rows)
+            self.conn.commit()
+            return cursor.rowcount
+
+    def fetchall(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def fetchone(self, sql: str, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
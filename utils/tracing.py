@@ -0,0 +1,407 @@
+# utils/tracing.py
+# 行数: 407行
+# 入れ子スパンによる軽量トレース（SQLite に保存し、OpenTelemetry 互換の JSON に書き出す）
+
+import atexit
+import contextvars
+import functools
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional
+
+from .sqlite_conn import SQLiteConnection
+
+# データベースパス
+DB_PATH = Path(__file__).parent.parent / 'data' / 'traces.db'
+
+# TRACING=0 でスパンを保存しない（計測コードはそのまま動く）
+TRACING_ENABLED = os.getenv("TRACING", "1") != "0"
+SERVICE_NAME = "multi-agent-team"
+# ルートスパン終了時か、この件数たまった時点でまとめて保存
+FLUSH_BATCH_SIZE = 200
+
+# OTLP の SpanKind / StatusCode
+_SPAN_KIND_INTERNAL = 1
+_STATUS_CODES = {"UNSET": 0, "OK": 1, "ERROR": 2}
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+# 並列に走る子スパンが同じ親の数値属性へ加算するときの排他
+_add_lock = threading.Lock()
+
+
+class Span:
+    """1区間の計測（開始・終了時刻、属性、親子関係）"""
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent: Optional["Span"],
+                 attributes: dict):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "UNSET"
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def add(self, key: str, amount):
+        """数値属性に加算（ストリームのチャンク数・複数回の呼び出しのトークンなど）"""
+        if amount:
+            with _add_lock:
+                self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def ancestors(self) -> Iterator["Span"]:
+        """自身からルートまでのスパン"""
+        span = self
+        while span is not None:
+            yield span
+            span = span.parent
+
+    def record_exception(self, error: BaseException):
+        self.status = "ERROR"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self._tracer._on_end(self)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_row(self) -> tuple:
+        return (self.trace_id, self.span_id, self.parent_id, self.name, self.start_ns, self.end_ns,
+                self.status, self.error, json.dumps(self.attributes, ensure_ascii=False, default=str))
+
+
+# ==========================================
+# 保存先
+# ==========================================
+class TraceStore:
+    """data/traces.db にスパンを保存し、集計・OTLP JSON 書き出しを行う"""
+
+    def __init__(self, db_path=None):
+        self.db = SQLiteConnection(db_path or DB_PATH)
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS spans (
+                    span_id TEXT PRIMARY KEY,
+                    trace_id TEXT NOT NULL,
+                    parent_id TEXT,
+                    name TEXT NOT NULL,
+                    start_ns INTEGER NOT NULL,
+                    end_ns INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    attributes TEXT
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_spans_trace ON spans(trace_id, start_ns)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_spans_start ON spans(start_ns)')
+
+    def write(self, spans: List[Span]) -> int:
+        return self.db.executemany('''
+            INSERT OR REPLACE INTO spans
+            (trace_id, span_id, parent_id, name, start_ns, end_ns, status, error, attributes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [span.to_row() for span in spans])
+
+    def _rows(self, where: str, params: tuple) -> List[dict]:
+        rows = self.db.fetchall(f'''
+            SELECT trace_id, span_id, parent_id, name, start_ns, end_ns, status, error, attributes
+            FROM spans WHERE {where}
+            ORDER BY start_ns
+        ''', params)
+        keys = ('trace_id', 'span_id', 'parent_id', 'name', 'start_ns', 'end_ns', 'status', 'error')
+        return [{**dict(zip(keys, row[:8])), 'attributes': json.loads(row[8] or '{}')} for row in rows]
+
+    def get_trace(self, trace_id: str) -> List[dict]:
+        """1リクエスト分のスパン（開始順）"""
+        return self._rows('trace_id = ?', (trace_id,))
+
+    def recent_traces(self, limit: int = 20) -> List[dict]:
+        """直近のルートスパン（新しい順）"""
+        return self._rows(
+            'span_id IN (SELECT span_id FROM spans WHERE parent_id IS NULL ORDER BY start_ns DESC LIMIT ?)',
+            (limit,)
+        )[::-1]
+
+    def summarize(self, since_hours: float = 24) -> List[dict]:
+        """スパン名ごとの件数・平均・合計時間（合計の大きい順）。どこで時間を使っているかの一覧"""
+        since_ns = time.time_ns() - int(since_hours * 3600 * 1e9)
+        rows = self.db.fetchall('''
+            SELECT name, COUNT(*), AVG(end_ns - start_ns) / 1e6, SUM(end_ns - start_ns) / 1e6,
+                   SUM(status = 'ERROR')
+            FROM spans
+            WHERE start_ns >= ?
+            GROUP BY name
+            ORDER BY 4 DESC
+        ''', (since_ns,))
+        return [
+            {'name': name, 'count': count, 'avg_ms': round(avg_ms, 1), 'total_ms': round(total_ms, 1),
+             'errors': errors}
+            for name, count, avg_ms, total_ms, errors in rows
+        ]
+
+    def usage_breakdown(self, since_hours: float = 24) -> List[dict]:
+        """
+        LLM呼び出しのトークン・料金をチーム × 役割 × モデルで集計（料金の大きい順）
+        リクエスト単位の合計は recent_traces のルートスパンの usage.* 属性
+        """
+        since_ns = time.time_ns() - int(since_hours * 3600 * 1e9)
+        rows = self.db.fetchall('''
+            SELECT
+                json_extract(attributes, '$.team'),
+                json_extract(attributes, '$.role'),
+                json_extract(attributes, '$."llm.model"'),
+                COUNT(*),
+                SUM(coalesce(json_extract(attributes, '$."cache.hit"'), 0)),
+                SUM(coalesce(json_extract(attributes, '$."llm.tokens_in"'), 0)),
+                SUM(coalesce(json_extract(attributes, '$."llm.tokens_out"'), 0)),
+                SUM(coalesce(json_extract(attributes, '$."llm.cost_usd"'), 0))
+            FROM spans
+            WHERE start_ns >= ? AND json_extract(attributes, '$."llm.model"') IS NOT NULL
+            GROUP BY 1, 2, 3
+            ORDER BY 8 DESC, 7 DESC
+        ''', (since_ns,))
+        return [
+            {'team': team, 'role': role, 'model': model, 'calls': calls, 'cache_hits': cache_hits,
+             'tokens_in': tokens_in, 'tokens_out': tokens_out, 'cost_usd': round(cost, 6)}
+            for team, role, model, calls, cache_hits, tokens_in, tokens_out, cost in rows
+        ]
+
+    def export_otlp(self, trace_id: Optional[str] = None, since_hours: Optional[float] = None) -> dict:
+        """OTLP/JSON（ExportTraceServiceRequest）形式で書き出す"""
+        if trace_id:
+            spans = self.get_trace(trace_id)
+        else:
+            since_ns = time.time_ns() - int(since_hours * 3600 * 1e9) if since_hours else 0
+            spans = self._rows('start_ns >= ?', (since_ns,))
+        return to_otlp(spans)
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def to_otlp(spans: List[dict], service_name: str = SERVICE_NAME) -> dict:
+    """スパン（TraceStore の行形式）を OTLP/JSON に変換（Jaeger・Tempo などの OTLP 受信口にそのまま送れる）"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+            "scopeSpans": [{
+                "scope": {"name": "utils.tracing"},
+                "spans": [
+                    {
+                        "traceId": span['trace_id'],
+                        "spanId": span['span_id'],
+                        "parentSpanId": span['parent_id'] or "",
+                        "name": span['name'],
+                        "kind": _SPAN_KIND_INTERNAL,
+                        "startTimeUnixNano": str(span['start_ns']),
+                        "endTimeUnixNano": str(span['end_ns']),
+                        "attributes": _otlp_attributes(span['attributes']),
+                        "status": {"code": _STATUS_CODES[span['status']], "message": span['error'] or ""},
+                    }
+                    for span in spans
+                ],
+            }],
+        }],
+    }
+
+
+# ==========================================
+# トレーサー
+# ==========================================
+class Tracer:
+    """
+    スパンの生成と保存
+    - 現在のスパンは contextvars で引き継ぐ（asyncio のタスクにはそのまま、スレッドには wrap で渡す）
+    - 終了したスパンはバッファに積み、ルートスパンの終了時にまとめて保存
+      （ルートより後に終わったスパン＝流し終えたストリームや後発のスレッドは、その場で保存）
+    """
+
+    def __init__(self, store: Optional[TraceStore] = None, enabled: bool = TRACING_ENABLED,
+                 batch_size: int = FLUSH_BATCH_SIZE):
+        self._store = store
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self._pending = []
+        # ルートスパンが終わっていないトレース
+        self._open_traces = set()
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> TraceStore:
+        if self._store is None:
+            self._store = TraceStore()
+        return self._store
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        """スパンを開始（parent 省略時は現在のスパンの子、なければ新しいトレースのルート）"""
+        if parent is None:
+            parent = _current_span.get()
+        if parent is None:
+            span = Span(self, name, secrets.token_hex(16), None, attributes)
+            with self._lock:
+                self._open_traces.add(span.trace_id)
+            return span
+        return Span(self, name, parent.trace_id, parent, attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """with ブロックを1スパンとして計測（例外は ERROR として記録し、そのまま送出）"""
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def trace_stream(self, name: str, chunks: Iterator, **attributes) -> Iterator:
+        """
+        ストリーム（ジェネレータ）を最後のチャンクまで1スパンとして計測
+        スパンは呼び出し時点で開始（最初のチャンクまでの待ちを含む）。各チャンクの生成はスパンの文脈で実行
+        """
+        span = self.start_span(name, **attributes)
+        context = contextvars.copy_context()
+        context.run(_current_span.set, span)
+
+        def iterate():
+            iterator = iter(chunks)
+            try:
+                while True:
+                    try:
+                        chunk = context.run(next, iterator)
+                    except StopIteration:
+                        break
+                    span.add("chunks", 1)
+                    yield chunk
+            except Exception as e:
+                span.record_exception(e)
+                raise
+            finally:
+                span.end()
+
+        return iterate()
+
+    def wrap(self, func: Callable) -> Callable:
+        """現在のスパンを別スレッドに引き継ぐ（スレッドプールへ投入する直前に呼ぶ）"""
+        context = contextvars.copy_context()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return context.run(func, *args, **kwargs)
+        return wrapper
+
+    def _on_end(self, span: Span):
+        with self._lock:
+            if span.parent_id is None:
+                self._open_traces.discard(span.trace_id)
+            if not self.enabled:
+                return
+            self._pending.append(span)
+            pending = len(self._pending)
+            trace_open = span.trace_id in self._open_traces
+        if not trace_open or pending >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        try:
+            return self.store.write(batch)
+        except Exception as e:
+            print(f"⚠️ トレース保存エラー: {e}")
+            return 0
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def set_attributes(**attributes):
+    """現在のスパンに属性を追加（スパン外では何もしない）"""
+    span = _current_span.get()
+    if span is not None:
+        span.set_attributes(**attributes)
+
+
+# グローバルインスタンス（遅延初期化）
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Tracerのシングルトン取得"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer()
+                atexit.register(_tracer.flush)
+    return _tracer
+
+
+def span(name: str, **attributes):
+    return get_tracer().span(name, **attributes)
+
+
+def traced(name: str, **attributes) -> Callable:
+    """関数呼び出しを1スパンとして計測するデコレータ（トレーサーは呼び出し時に取得）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_tracer().span(name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_stream(name: str, chunks: Iterator, **attributes) -> Iterator:
+    return get_tracer().trace_stream(name, chunks, **attributes)
+
+
+def wrap_context(func: Callable) -> Callable:
+    return get_tracer().wrap(func)
+
+
+if __name__ == "__main__":
+    # python -m utils.tracing [時間] > traces.json  … 直近 N 時間（既定24）を OTLP/JSON で出力
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 24
+    json.dump(TraceStore().export_otlp(since_hours=hours), sys.stdout, ensure_ascii=False, indent=2)
@@ -0,0 +1,77 @@
+# utils/usage.py
+# 行数: 77行
+# トークン使用量と料金（プロバイダの usage_metadata とモデル別の単価から）
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from .tracing import Span, current_span
+
+# モデルID → {"input": USD / 100万トークン, "output": USD / 100万トークン}（config.AI_MODELS の price から登録）
+_model_prices: Dict[str, dict] = {}
+_prices_lock = threading.Lock()
+
+# 呼び出しを含むスパン（チーム実行・リクエスト全体など）に積み上げる合計の属性名
+USAGE_TOKENS_IN = "usage.tokens_in"
+USAGE_TOKENS_OUT = "usage.tokens_out"
+USAGE_COST = "usage.cost_usd"
+# 集計の軸として呼び出しのスパンに引き継ぐ属性
+GROUP_ATTRIBUTES = ("team", "role")
+
+
+def set_model_prices(prices: Dict[str, dict]):
+    """モデル別の単価を登録（既存の登録は上書き）"""
+    with _prices_lock:
+        _model_prices.update(prices)
+
+
+def estimate_cost(model: str, tokens_in: int, tokens_out: int) -> Optional[float]:
+    """料金（USD）。単価が未登録のモデルは None"""
+    price = _model_prices.get(model)
+    if price is None:
+        return None
+    return (tokens_in * price.get("input", 0) + tokens_out * price.get("output", 0)) / 1_000_000
+
+
+def usage_of(response: Any) -> Tuple[int, int]:
+    """LangChain の応答（またはストリームのチャンク）の (入力トークン, 出力トークン)"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("input_tokens") or 0, usage.get("output_tokens") or 0
+
+
+def record_usage(response: Any, model: str, span: Optional[Span] = None):
+    """
+    1回の応答の使用量を現在のスパンに記録し、祖先スパンの合計にも加算
+    - 呼び出しのスパン: llm.tokens_in / llm.tokens_out / llm.cost_usd と、集計軸の team / role
+    - 祖先を含む全スパン: usage.tokens_in / usage.tokens_out / usage.cost_usd
+    ストリームはチャンクごとに呼ばれる（usage を持つチャンクの分だけ加算）
+    """
+    span = span or current_span()
+    if span is None:
+        return
+    tokens_in, tokens_out = usage_of(response)
+    if not tokens_in and not tokens_out:
+        return
+    cost = estimate_cost(model, tokens_in, tokens_out)
+
+    span.add("llm.tokens_in", tokens_in)
+    span.add("llm.tokens_out", tokens_out)
+    span.add("llm.cost_usd", cost)
+    for key in GROUP_ATTRIBUTES:
+        if key not in span.attributes:
+            inherited = next((s.attributes[key] for s in span.ancestors() if key in s.attributes), None)
+            span.set_attribute(key, inherited)
+
+    for ancestor in span.ancestors():
+        ancestor.add(USAGE_TOKENS_IN, tokens_in)
+        ancestor.add(USAGE_TOKENS_OUT, tokens_out)
+        ancestor.add(USAGE_COST, cost)
+
+
+def usage_totals(span: Optional[Span]) -> Tuple[int, float]:
+    """スパン配下の (合計トークン, 合計料金 USD)"""
+    if span is None:
+        return 0, 0.0
+    attributes = span.attributes
+    tokens = attributes.get(USAGE_TOKENS_IN, 0) + attributes.get(USAGE_TOKENS_OUT, 0)
+    return tokens, round(attributes.get(USAGE_COST, 0.0), 6)